@@ -48,12 +48,12 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Первой: время запроса и число SQL-запросов для /metrics/ (courses/metrics.py).
+    'courses.middleware.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.locale.LocaleMiddleware',
-    'django.middleware.cache.UpdateCacheMiddleware',
     'django.middleware.common.CommonMiddleware',
-    'django.middleware.cache.FetchFromCacheMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
@@ -67,7 +67,6 @@ TEMPLATES = [
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
         'DIRS': [os.path.join(BASE_DIR, 'templates')]
         ,
-        'APP_DIRS': True,
         'OPTIONS': {
             'context_processors': [
                 'django.template.context_processors.debug',
@@ -75,6 +74,15 @@ TEMPLATES = [
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
             ],
+            # Скомпилированные шаблоны хранятся в памяти процесса и при DEBUG = True
+            # (иначе Django кэширует их только без DEBUG). После изменения шаблона
+            # сервер разработки нужно перезапустить.
+            'loaders': [
+                ('django.template.loaders.cached.Loader', [
+                    'django.template.loaders.filesystem.Loader',
+                    'django.template.loaders.app_directories.Loader',
+                ]),
+            ],
         },
     },
 ]
@@ -137,20 +145,59 @@ LOGIN_REDIRECT_URL = reverse_lazy('student_course_list')
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media/')
 
+# Загрузки пишутся на диск частями с подсчётом SHA-256 и ограничением размера.
+FILE_UPLOAD_HANDLERS = ['courses.media.ChecksumUploadHandler']
+COURSES_MAX_UPLOAD_SIZE = 512 * 1024 * 1024  # 512 MB
+
+# Число потоков для генерации вариантов изображений; 0 - генерировать синхронно.
+COURSES_IMAGE_WORKERS = 2
+
+# Отдача файлов содержимого веб-сервером: None, 'x-accel' (nginx) или 'x-sendfile'.
+COURSES_MEDIA_SENDFILE = os.environ.get('COURSES_MEDIA_SENDFILE') or None
+# Для 'x-accel': internal-location nginx, указывающий на MEDIA_ROOT.
+COURSES_MEDIA_ACCEL_PREFIX = '/protected-media/'
+
+# Срок действия токенов API и время, на которое процесс запоминает проверенный токен.
+COURSES_API_TOKEN_LIFETIME = 60 * 60 * 24 * 30  # 30 дней
+COURSES_API_TOKEN_CACHE_TIMEOUT = 60
+
+# Поисковый индекс курсов: 'fts5' (SQLite), 'index' (таблица SearchTerm, любая база) или 'auto'.
+COURSES_SEARCH_BACKEND = 'auto'
+
+# Буфер отметок прогресса студентов сохраняется в базу, когда в нём набирается
+# COURSES_PROGRESS_FLUSH_SIZE отметок или первой из них больше COURSES_PROGRESS_FLUSH_INTERVAL секунд.
+COURSES_PROGRESS_FLUSH_SIZE = 1000
+COURSES_PROGRESS_FLUSH_INTERVAL = 5
+
+# Метрики запросов в памяти процесса, выдаются по /metrics/ в формате Prometheus.
+COURSES_METRICS_ENABLED = True
+# Токен сборщика метрик (заголовок "Authorization: Bearer <токен>"); без него метрики видит только персонал.
+COURSES_METRICS_TOKEN = os.environ.get('COURSES_METRICS_TOKEN') or None
+
+# Кэш в памяти процесса (L1, до 5 секунд) перед memcached (L2) с защитой от
+# одновременного пересчёта, см. courses/layered_cache.py.
 CACHES = {
     'default': {
+        'BACKEND': 'courses.layered_cache.LayeredCache',
+        'LOCATION': 'memcached',
+        'OPTIONS': {'L1_TIMEOUT': 5, 'L1_MAX_ENTRIES': 1000},
+    },
+    'memcached': {
         'BACKEND': 'django.core.cache.backends.memcached.MemcachedCache',
         'LOCATION': '127.0.0.1:11211',
-    }
+    },
 }
 
-CACHE_MIDDLEWARE_ALIAS = 'default'
-CACHE_MIDDLEWARE_SECONDS = 60 * 15  # 15 minutes
-CACHE_MIDDLEWARE_KEY_PREFIX = 'educa'
+# Тесты выполняются с кэшами в памяти процесса, см. EducationService/test_runner.py.
+TEST_RUNNER = 'EducationService.test_runner.TestRunner'
 
 REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.DjangoModelPermissionsOrAnonReadOnly'
+    ],
+    'DEFAULT_RENDERER_CLASSES': [
+        'courses.api.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
     ]
 }
 
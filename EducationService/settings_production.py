@@ -0,0 +1,90 @@
+import os
+from urllib.parse import quote
+
+from .settings import *  # noqa: F401,F403
+from .settings import BASE_DIR
+
+"""
+Настройки для промышленного окружения:
+DJANGO_SETTINGS_MODULE=EducationService.settings_production
+
+База данных выбирается переменной окружения COURSES_DB ('sqlite' или
+'postgresql'). Соединения постоянные (CONN_MAX_AGE) и проверяются в начале
+запроса (CONN_HEALTH_CHECKS, см. courses/db.py). Страницы и API каталога
+читают из реплик COURSES_DB_REPLICAS через ReplicaRouter, запись и остальные
+запросы идут в основную базу.
+
+SQLite: режим WAL (читатели и писатель не блокируют друг друга), ожидание
+блокировки до DB_BUSY_TIMEOUT секунд вместо немедленной ошибки "database is
+locked" и отдельное соединение только для чтения для каталога.
+
+PostgreSQL: соединения идут через PgBouncer в режиме пула транзакций
+(DB_HOST/DB_PORT указывают на PgBouncer). В этом режиме курсоры на стороне
+сервера не работают, поэтому они отключены. Реплики перечисляются в
+DB_REPLICA_HOSTS через запятую (тоже через PgBouncer).
+"""
+
+DEBUG = False
+
+ALLOWED_HOSTS = [host for host in os.environ.get('ALLOWED_HOSTS', '').split(',') if host]
+
+DB_BUSY_TIMEOUT = int(os.environ.get('DB_BUSY_TIMEOUT', 20))
+
+if os.environ.get('COURSES_DB', 'sqlite') == 'postgresql':
+    def postgresql(host):
+        return {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('DB_NAME', 'education_service'),
+            'USER': os.environ.get('DB_USER', 'education_service'),
+            'PASSWORD': os.environ.get('DB_PASSWORD', ''),
+            'HOST': host,
+            'PORT': os.environ.get('DB_PORT', '6432'),
+            'CONN_MAX_AGE': 600,
+            'CONN_HEALTH_CHECKS': True,
+            'DISABLE_SERVER_SIDE_CURSORS': True,
+            # Параметр options PgBouncer не принимает, поэтому только тайм-аут подключения.
+            'OPTIONS': {'connect_timeout': 5},
+        }
+
+    DATABASES = {'default': postgresql(os.environ.get('DB_HOST', '127.0.0.1'))}
+    replica_hosts = [host for host in os.environ.get('DB_REPLICA_HOSTS', '').split(',') if host]
+    for number, host in enumerate(replica_hosts, 1):
+        DATABASES['replica_{}'.format(number)] = dict(postgresql(host), TEST={'MIRROR': 'default'})
+else:
+    SQLITE_PATH = os.environ.get('SQLITE_PATH', str(BASE_DIR / 'db.sqlite3'))
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': SQLITE_PATH,
+            'CONN_MAX_AGE': None,
+            'CONN_HEALTH_CHECKS': True,
+            # timeout - busy_timeout SQLite в секундах.
+            'OPTIONS': {'timeout': DB_BUSY_TIMEOUT},
+            'PRAGMAS': {'journal_mode': 'wal', 'synchronous': 'normal'},
+        },
+        'replica': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            # Тот же файл, открытый только для чтения (Django открывает SQLite с uri=True).
+            'NAME': 'file:{}?mode=ro'.format(quote(SQLITE_PATH)),
+            'CONN_MAX_AGE': None,
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {'timeout': DB_BUSY_TIMEOUT},
+            'TEST': {'MIRROR': 'default'},
+        },
+    }
+
+COURSES_DB_REPLICAS = [alias for alias in DATABASES if alias != 'default']
+
+DATABASE_ROUTERS = ['courses.db.ReplicaRouter']
+
+CACHES = {
+    'default': {
+        'BACKEND': 'courses.layered_cache.LayeredCache',
+        'LOCATION': 'memcached',
+        'OPTIONS': {'L1_TIMEOUT': 5, 'L1_MAX_ENTRIES': 1000},
+    },
+    'memcached': {
+        'BACKEND': 'django.core.cache.backends.memcached.MemcachedCache',
+        'LOCATION': os.environ.get('MEMCACHED_LOCATION', '127.0.0.1:11211'),
+    },
+}
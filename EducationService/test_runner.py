@@ -0,0 +1,35 @@
+import logging
+
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+"""
+Запуск тестов (TEST_RUNNER в settings.py).
+
+Все кэши из CACHES на время тестов заменяются на LocMemCache: тесты вызывают
+cache.clear() и меняют версии тегов, и с настройками по умолчанию это
+сбрасывало бы memcached работающего сайта.
+
+Варианты изображений генерируются синхронно (COURSES_IMAGE_WORKERS = 0):
+фоновые потоки переживали бы тест, создавший изображение, и обращались бы
+к базе и файлам следующих тестов. Изображения фикстур ссылаются на
+несуществующие файлы, поэтому предупреждения courses.images отключены.
+"""
+
+
+class TestRunner(DiscoverRunner):
+    def setup_test_environment(self, **kwargs):
+        super(TestRunner, self).setup_test_environment(**kwargs)
+        self.test_settings = override_settings(CACHES={
+            alias: {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'test-' + alias}
+            for alias in settings.CACHES}, COURSES_IMAGE_WORKERS=0)
+        self.test_settings.enable()
+        self.images_logger = logging.getLogger('courses.images')
+        self.images_level = self.images_logger.level
+        self.images_logger.setLevel(logging.ERROR)
+
+    def teardown_test_environment(self, **kwargs):
+        self.images_logger.setLevel(self.images_level)
+        self.test_settings.disable()
+        super(TestRunner, self).teardown_test_environment(**kwargs)
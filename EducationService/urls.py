@@ -20,15 +20,22 @@ from django.conf import settings
 from django.conf.urls.static import static
 from django.conf.urls.i18n import i18n_patterns
 
-from courses.views import CourseListView
+from courses.views import CourseListView, CourseSearchView, MetricsView
 
-urlpatterns = i18n_patterns(
+urlpatterns = [
+    # Без префикса языка: адрес для сборщика метрик Prometheus.
+    path('metrics/', MetricsView.as_view(), name='metrics'),
+]
+
+urlpatterns += i18n_patterns(
     path('rosetta/', include('rosetta.urls')),
     path('accounts/login/', auth_views.LoginView.as_view(), name='login'),
     path('accounts/logout/', auth_views.LogoutView.as_view(), name='logout'),
     path('admin/', admin.site.urls),
     path('course/', include('courses.urls')),
     path('', CourseListView.as_view(), name='course_list'),
+    # Не в course/: там адрес search/ занимал бы слаг курса.
+    path('search/', CourseSearchView.as_view(), name='course_search'),
     path('students/', include('students.urls')),
     path('api/', include('courses.api.urls', namespace='api')),
 )
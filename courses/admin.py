@@ -1,5 +1,8 @@
 from django.contrib import admin
-from .models import Subject, Course, Module
+from .models import Subject, Course, Module, Enrollment
+from .caching import invalidate, user_tag
+from . import counters
+from . import search
 
 
 @admin.register(Subject)
@@ -12,10 +15,32 @@ class ModuleInline(admin.StackedInline):
     model = Module
 
 
+class EnrollmentInline(admin.TabularInline):
+    model = Enrollment
+    raw_id_fields = ['user']
+    extra = 0
+
+
 @admin.register(Course)
 class CourseAdmin(admin.ModelAdmin):
     list_display = ['title', 'subject', 'created']
     list_filter = ['created', 'subject']
     search_fields = ['title', 'overview']
     prepopulated_fields = {'slug': ('title',)}
-    inlines = [ModuleInline]
+    inlines = [ModuleInline, EnrollmentInline]
+
+    def get_search_results(self, request, queryset, search_term):
+        # Поиск по полнотекстовому индексу вместо icontains по search_fields.
+        if not search_term:
+            return super(CourseAdmin, self).get_search_results(request, queryset, search_term)
+        return queryset.filter(pk__in=search.search_course_ids(search_term, limit=None)), False
+
+    def save_related(self, request, form, formsets, change):
+        # Записи на курс из инлайна сохраняются без сигнала m2m_changed,
+        # поэтому счётчик и кэш курсов студентов обновляем сами.
+        before = set(form.instance.students.values_list('pk', flat=True))
+        super(CourseAdmin, self).save_related(request, form, formsets, change)
+        after = set(form.instance.students.values_list('pk', flat=True))
+        if before != after:
+            counters.refresh_student_counts([form.instance.pk])
+            invalidate(*[user_tag(user_id) for user_id in before ^ after])
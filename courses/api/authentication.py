@@ -0,0 +1,132 @@
+import copy
+import hashlib
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+from rest_framework.authentication import (BaseAuthentication, BasicAuthentication,
+                                           SessionAuthentication, get_authorization_header)
+from rest_framework.exceptions import AuthenticationFailed
+
+from ..models import ApiToken
+
+"""
+Аутентификация API по токену: заголовок "Authorization: Token <токен>".
+
+BasicAuthentication проверяет пароль (PBKDF2) на каждом запросе. Токен
+получают один раз через /api/token/, а при проверке считается только его
+SHA-256 и выполняется поиск по уникальному индексу key_hash. Результат проверки
+процесс запоминает на COURSES_API_TOKEN_CACHE_TIMEOUT секунд, поэтому
+повторные запросы с тем же токеном не обращаются к базе данных. Отозванный
+токен или отключённый пользователь в других процессах перестают приниматься
+не позже, чем через этот интервал.
+"""
+
+TOKEN_CACHE_SIZE = 10000
+
+
+def get_token_lifetime():
+    return getattr(settings, 'COURSES_API_TOKEN_LIFETIME', 60 * 60 * 24 * 30)
+
+
+def get_token_cache_timeout():
+    return getattr(settings, 'COURSES_API_TOKEN_CACHE_TIMEOUT', 60)
+
+
+def hash_token(key):
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+def create_token(user):
+    """
+    Создаёт токен пользователя и удаляет его просроченные токены.
+    :return: (токен, объект ApiToken)
+    """
+    ApiToken.objects.filter(user=user, expires__lte=timezone.now()).delete()
+    key = secrets.token_urlsafe(32)
+    token = ApiToken.objects.create(user=user, key_hash=hash_token(key),
+                                    expires=timezone.now() + timedelta(seconds=get_token_lifetime()))
+    return key, token
+
+
+class TokenCache(object):
+    """Потокобезопасный LRU-кэш проверенных токенов: хэш -> (пользователь, истекает в)."""
+    def __init__(self, size=TOKEN_CACHE_SIZE):
+        self.size = size
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key_hash):
+        with self.lock:
+            entry = self.entries.get(key_hash)
+            if entry is None:
+                return None
+            if entry[1] <= time.monotonic():
+                del self.entries[key_hash]
+                return None
+            self.entries.move_to_end(key_hash)
+            return entry[0]
+
+    def set(self, key_hash, user, timeout):
+        with self.lock:
+            self.entries[key_hash] = (user, time.monotonic() + timeout)
+            self.entries.move_to_end(key_hash)
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+
+    def discard(self, key_hash):
+        with self.lock:
+            self.entries.pop(key_hash, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+token_cache = TokenCache()
+
+
+class TokenAuthentication(BaseAuthentication):
+    keyword = 'Token'
+
+    def authenticate(self, request):
+        auth = get_authorization_header(request).split()
+        if not auth or auth[0].lower() != self.keyword.lower().encode():
+            return None
+        if len(auth) != 2:
+            raise AuthenticationFailed('Invalid token header.')
+        try:
+            key = auth[1].decode()
+        except UnicodeError:
+            raise AuthenticationFailed('Invalid token header.')
+        key_hash = hash_token(key)
+        user = token_cache.get(key_hash)
+        if user is None:
+            user = self.verify(key_hash)
+        # Каждый запрос получает свою копию: запрос может запоминать данные в объекте пользователя.
+        return copy.copy(user), key_hash
+
+    def verify(self, key_hash):
+        now = timezone.now()
+        token = ApiToken.objects.select_related('user').filter(key_hash=key_hash).first()
+        if token is None or token.expires <= now:
+            raise AuthenticationFailed('Invalid or expired token.')
+        if not token.user.is_active:
+            raise AuthenticationFailed('User inactive or deleted.')
+        # Не храним токен в памяти дольше срока его действия.
+        timeout = min(get_token_cache_timeout(), (token.expires - now).total_seconds())
+        token_cache.set(key_hash, token.user, timeout)
+        return token.user
+
+    def authenticate_header(self, request):
+        return self.keyword
+
+
+# Токен - для частых запросов, сессия - для браузера, Basic - для получения токена.
+# Basic стоит первым: DRF берёт заголовок WWW-Authenticate ответа 401 у первого
+# класса, и клиенты по-прежнему получают запрос Basic realm="api".
+API_AUTHENTICATION = [BasicAuthentication, TokenAuthentication, SessionAuthentication]
@@ -0,0 +1,147 @@
+import functools
+
+from django.contrib.contenttypes.models import ContentType
+from rest_framework import serializers
+
+from ..fragments import prefetch_fragments
+from ..models import Module, Content
+from .serializers import CourseSerializer, CourseWithContentsSerializer
+
+"""
+Быстрый путь сериализации только для чтения.
+
+Поля ModelSerializer вызывают to_representation() для каждого значения каждого
+объекта, а сами объекты сначала создаются как экземпляры моделей. RowSerializer
+один раз разбирает поля обычного сериализатора и строит по ним ответ из словарей,
+полученных через QuerySet.values(): значения копируются без изменений, а
+to_representation() вызывается только для полей, которым он нужен (даты).
+Вложенные списки и HTML объектов содержимого подставляет вызывающий код.
+
+RowSerializer строится один раз на процесс для каждого класса сериализатора
+и набора запрошенных полей (row_serializer()).
+
+Вывод совпадает с выводом CourseSerializer и CourseWithContentsSerializer,
+поэтому при изменении сериализаторов быстрый путь меняется вместе с ними.
+"""
+
+# Поля, для которых значение из values() уже совпадает с представлением.
+PLAIN_FIELDS = (serializers.CharField, serializers.IntegerField, serializers.BooleanField)
+
+
+class RowSerializer(object):
+    """
+    Сериализатор словарей values() по полям сериализатора serializer_class.
+    :param fields: поля ответа (параметр запроса fields), None - все поля
+    """
+    def __init__(self, serializer_class, fields=None):
+        self.columns = []
+        self.sources = []
+        self.attached = {}
+        for name, field in serializer_class().fields.items():
+            if fields is not None and name not in fields:
+                continue
+            if isinstance(field, serializers.PrimaryKeyRelatedField):
+                source, convert = field.source + '_id', None
+            elif isinstance(field, (serializers.ListSerializer, serializers.RelatedField)):
+                # Значение вычисляется отдельно и кладётся в словарь под именем поля.
+                self.attached[name] = field
+                self.columns.append((name, name, None))
+                continue
+            elif isinstance(field, PLAIN_FIELDS):
+                source, convert = field.source, None
+            else:
+                source, convert = field.source, field.to_representation
+            self.sources.append(source)
+            self.columns.append((name, source, convert))
+
+    def to_representation(self, row):
+        data = {}
+        for name, source, convert in self.columns:
+            value = row[source]
+            data[name] = value if convert is None or value is None else convert(value)
+        return data
+
+    def child(self, name):
+        """RowSerializer вложенного списка или None, если поле не запрошено."""
+        field = self.attached.get(name)
+        return row_serializer(field.child.__class__) if field is not None else None
+
+
+@functools.lru_cache(maxsize=256)
+def _build_row_serializer(serializer_class, fields):
+    return RowSerializer(serializer_class, fields)
+
+
+def row_serializer(serializer_class, fields=None):
+    """
+    RowSerializer для класса сериализатора и полей, построенный один раз.
+    Неизвестные имена полей отбрасываются, поэтому число вариантов в кэше не
+    зависит от того, что присылают клиенты.
+    """
+    if fields is not None:
+        names = [name for name, _, _ in _build_row_serializer(serializer_class, None).columns]
+        fields = frozenset(fields).intersection(names)
+    return _build_row_serializer(serializer_class, fields)
+
+
+def instance_row(instance, sources):
+    """Словарь как из values() для уже загруженного объекта."""
+    return {source: getattr(instance, source) for source in sources}
+
+
+def serialize_courses(rows, fields=None):
+    """
+    Повторяет CourseSerializer(many=True) для словарей values() курсов.
+    Модули всех курсов загружаются одним запросом и только если они запрошены.
+    """
+    serializer = row_serializer(CourseSerializer, fields)
+    modules = serializer.child('modules')
+    if modules is not None:
+        by_course = {row['id']: [] for row in rows}
+        for module in Module.objects.filter(course_id__in=list(by_course)).values('course_id', *modules.sources):
+            by_course[module['course_id']].append(modules.to_representation(module))
+        for row in rows:
+            row['modules'] = by_course[row['id']]
+    return [serializer.to_representation(row) for row in rows]
+
+
+def course_values(queryset, fields=None):
+    """QuerySet.values() с полями, нужными serialize_courses()."""
+    sources = row_serializer(CourseSerializer, fields).sources
+    # id нужен для загрузки модулей, created и id - для постраничного вывода.
+    return queryset.values(*dict.fromkeys(sources + ['id', 'created']))
+
+
+def serialize_course_tree(course):
+    """
+    Повторяет CourseWithContentsSerializer для курса: модули и содержимое читаются
+    через values(), объекты содержимого - одним запросом на тип, их HTML - одним
+    обращением к хранилищу фрагментов.
+    """
+    serializer = row_serializer(CourseWithContentsSerializer)
+    modules = serializer.child('modules')
+    contents = modules.child('contents')
+    module_rows = list(Module.objects.filter(course=course).values('id', *modules.sources))
+    content_rows = list(Content.objects.filter(module__course=course).values(
+        'module_id', 'content_type_id', 'object_id', *contents.sources))
+
+    ids_by_type = {}
+    for row in content_rows:
+        ids_by_type.setdefault(row['content_type_id'], []).append(row['object_id'])
+    items = {}
+    for content_type_id, ids in ids_by_type.items():
+        model = ContentType.objects.get_for_id(content_type_id).model_class()
+        for pk, item in model._default_manager.in_bulk(ids).items():
+            items[content_type_id, pk] = item
+    prefetch_fragments(items.values())
+
+    by_module = {row['id']: [] for row in module_rows}
+    for row in content_rows:
+        item = items.get((row['content_type_id'], row['object_id']))
+        row['item'] = item.render() if item is not None else None
+        by_module[row['module_id']].append(contents.to_representation(row))
+    for row in module_rows:
+        row['contents'] = by_module[row['id']]
+    row = instance_row(course, serializer.sources)
+    row['modules'] = [modules.to_representation(module) for module in module_rows]
+    return serializer.to_representation(row)
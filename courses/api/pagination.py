@@ -0,0 +1,21 @@
+from rest_framework.pagination import CursorPagination
+
+"""
+Постраничный вывод по ключу (keyset): следующая страница выбирается условием
+по значениям полей ordering последнего объекта, а не смещением OFFSET, поэтому
+время ответа не зависит от номера страницы.
+"""
+
+
+class CourseCursorPagination(CursorPagination):
+    ordering = ('-created', 'id')
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+
+class SubjectCursorPagination(CursorPagination):
+    ordering = ('title', 'id')
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 200
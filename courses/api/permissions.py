@@ -1,13 +1,20 @@
 from rest_framework.permissions import BasePermission
 
+from ..enrollment import is_enrolled
+
 
 class IsEnrolled(BasePermission):
     """
-    Проверяет, является ли текущий пользователь слушателем курса, через атрибут students
-    объекта модели Course.
+    Проверяет, является ли текущий пользователь слушателем курса, по закэшированному
+    множеству его курсов (см. enrollment.py), не обращаясь к базе данных.
     """
     def has_object_permission(self, request, view, obj):
-        return obj.students.filter(id=request.user.id).exists()
-
+        return is_enrolled(request.user, obj.id)
 
 
+class IsCourseOwner(BasePermission):
+    """
+    Разрешает доступ только владельцу курса (инструктору, который его создал).
+    """
+    def has_object_permission(self, request, view, obj):
+        return obj.owner_id == request.user.id
@@ -0,0 +1,62 @@
+import math
+
+from rest_framework.renderers import JSONRenderer
+
+try:
+    import orjson
+except ImportError:  # orjson не установлен: используется стандартный модуль json.
+    orjson = None
+
+"""
+JSONRenderer, который при установленном orjson кодирует ответ им. Результат
+побайтно совпадает с выводом JSONRenderer при настройках DRF по умолчанию
+(UNICODE_JSON, COMPACT_JSON, STRICT_JSON). Даты, Decimal, ленивые строки и
+прочие типы, которые orjson кодирует иначе, передаются кодировщику DRF.
+В остальных случаях (отступы, другие настройки, ошибки кодирования) работает
+обычный JSONRenderer.
+
+orjson записывает NaN и бесконечности как null, а JSONRenderer при STRICT_JSON
+выбрасывает ValueError. Если в результате есть null, данные проверяются на такие
+числа, и при их наличии ответ кодирует JSONRenderer, чтобы ошибка была той же.
+orjson указан в requirements.txt; без него работает JSONRenderer.
+"""
+
+if orjson is not None:
+    ORJSON_OPTIONS = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS
+
+# orjson не экранирует разделители строк, а JSONRenderer экранирует их для JavaScript.
+LINE_SEPARATORS = ((b'\xe2\x80\xa8', b'\\u2028'), (b'\xe2\x80\xa9', b'\\u2029'))
+
+
+def has_non_finite(data):
+    """Есть ли в данных NaN или бесконечность."""
+    if isinstance(data, float):
+        return not math.isfinite(data)
+    if isinstance(data, dict):
+        return any(has_non_finite(value) for value in data.values())
+    if isinstance(data, (list, tuple)):
+        return any(has_non_finite(value) for value in data)
+    return False
+
+
+class FastJSONRenderer(JSONRenderer):
+    def can_use_orjson(self, accepted_media_type, renderer_context):
+        return (orjson is not None
+                and self.ensure_ascii is False
+                and self.compact and self.strict
+                and not self.get_indent(accepted_media_type, renderer_context))
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None or not self.can_use_orjson(accepted_media_type, renderer_context or {}):
+            return super(FastJSONRenderer, self).render(data, accepted_media_type, renderer_context)
+        try:
+            ret = orjson.dumps(data, default=self.encoder_class().default, option=ORJSON_OPTIONS)
+        except TypeError:
+            # Ключи не строки, слишком большие целые числа и т.п.
+            return super(FastJSONRenderer, self).render(data, accepted_media_type, renderer_context)
+        if b'null' in ret and has_non_finite(data):
+            return super(FastJSONRenderer, self).render(data, accepted_media_type, renderer_context)
+        for separator, escaped in LINE_SEPARATORS:
+            ret = ret.replace(separator, escaped)
+        return ret
+
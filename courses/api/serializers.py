@@ -6,7 +6,30 @@ from ..models import Module
 from ..models import Content
 
 
-class SubjectSerializer(serializers.ModelSerializer):
+def requested_fields(request):
+    """
+    Возвращает множество полей из параметра запроса fields=id,title
+    или None, если параметр не передан.
+    """
+    if request is None or not request.query_params.get('fields'):
+        return None
+    return {name.strip() for name in request.query_params['fields'].split(',') if name.strip()}
+
+
+class SparseFieldsMixin(object):
+    """
+    Оставляет в ответе только поля, перечисленные в параметре запроса fields.
+    Например, ?fields=id,title не включает в ответ вложенный список modules.
+    """
+    def __init__(self, *args, **kwargs):
+        super(SparseFieldsMixin, self).__init__(*args, **kwargs)
+        fields = requested_fields(self.context.get('request'))
+        if fields is not None:
+            for name in set(self.fields) - fields:
+                self.fields.pop(name)
+
+
+class SubjectSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Subject
         fields = ['id', 'title', 'slug']
@@ -18,7 +41,7 @@ class ModuleSerializer(serializers.ModelSerializer):
         fields = ['order', 'title', 'description']
 
 
-class CourseSerializer(serializers.ModelSerializer):
+class CourseSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     modules = ModuleSerializer(many=True, read_only=True)
 
     class Meta:
@@ -28,6 +51,10 @@ class CourseSerializer(serializers.ModelSerializer):
 
 
 class ItemRelatedField(serializers.RelatedField):
+    """
+    Возвращает HTML объекта содержимого. Если фрагменты были загружены заранее
+    через prefetch_content_fragments(), повторного обращения к кэшу не будет.
+    """
     def to_representation(self, value):
         return value.render()
 
@@ -41,7 +68,7 @@ class ContentSerializer(serializers.ModelSerializer):
 
 
 class ModuleWithContentSerializer(serializers.ModelSerializer):
-    contents = CourseSerializer(many=True)
+    contents = ContentSerializer(many=True)
 
     class Meta:
         model = Module
@@ -2,6 +2,7 @@ from django.urls import path, include
 from rest_framework import routers
 
 from . import views
+from .async_views import async_list_view
 
 app_name = 'courses'
 
@@ -10,8 +11,11 @@ router.register('courses', views.CourseViewSet)
 
 
 urlpatterns = [
-    path('subjects/', views.SubjectListView.as_view(), name='subject_list'),
+    path('subjects/', async_list_view(views.SubjectListView), name='subject_list'),
     path('subjects/<pk>/', views.SubjectDetailView.as_view(), name='subject_detail'),
+    path('token/', views.TokenView.as_view(), name='token'),
     # path('courses/<pk>/enroll/', views.CourseEnrollView.as_view(), name='course_enroll'),
+    # Список курсов обслуживается асинхронно, остальные адреса - маршрутизатором DRF.
+    path('courses/', async_list_view(views.CourseViewSet, {'get': 'list'}), name='course-list'),
     path('', include(router.urls)),
 ]
@@ -6,24 +6,48 @@ from rest_framework.authentication import BasicAuthentication
 from rest_framework.permissions import IsAuthenticated
 from rest_framework import viewsets
 from rest_framework.decorators import action
+from rest_framework import status
+from rest_framework.exceptions import PermissionDenied
+from django.http import StreamingHttpResponse
 
 from ..models import Subject
 from ..models import Course
+from ..models import ApiToken
 from .serializers import SubjectSerializer
 from .serializers import CourseSerializer
-from .permissions import IsEnrolled
+from .permissions import IsEnrolled, IsCourseOwner
+from .authentication import API_AUTHENTICATION, TokenAuthentication, create_token
 from .serializers import CourseWithContentsSerializer
+from .serializers import requested_fields
+from .pagination import CourseCursorPagination, SubjectCursorPagination
+from .fast import course_values, serialize_courses, serialize_course_tree
+from ..enrollment import enroll_users, count_results
+from ..conditional import course_validators, conditional_response, set_validators
+from ..search import search_course_ids
+from ..transfer import export_course, import_course, CourseImportError
+from .. import metrics
+from ..db import reads_from_replica
+from ..progress import course_content_ids, course_progress, record_completion
 
 
 class SubjectListView(generics.ListAPIView):
     queryset = Subject.objects.all()
     serializer_class = SubjectSerializer
+    pagination_class = SubjectCursorPagination
+
+    @reads_from_replica
+    def list(self, request, *args, **kwargs):
+        return super(SubjectListView, self).list(request, *args, **kwargs)
 
 
 class SubjectDetailView(generics.RetrieveAPIView):
     queryset = Subject.objects.all()
     serializer_class = SubjectSerializer
 
+    @reads_from_replica
+    def retrieve(self, request, *args, **kwargs):
+        return super(SubjectDetailView, self).retrieve(request, *args, **kwargs)
+
 
 # class CourseEnrollView(APIView):
 #     """
@@ -44,6 +68,27 @@ class SubjectDetailView(generics.RetrieveAPIView):
 #         return Response({'enrolled': True})
 
 
+class TokenView(APIView):
+    """
+    POST выдаёт токен для заголовка "Authorization: Token <токен>". Получить его можно
+    по паролю (Basic) или сессии; токен показывается только в этом ответе.
+    DELETE отзывает токен, с которым выполнен запрос.
+    """
+    authentication_classes = API_AUTHENTICATION
+    permission_classes = (IsAuthenticated,)
+
+    def post(self, request, format=None):
+        key, token = create_token(request.user)
+        return Response({'token': key, 'expires': token.expires}, status=status.HTTP_201_CREATED)
+
+    def delete(self, request, format=None):
+        if not isinstance(request.successful_authenticator, TokenAuthentication):
+            return Response({'error': 'The request must be authenticated with a token.'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        ApiToken.objects.filter(key_hash=request.auth).delete()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
 class CourseViewSet(viewsets.ReadOnlyModelViewSet):
     """
     Используем декоратор action(detail=True), чтобы показать, что метод работает с одним объектом,
@@ -55,25 +100,145 @@ class CourseViewSet(viewsets.ReadOnlyModelViewSet):
     """
     queryset = Course.objects.all()
     serializer_class = CourseSerializer
+    pagination_class = CourseCursorPagination
 
-    @action(detail=True, methods=['post'], authentication_classes=[BasicAuthentication],
+    @reads_from_replica
+    def list(self, request, *args, **kwargs):
+        # Курсы читаются через values() и сериализуются быстрым путём (см. fast.py).
+        # Модули загружаются одним запросом и только если клиент их запросил.
+        fields = requested_fields(request)
+        queryset = course_values(self.filter_queryset(self.get_queryset()), fields)
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(serialize_courses(page, fields))
+        return Response(serialize_courses(list(queryset), fields))
+
+    @action(detail=False, methods=['get'])
+    @reads_from_replica
+    def search(self, request, *args, **kwargs):
+        """
+        Полнотекстовый поиск курсов: ?q=слова&limit=20. Курсы возвращаются
+        в порядке релевантности; параметр fields работает как в списке курсов.
+        """
+        try:
+            limit = min(max(int(request.query_params.get('limit', 20)), 1), 50)
+        except ValueError:
+            limit = 20
+        ids = search_course_ids(request.query_params.get('q', ''), limit)
+        fields = requested_fields(request)
+        rows = {row['id']: row for row in course_values(self.get_queryset().filter(pk__in=ids), fields)}
+        return Response({'results': serialize_courses([rows[pk] for pk in ids if pk in rows], fields)})
+
+    def conditional(self, course, build):
+        """
+        Отвечает 304, если курс не менялся с прошлого запроса клиента, иначе
+        возвращает ответ build() с заголовками ETag и Last-Modified.
+        """
+        etag, last_modified = course_validators(self.request, course,
+                                                self.request.accepted_renderer.format)
+        response = conditional_response(self.request, etag, last_modified)
+        if response is None:
+            response = set_validators(Response(build()), etag, last_modified)
+        return response
+
+    @reads_from_replica
+    def retrieve(self, request, *args, **kwargs):
+        course = self.get_object()
+        return self.conditional(course, lambda: self.get_serializer(course).data)
+
+    @action(detail=True, methods=['post'], authentication_classes=API_AUTHENTICATION,
             permission_classes=[IsAuthenticated])
     def enroll(self, request, *args, **kwargs):
         course = self.get_object()
         course.students.add(request.user)
         return Response({'enrolled': True})
+
+    """
+    Действие enroll_cohort() записывает на курс группу студентов одним запросом.
+    Тело запроса: {"usernames": ["student1", "student2", ...]}. В ответе - итог
+    по каждому пользователю и число пользователей с каждым итогом. Доступно
+    только владельцу курса.
+    """
+    @action(detail=True, methods=['post'], url_path='enroll-cohort',
+            authentication_classes=API_AUTHENTICATION,
+            permission_classes=[IsAuthenticated, IsCourseOwner])
+    def enroll_cohort(self, request, *args, **kwargs):
+        course = self.get_object()
+        usernames = request.data.get('usernames') if isinstance(request.data, dict) else None
+        if not isinstance(usernames, list) or not all(isinstance(name, str) for name in usernames):
+            return Response({'error': 'usernames must be a list of strings.'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        results = enroll_users(course, usernames)
+        totals = count_results(results)
+        return Response(dict(totals, results=results))
     """
     Для метода contests() используем декоратор action(detail=True), чтобы показать, что метод работает с одним объектом,
     а не списком. Указываем, что метод обрабатывает только GET-запросы.
     Обращаемся к сериализатору CourseWithContentsSerializer для формирования содержимого курса для ответа
     Используем разрешения IsAuthenticated и IsEnrolled. Так мы ограничим доступ к курсам, и их содержимое
     смогут просматривать только записавшиеся студенты.
-    Вызываем существующий метод retrieve(), чтобы вернуть объект модели Course.
+    Получаем курс через get_object(), а дерево курса строим быстрым путём
+    serialize_course_tree(), который повторяет вывод CourseWithContentsSerializer.
+    Если курс не менялся, клиент получает 304 без построения дерева.
     """
     @action(detail=True, methods=['get'], serializer_class=CourseWithContentsSerializer,
-            authentication_classes=[BasicAuthentication],
+            authentication_classes=API_AUTHENTICATION,
             permission_classes=[IsAuthenticated, IsEnrolled])
     def contents(self, request, *args, **kwargs):
-        return self.retrieve(request, *args, **kwargs)
+        course = self.get_object()
+
+        def build():
+            tree = serialize_course_tree(course)
+            # Размер результата для поиска N+1 в метриках - число объектов содержимого.
+            metrics.set_result_size(sum(len(module['contents']) for module in tree['modules']))
+            return tree
+
+        return self.conditional(course, build)
+
+    """
+    Действие progress() возвращает прогресс студента по курсу: число завершённых
+    объектов содержимого, их общее число и процент. POST с телом
+    {"completed": [id объектов Content курса]} отмечает объекты завершёнными.
+    """
+    @action(detail=True, methods=['get', 'post'], authentication_classes=API_AUTHENTICATION,
+            permission_classes=[IsAuthenticated, IsEnrolled])
+    def progress(self, request, *args, **kwargs):
+        course = self.get_object()
+        if request.method == 'POST':
+            content_ids = request.data.get('completed') if isinstance(request.data, dict) else None
+            if not isinstance(content_ids, list) or not all(type(pk) is int for pk in content_ids):
+                return Response({'error': 'completed must be a list of content ids.'},
+                                status=status.HTTP_400_BAD_REQUEST)
+            course_contents = {pk for pks in course_content_ids(course.id).values() for pk in pks}
+            unknown = [pk for pk in content_ids if pk not in course_contents]
+            if unknown:
+                return Response({'error': 'Unknown content ids: {}.'.format(unknown)},
+                                status=status.HTTP_400_BAD_REQUEST)
+            record_completion(request.user, course.id, content_ids)
+        return Response(course_progress(request.user, course))
 
+    """
+    Действие export() отдаёт всё дерево курса в формате JSON Lines потоком,
+    не собирая документ в памяти. Доступно только владельцу курса.
+    Действие import_tree() создаёт курс из документа JSON Lines в теле запроса,
+    читая его построчно. Требуется право courses.add_course.
+    """
+    @action(detail=True, methods=['get'], authentication_classes=API_AUTHENTICATION,
+            permission_classes=[IsAuthenticated, IsCourseOwner])
+    def export(self, request, *args, **kwargs):
+        course = self.get_object()
+        response = StreamingHttpResponse(export_course(course), content_type='application/x-ndjson')
+        response['Content-Disposition'] = 'attachment; filename="{}.jsonl"'.format(course.slug)
+        return response
 
+    @action(detail=False, methods=['post'], url_path='import', authentication_classes=API_AUTHENTICATION,
+            permission_classes=[IsAuthenticated])
+    def import_tree(self, request, *args, **kwargs):
+        if not request.user.has_perm('courses.add_course'):
+            raise PermissionDenied
+        try:
+            # Тело запроса читается построчно из потока HttpRequest.
+            course = import_course(request._request, request.user)
+        except CourseImportError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({'id': course.id, 'slug': course.slug}, status=status.HTTP_201_CREATED)
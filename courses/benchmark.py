@@ -0,0 +1,258 @@
+import json
+import random
+import statistics
+import time
+import tracemalloc
+import uuid
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+
+from .models import Subject, Course, Module, Content, Enrollment, Text, Video, Image, File
+from .api.authentication import create_token
+from .transfer import bulk_create_with_pks
+from . import counters, search
+
+"""
+Нагрузочные сценарии для команды loadtest.
+
+generate_fixtures() заполняет базу синтетическими данными: предметы, курсы,
+модули со всеми типами содержимого и записанные на курсы студенты. Объекты
+создаются через bulk_create(), после чего пересчитываются счётчики и
+перестраивается поисковый индекс.
+
+Каждый сценарий из SCENARIOS - функция, которая по состоянию BenchmarkState
+выполняет один запрос тестовым клиентом Django. run_scenario() измеряет для
+каждого запроса время, число SQL-запросов и (по желанию) объём выделенной
+памяти через tracemalloc, а summarize() сводит их в перцентили.
+
+Прогон выполняется внутри isolated_caches(): кэши остаются теми же, что в
+настройках, но получают уникальный KEY_PREFIX, поэтому прогон не читает и не
+сбрасывает ключи работающего сайта, в том числе версии тегов (caching.py).
+"""
+
+PASSWORD = 'benchmark'
+
+FIXTURE_PREFIX = 'bench'
+
+
+def generate_fixtures(subjects=5, courses=20, modules=10, items=4, students=200, seed=0):
+    """
+    Создаёт subjects предметов, по courses курсов в каждом, по modules модулей
+    в курсе и по items объектов содержимого в модуле (типы чередуются).
+    Каждый студент записывается на случайные 1-5 курсов.
+    """
+    rng = random.Random(seed)
+    password = make_password(PASSWORD)
+    with transaction.atomic():
+        owner = User.objects.create(username='{}-instructor'.format(FIXTURE_PREFIX), password=password)
+        subject_objs = bulk_create_with_pks(Subject, [
+            Subject(title='Subject {}'.format(number), slug='{}-subject-{}'.format(FIXTURE_PREFIX, number))
+            for number in range(subjects)])
+        course_objs = bulk_create_with_pks(Course, [
+            Course(owner=owner, subject=subject, title='Course {} {}'.format(subject.pk, number),
+                   slug='{}-course-{}-{}'.format(FIXTURE_PREFIX, subject.pk, number),
+                   overview='Synthetic course about topic {}.'.format(rng.randint(0, 1000)))
+            for subject in subject_objs for number in range(courses)])
+        module_objs = bulk_create_with_pks(Module, [
+            Module(course=course, title='Module {}'.format(number),
+                   description='Description of module {}'.format(number))
+            for course in course_objs for number in range(modules)])
+
+        factories = [lambda n: Text(content='Lorem ipsum dolor sit amet {}. '.format(n) * 20),
+                     lambda n: Video(url='https://www.youtube.com/watch?v=dQw4w9WgXcQ'),
+                     lambda n: Image(file='images/bench-{}.png'.format(n)),
+                     lambda n: File(file='files/bench-{}.pdf'.format(n))]
+        placed = []
+        items_by_model = {}
+        for module in module_objs:
+            for number in range(items):
+                item = factories[number % len(factories)](len(placed))
+                item.owner = owner
+                item.title = 'Item {}'.format(number)
+                placed.append((module, item))
+                items_by_model.setdefault(type(item), []).append(item)
+        for model, model_items in items_by_model.items():
+            bulk_create_with_pks(model, model_items)
+        Content.objects.bulk_create([Content(module=module, item=item) for module, item in placed],
+                                    batch_size=500)
+
+        student_objs = bulk_create_with_pks(User, [
+            User(username='{}-student-{}'.format(FIXTURE_PREFIX, number), password=password)
+            for number in range(students)])
+        Enrollment.objects.bulk_create(
+            [Enrollment(user=student, course=course) for student in student_objs
+             for course in rng.sample(course_objs, min(len(course_objs), rng.randint(1, 5)))],
+            batch_size=500)
+        counters.reconcile()
+    search.rebuild()
+    return owner
+
+
+class BenchmarkState(object):
+    """Данные и клиенты, общие для сценариев."""
+    def __init__(self, seed=0):
+        self.rng = random.Random(seed)
+        self.owner = User.objects.get(username='{}-instructor'.format(FIXTURE_PREFIX))
+        self.subject_slugs = list(Subject.objects.values_list('slug', flat=True))
+        self.courses = list(Course.objects.filter(owner=self.owner).values_list('id', 'slug'))
+        self.enrollments = list(Enrollment.objects.filter(course__owner=self.owner)
+                                .values_list('user_id', 'course_id'))
+        self.modules = {}
+        for module_id, course_id in Module.objects.filter(course__owner=self.owner).values_list('id', 'course_id'):
+            self.modules.setdefault(course_id, []).append(module_id)
+        self.clients = {}
+        self.tokens = {}
+        self.new_students = 0
+
+    def client_for(self, user_id):
+        """Клиент с сессией пользователя (вход без проверки пароля)."""
+        if user_id not in self.clients:
+            client = Client()
+            client.force_login(User.objects.get(pk=user_id))
+            self.clients[user_id] = client
+        return self.clients[user_id]
+
+    def token_for(self, user):
+        if user.pk not in self.tokens:
+            self.tokens[user.pk] = 'Token ' + create_token(user)[0]
+        return self.tokens[user.pk]
+
+
+def catalog_browse(state, client):
+    return client.get(reverse('course_list'))
+
+
+def subject_filter(state, client):
+    return client.get(reverse('course_list_subject', args=[state.rng.choice(state.subject_slugs)]))
+
+
+def course_detail(state, client):
+    return client.get(reverse('course_detail', args=[state.rng.choice(state.courses)[1]]))
+
+
+def student_module(state, client):
+    user_id, course_id = state.rng.choice(state.enrollments)
+    module_id = state.rng.choice(state.modules[course_id])
+    return state.client_for(user_id).get(reverse('student_course_detail_module', args=[course_id, module_id]))
+
+
+def contents_api(state, client):
+    user_id, course_id = state.rng.choice(state.enrollments)
+    token = state.token_for(User(pk=user_id))
+    return client.get(reverse('api:course-contents', args=[course_id]), HTTP_AUTHORIZATION=token)
+
+
+def reorder(state, client):
+    course_id = state.rng.choice(state.courses)[0]
+    module_ids = list(state.modules[course_id])
+    state.rng.shuffle(module_ids)
+    return state.client_for(state.owner.pk).post(
+        reverse('module_order'), json.dumps({module_id: order for order, module_id in enumerate(module_ids)}),
+        content_type='application/json')
+
+
+def enroll(state, client):
+    state.new_students += 1
+    student = User.objects.create(username='{}-new-{}-{}'.format(FIXTURE_PREFIX, time.time_ns(),
+                                                                 state.new_students))
+    return client.post(reverse('api:course-enroll', args=[state.rng.choice(state.courses)[0]]),
+                       HTTP_AUTHORIZATION=state.token_for(student))
+
+
+SCENARIOS = {
+    'catalog_browse': catalog_browse,
+    'subject_filter': subject_filter,
+    'course_detail': course_detail,
+    'student_module': student_module,
+    'contents_api': contents_api,
+    'reorder': reorder,
+    'enroll': enroll,
+}
+
+
+def run_scenario(state, scenario, requests, measure_memory=False):
+    """
+    Выполняет requests запросов сценария.
+    :return: список словарей с полями status, time (с), queries и peak (байт, пик памяти)
+    """
+    client = Client()
+    samples = []
+    for _ in range(requests):
+        if measure_memory:
+            tracemalloc.start()
+        with CaptureQueriesContext(connection) as queries:
+            start = time.perf_counter()
+            response = scenario(state, client)
+            elapsed = time.perf_counter() - start
+        sample = {'status': response.status_code, 'time': elapsed, 'queries': len(queries)}
+        if measure_memory:
+            sample['peak'] = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        samples.append(sample)
+    return samples
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    if not values:
+        return 0.0
+    index = min(len(values) - 1, max(0, int(round(fraction * (len(values) - 1)))))
+    return values[index]
+
+
+def summarize(samples):
+    times = [sample['time'] * 1000 for sample in samples]
+    summary = {
+        'requests': len(samples),
+        'errors': sum(1 for sample in samples if sample['status'] >= 400),
+        'p50_ms': percentile(times, 0.5),
+        'p90_ms': percentile(times, 0.9),
+        'p99_ms': percentile(times, 0.99),
+        'mean_ms': statistics.mean(times) if times else 0.0,
+        'queries': statistics.mean(sample['queries'] for sample in samples) if samples else 0.0,
+    }
+    if samples and 'peak' in samples[0]:
+        summary['peak_kb'] = statistics.mean(sample['peak'] for sample in samples) / 1024
+    return summary
+
+
+def compare(results, baseline, threshold=0.1):
+    """
+    Сравнивает сводки с сохранёнными ранее. Регрессией считается рост p50 или
+    p90 больше чем на threshold, а также рост числа запросов к базе данных.
+    :return: список строк с описанием регрессий
+    """
+    regressions = []
+    for name, summary in results.items():
+        previous = baseline.get(name)
+        if not previous:
+            continue
+        for metric in ('p50_ms', 'p90_ms'):
+            if previous[metric] and summary[metric] > previous[metric] * (1 + threshold):
+                regressions.append('{}: {} {:.2f} -> {:.2f}'.format(name, metric, previous[metric],
+                                                                   summary[metric]))
+        if summary['queries'] > previous['queries']:
+            regressions.append('{}: queries {:.1f} -> {:.1f}'.format(name, previous['queries'],
+                                                                    summary['queries']))
+    return regressions
+
+
+def isolated_caches():
+    """override_settings, добавляющий уникальный префикс к KEY_PREFIX всех кэшей."""
+    prefix = 'loadtest-{}'.format(uuid.uuid4().hex)
+    return override_settings(CACHES={
+        alias: dict(config, KEY_PREFIX=':'.join(filter(None, [prefix, config.get('KEY_PREFIX', '')])))
+        for alias, config in settings.CACHES.items()})
+
+
+def environment():
+    """Параметры окружения, сохраняемые вместе с результатами."""
+    return {'database': connection.vendor,
+            'cache': settings.CACHES['default']['BACKEND'],
+            'search': type(search.get_backend()).__name__}
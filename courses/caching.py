@@ -0,0 +1,124 @@
+import time
+
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.db import transaction
+
+from . import metrics
+from .db import replica_active
+
+"""
+Кэширование с инвалидацией по тегам (поколениям).
+Каждый тег (например, catalog или course:5) имеет в кэше текущую версию.
+Версии всех тегов записи входят в её ключ, поэтому при изменении данных
+достаточно сменить версию тега: старые записи перестают читаться и вытесняются
+из кэша сами. Это позволяет хранить данные часами, не показывая устаревший
+каталог.
+"""
+
+CACHE_TIMEOUT = 60 * 60 * 6  # 6 часов
+
+# Данные из реплики могут отставать от основной базы и попасть в кэш уже под
+# новой версией тега, поэтому они хранятся недолго.
+REPLICA_CACHE_TIMEOUT = 60
+
+CATALOG = 'catalog'
+
+
+def course_tag(course_id):
+    return 'course:{}'.format(course_id)
+
+
+def module_tag(module_id):
+    return 'module:{}'.format(module_id)
+
+
+def user_tag(user_id):
+    return 'user:{}'.format(user_id)
+
+
+def progress_tag(user_id):
+    return 'progress:{}'.format(user_id)
+
+
+def _tag_key(tag):
+    return 'tag_version:{}'.format(tag)
+
+
+def _new_version():
+    # Версия строится из времени, а не из счётчика: если ключ тега будет вытеснен
+    # из кэша, новая версия не совпадёт ни с одной из прежних.
+    return '{:x}'.format(time.time_ns())
+
+
+def get_tag_versions(tags):
+    """Возвращает текущие версии тегов одним обращением к кэшу."""
+    keys = [_tag_key(tag) for tag in tags]
+    versions = cache.get_many(keys)
+    missing = [key for key in keys if key not in versions]
+    if missing:
+        for key in missing:
+            # add() не перезапишет версию, которую успел создать другой процесс.
+            cache.add(key, _new_version(), None)
+        versions.update(cache.get_many(missing))
+    return [str(versions.get(key, '')) for key in keys]
+
+
+def make_key(name, tags):
+    return '{}:{}'.format(name, '.'.join(get_tag_versions(tags)))
+
+
+def _timeout(timeout):
+    if replica_active() and (timeout is None or timeout > REPLICA_CACHE_TIMEOUT):
+        return REPLICA_CACHE_TIMEOUT
+    return timeout
+
+
+def cached(name, tags, compute, timeout=CACHE_TIMEOUT):
+    """
+    Возвращает значение из кэша по имени и тегам. При промахе вызывает compute()
+    и сохраняет результат. compute() должен возвращать вычисленные данные
+    (например, список), а не ленивый QuerySet.
+    """
+    computed = []
+
+    def compute_once():
+        computed.append(True)
+        return compute()
+
+    # LayeredCache выполняет get_or_set() с защитой от одновременного пересчёта.
+    value = cache.get_or_set(make_key(name, tags), compute_once, _timeout(timeout))
+    metrics.record_cache(int(not computed), int(bool(computed)))
+    return value
+
+
+async def cached_async(name, tags, compute, timeout=CACHE_TIMEOUT):
+    """
+    Асинхронный вариант cached() для асинхронных обработчиков. Обращения к кэшу
+    выполняются в пуле потоков и не блокируют цикл событий; compute() (как правило,
+    запрос к ORM, который в Django 3.1 только синхронный) - в потоке синхронного
+    кода Django. При попадании в кэш поток синхронного кода не занимается.
+    """
+    def read():
+        key = make_key(name, tags)
+        return key, cache.get(key)
+
+    key, value = await sync_to_async(read, thread_sensitive=False)()
+    metrics.record_cache(int(value is not None), int(value is None))
+    if value is None:
+        value = await sync_to_async(cache.get_or_set)(key, compute, _timeout(timeout))
+    return value
+
+
+def invalidate(*tags):
+    """
+    Меняет версии тегов после фиксации текущей транзакции, чтобы параллельный
+    запрос не успел закэшировать ещё не изменённые данные под новой версией.
+    """
+    tags = [tag for tag in tags if tag]
+
+    def bump():
+        cache.set_many({_tag_key(tag): _new_version() for tag in tags}, None)
+
+    if tags:
+        transaction.on_commit(bump)
@@ -0,0 +1,85 @@
+import hashlib
+
+from django.conf import settings
+from django.utils import translation
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+from .caching import get_tag_versions, CATALOG, course_tag
+
+"""
+Условные GET-запросы (ETag, Last-Modified) для страниц и API курса.
+
+Валидатор строится из версий тегов кэша (см. caching.py), а не из содержимого
+ответа: версия тега курса меняется при любом изменении курса, его модулей,
+содержимого и объектов содержимого, поэтому проверка стоит одного обращения
+к кэшу. Версия - это время изменения в наносекундах, из неё же берётся
+Last-Modified. В ETag также входят пользователь, язык и другие параметры,
+от которых зависит ответ.
+
+Если кэш не хранит версии (например, DummyCache), валидаторы не выдаются,
+иначе клиент получал бы 304 и после изменений.
+"""
+
+
+def tag_validators(tags, *variants):
+    """
+    Возвращает (etag, last_modified) для ответа, зависящего от тегов tags и
+    значений variants, или (None, None), если версии тегов неизвестны.
+    """
+    versions = get_tag_versions(tags)
+    if not all(versions):
+        return None, None
+    key = ':'.join(versions + [str(variant) for variant in variants])
+    etag = quote_etag(hashlib.md5(key.encode()).hexdigest())
+    # Версии - шестнадцатеричное время в наносекундах, Last-Modified - в секундах.
+    last_modified = max(int(version, 16) for version in versions) // 10 ** 9
+    return etag, last_modified
+
+
+def course_validators(request, course, *variants):
+    """Валидаторы ответа по курсу: каталог (предмет курса) и тег самого курса."""
+    user = request.user
+    return tag_validators([CATALOG, course_tag(course.pk)],
+                          user.pk if user.is_authenticated else 0,
+                          translation.get_language(),
+                          # В формах страницы есть CSRF-токен, зависящий от cookie.
+                          request.COOKIES.get(settings.CSRF_COOKIE_NAME, ''),
+                          *variants)
+
+
+def conditional_response(request, etag, last_modified):
+    """Ответ 304/412, если валидаторы запроса совпадают, иначе None."""
+    if etag is None:
+        return None
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    return set_validators(response, etag, last_modified) if response is not None else None
+
+
+def set_validators(response, etag, last_modified):
+    if etag is not None and response.status_code in (200, 304):
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified)
+        # Ответ зависит от пользователя, поэтому общие кэши не должны его хранить.
+        response['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+class ConditionalCourseMixin(object):
+    """
+    Примесь для DetailView курса: после получения объекта (с проверкой доступа
+    в get_queryset()) сверяет валидаторы запроса и возвращает 304, не строя
+    контекст и не рендеря шаблон.
+    """
+    def get_validator_variants(self):
+        """Дополнительные данные, от которых зависит страница (входят в ETag)."""
+        return ()
+
+    def get(self, request, *args, **kwargs):
+        self.object = self.get_object()
+        etag, last_modified = course_validators(request, self.object, *self.get_validator_variants())
+        response = conditional_response(request, etag, last_modified)
+        if response is None:
+            context = self.get_context_data(object=self.object)
+            response = set_validators(self.render_to_response(context), etag, last_modified)
+        return response
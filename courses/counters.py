@@ -0,0 +1,59 @@
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
+
+from .models import Subject, Course, Module, Content, ContentProgress, CourseProgress
+
+"""
+Поддержка денормализованных счётчиков Subject.total_courses, Course.total_modules,
+Course.total_students, Course.total_contents и CourseProgress.completed_contents.
+Счётчики изменяются атомарными UPDATE ... F() в той же транзакции, что и сами
+изменения, а reconcile() пересчитывает их по данным таблиц.
+"""
+
+
+def increment(queryset, field, delta):
+    if delta > 0:
+        queryset.update(**{field: F(field) + delta})
+    elif delta < 0:
+        # Счётчик не опускается ниже нуля, даже если ещё не был сверен.
+        queryset.update(**{field: Greatest(F(field) + delta, 0)})
+
+
+def _count(queryset, field):
+    return Coalesce(Subquery(queryset.filter(**{field: OuterRef('pk')})
+                             .order_by().values(field)
+                             .annotate(total=Count('*')).values('total')), 0)
+
+
+def refresh_student_counts(course_ids):
+    Course.objects.filter(pk__in=course_ids).update(
+        total_students=_count(Course.students.through.objects, 'course'))
+
+
+def refresh_progress(course_ids=None):
+    """Пересчитывает число завершённых объектов в прогрессе студентов по курсам."""
+    progress = CourseProgress.objects.all()
+    if course_ids is not None:
+        progress = progress.filter(course__in=course_ids)
+    completed = (ContentProgress.objects.filter(user=OuterRef('user'), course=OuterRef('course'),
+                                                completed__isnull=False)
+                 .order_by().values('user').annotate(total=Count('*')).values('total'))
+    progress.update(completed_contents=Coalesce(Subquery(completed), 0))
+
+
+def reconcile(course_ids=None):
+    """
+    Пересчитывает счётчики. Если заданы course_ids, пересчитываются только эти курсы
+    и их предметы.
+    """
+    courses = Course.objects.all()
+    subjects = Subject.objects.all()
+    if course_ids is not None:
+        courses = courses.filter(pk__in=course_ids)
+        subjects = subjects.filter(courses__in=course_ids).distinct()
+    courses.update(total_modules=_count(Module.objects, 'course'),
+                   total_students=_count(Course.students.through.objects, 'course'),
+                   total_contents=_count(Content.objects, 'module__course'))
+    Subject.objects.filter(pk__in=subjects.values('pk')).update(
+        total_courses=_count(Course.objects, 'subject'))
+    refresh_progress(course_ids)
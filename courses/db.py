@@ -0,0 +1,101 @@
+import asyncio
+import functools
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections, DEFAULT_DB_ALIAS
+
+"""
+Настройка соединений с базой данных для промышленного профиля
+(EducationService/settings_production.py).
+
+Чтение из реплик. ReplicaRouter направляет чтение в одну из баз
+COURSES_DB_REPLICAS только внутри use_replica() (или обработчика с
+декоратором reads_from_replica): это страницы и списки каталога, которым не
+нужно видеть только что записанные данные. Остальные запросы, в том числе
+проверки записи на курс, читают из основной базы, а запись всегда идёт в неё.
+Для SQLite "реплика" - это второе соединение с тем же файлом только для
+чтения: в режиме WAL читатели не ждут пишущую транзакцию.
+
+PRAGMAS. Для SQLite в записи DATABASES можно указать словарь PRAGMAS
+(например, journal_mode=wal, synchronous=normal), он применяется к каждому
+новому соединению. Время ожидания блокировки задаётся параметром timeout в
+OPTIONS (busy_timeout SQLite).
+
+CONN_HEALTH_CHECKS. В Django 3.1 постоянное соединение (CONN_MAX_AGE)
+используется повторно без проверки. Если в записи DATABASES указано
+CONN_HEALTH_CHECKS = True, в начале каждого запроса уже открытое соединение
+проверяется и закрывается, если сервер его разорвал (например, PgBouncer или
+PostgreSQL после перезапуска), - следующий запрос к базе откроет новое.
+"""
+
+_use_replica = ContextVar('courses_use_replica', default=False)
+
+
+def get_replicas():
+    return getattr(settings, 'COURSES_DB_REPLICAS', [])
+
+
+def replica_active():
+    """Читает ли текущий код из реплики."""
+    return _use_replica.get() and bool(get_replicas())
+
+
+@contextmanager
+def use_replica():
+    token = _use_replica.set(True)
+    try:
+        yield
+    finally:
+        _use_replica.reset(token)
+
+
+def reads_from_replica(func):
+    """Декоратор обработчика (синхронного или асинхронного), читающего из реплики."""
+    if asyncio.iscoroutinefunction(func):
+        async def wrapper(*args, **kwargs):
+            with use_replica():
+                return await func(*args, **kwargs)
+    else:
+        def wrapper(*args, **kwargs):
+            with use_replica():
+                return func(*args, **kwargs)
+    return functools.wraps(func)(wrapper)
+
+
+class ReplicaRouter(object):
+    def db_for_read(self, model, **hints):
+        replicas = get_replicas()
+        if replicas and _use_replica.get():
+            return random.choice(replicas)
+        return None
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Реплики содержат те же данные, что и основная база.
+        aliases = {DEFAULT_DB_ALIAS, *get_replicas()}
+        return obj1._state.db in aliases and obj2._state.db in aliases
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db not in get_replicas()
+
+
+def apply_pragmas(connection):
+    pragmas = connection.settings_dict.get('PRAGMAS')
+    if connection.vendor != 'sqlite' or not pragmas:
+        return
+    with connection.cursor() as cursor:
+        for name, value in pragmas.items():
+            cursor.execute('PRAGMA {} = {}'.format(name, value))
+
+
+def check_connections():
+    """Закрывает разорванные постоянные соединения (CONN_HEALTH_CHECKS)."""
+    for connection in connections.all():
+        if (connection.connection is not None and connection.settings_dict.get('CONN_HEALTH_CHECKS')
+                and not connection.in_atomic_block and not connection.is_usable()):
+            connection.close()
@@ -0,0 +1,87 @@
+from django.contrib.auth.models import User
+from django.db import transaction
+
+from .caching import cached, invalidate, user_tag
+from .models import Enrollment
+from . import counters
+
+"""
+Множество курсов, на которые записан пользователь. Хранится в кэше под тегом
+пользователя, который сбрасывается при записи на курс и отчислении (signals.py),
+и дополнительно запоминается в объекте пользователя на время запроса.
+Проверки доступа и список курсов студента читают его вместо таблицы
+courses_course_students.
+
+enroll_users() записывает на курс целую группу студентов: пользователи и
+существующие записи читаются пакетами по BATCH_SIZE, новые записи вставляются
+через bulk_create(), а счётчик курса пересчитывается одним запросом.
+"""
+
+BATCH_SIZE = 500
+
+ENROLLED = 'enrolled'
+ALREADY_ENROLLED = 'already_enrolled'
+UNKNOWN_USER = 'unknown_user'
+
+
+def enrolled_course_ids(user):
+    """Возвращает frozenset идентификаторов курсов пользователя."""
+    if not user.is_authenticated:
+        return frozenset()
+    if not hasattr(user, '_enrolled_course_ids'):
+        user._enrolled_course_ids = cached(
+            'enrolled_courses_{}'.format(user.pk), [user_tag(user.pk)],
+            lambda: frozenset(Enrollment.objects.filter(user_id=user.pk).values_list('course_id', flat=True)))
+    return user._enrolled_course_ids
+
+
+def is_enrolled(user, course_id):
+    return course_id in enrolled_course_ids(user)
+
+
+def _batches(values):
+    values = list(values)
+    for start in range(0, len(values), BATCH_SIZE):
+        yield values[start:start + BATCH_SIZE]
+
+
+def enroll_users(course, usernames):
+    """
+    Записывает пользователей на курс.
+    :return: словарь {имя пользователя: ENROLLED, ALREADY_ENROLLED или UNKNOWN_USER}
+    в порядке usernames (повторы учитываются один раз)
+    """
+    usernames = list(dict.fromkeys(name.strip() for name in usernames if name and name.strip()))
+    user_ids = {}
+    for batch in _batches(usernames):
+        user_ids.update(User.objects.filter(username__in=batch).values_list('username', 'id'))
+    with transaction.atomic():
+        existing = set()
+        for batch in _batches(user_ids.values()):
+            existing.update(Enrollment.objects.filter(course=course, user_id__in=batch)
+                            .values_list('user_id', flat=True))
+        new_ids = [user_id for user_id in user_ids.values() if user_id not in existing]
+        # ignore_conflicts: запись, созданная параллельно, не прерывает загрузку.
+        Enrollment.objects.bulk_create([Enrollment(course=course, user_id=user_id) for user_id in new_ids],
+                                       batch_size=BATCH_SIZE, ignore_conflicts=True)
+        if new_ids:
+            # bulk_create() не отправляет m2m_changed, счётчик и кэш обновляем сами.
+            counters.refresh_student_counts([course.pk])
+            invalidate(*[user_tag(user_id) for user_id in new_ids])
+    results = {}
+    for name in usernames:
+        if name not in user_ids:
+            results[name] = UNKNOWN_USER
+        elif user_ids[name] in existing:
+            results[name] = ALREADY_ENROLLED
+        else:
+            results[name] = ENROLLED
+    return results
+
+
+def count_results(results):
+    """Число пользователей с каждым итогом enroll_users()."""
+    totals = {ENROLLED: 0, ALREADY_ENROLLED: 0, UNKNOWN_USER: 0}
+    for outcome in results.values():
+        totals[outcome] += 1
+    return totals
@@ -1,5 +1,5 @@
-from django.db import models
-from django.core.exceptions import ObjectDoesNotExist
+from django.db import models, router, transaction
+from django.db.models import Max, Q
 
 """
 Создадим на основе класса PositiveIntegerField собственное поле, которое
@@ -10,6 +10,17 @@ from django.core.exceptions import ObjectDoesNotExist
 уже создано для модуля.
 2. Сортировка объектов по порядку номеров. Модули курсов и содержимое модулей
 всегда будут отсортированными внутри своего родительского объекта
+
+Номера выделяются одним запросом MAX на пакет объектов (см. allocate()). Внутри
+транзакции строки родительских объектов (курса или модуля) блокируются через
+select_for_update(), поэтому параллельные вставки в один модуль не получат
+одинаковый номер. OrderedModelMixin сохраняет объект без номера в транзакции,
+поэтому блокировка, MAX и INSERT выполняются в одной транзакции и при вызове
+save() или create() вне transaction.atomic(); bulk_create() открывает её сам.
+
+Уникального ограничения на (родитель, order) нет: reorder() (ordering.py)
+меняет номера местами одним UPDATE, а SQLite проверяет уникальность после
+каждой строки. Номера назначаются без повторов только при вставке.
 """
 
 
@@ -18,22 +29,86 @@ class OrderField(models.PositiveIntegerField):
         self.for_fields = for_fields
         super(OrderField, self).__init__(*args, **kwargs)
 
+    def get_group_fields(self):
+        # Используем attname (course_id, module_id), чтобы не загружать связанные объекты.
+        return [self.model._meta.get_field(name) for name in self.for_fields or []]
+
+    def lock_parents(self, groups, using):
+        """Блокирует строки родительских объектов до конца текущей транзакции."""
+        if not transaction.get_connection(using).in_atomic_block:
+            return
+        for index, field in enumerate(self.get_group_fields()):
+            if field.is_relation:
+                pks = {key[index] for key in groups if key[index] is not None}
+                list(field.remote_field.model._default_manager.db_manager(using)
+                     .select_for_update().filter(pk__in=pks).values_list('pk'))
+
+    def allocate(self, instances, using=None):
+        """
+        Назначает порядковые номера всем объектам из instances, у которых они не заданы.
+        Для всего пакета выполняется один запрос MAX, сгруппированный по полям for_fields.
+        """
+        pending = [obj for obj in instances if getattr(obj, self.attname) is None]
+        if not pending:
+            return
+        using = using or router.db_for_write(self.model, instance=pending[0])
+        attnames = [field.attname for field in self.get_group_fields()]
+        groups = {}
+        for obj in pending:
+            key = tuple(getattr(obj, attname) for attname in attnames)
+            groups.setdefault(key, []).append(obj)
+
+        self.lock_parents(groups, using)
+        qs = self.model._default_manager.db_manager(using).order_by()
+        if attnames:
+            condition = Q()
+            for key in groups:
+                condition |= Q(**dict(zip(attnames, key)))
+            last_values = {tuple(row[:-1]): row[-1] for row in
+                           qs.filter(condition).values(*attnames)
+                             .annotate(last=Max(self.attname)).values_list(*attnames, 'last')}
+        else:
+            last_values = {(): qs.aggregate(last=Max(self.attname))['last']}
+
+        for key, objs in groups.items():
+            last = last_values.get(key)
+            value = 0 if last is None else last + 1
+            for obj in objs:
+                setattr(obj, self.attname, value)
+                value += 1
+
     def pre_save(self, model_instance, add):
         if getattr(model_instance, self.attname) is None:
-
-            try:
-                qs = self.model.objects.all()
-                if self.for_fields:
-                    # Фильтруем объекты с такими же значениями полей,
-                    # перечисленных в "for_fields".
-                    query = {field:getattr(model_instance, field) for field in self.for_fields}
-                    qs = qs.filter(**query)
-                # Получаем заказ последнего объекта.
-                last_item = qs.latest(self.attname)
-                value = last_item.order + 1
-            except ObjectDoesNotExist:
-                value = 0
-            setattr(model_instance, self.attname, value)
-            return value
+            self.allocate([model_instance], using=model_instance._state.db)
+            return getattr(model_instance, self.attname)
         else:
             return super(OrderField, self).pre_save(model_instance, add)
+
+
+class OrderedModelMixin(object):
+    """
+    Примесь для моделей с OrderField: если порядковый номер не задан, объект
+    сохраняется внутри transaction.atomic(), чтобы блокировка родителя,
+    запрос MAX и INSERT выполнялись в одной транзакции.
+    """
+    def save(self, *args, **kwargs):
+        if not any(isinstance(field, OrderField) and getattr(self, field.attname) is None
+                   for field in self._meta.concrete_fields):
+            return super(OrderedModelMixin, self).save(*args, **kwargs)
+        using = kwargs.get('using') or router.db_for_write(type(self), instance=self)
+        with transaction.atomic(using=using, savepoint=False):
+            super(OrderedModelMixin, self).save(*args, **kwargs)
+
+
+class OrderedQuerySet(models.QuerySet):
+    """
+    QuerySet, в котором bulk_create() назначает порядковые номера всему пакету
+    сразу, вместо отдельного запроса на каждую строку.
+    """
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = list(objs)
+        with transaction.atomic(using=self.db, savepoint=False):
+            for field in self.model._meta.concrete_fields:
+                if isinstance(field, OrderField):
+                    field.allocate(objs, using=self.db)
+            return super(OrderedQuerySet, self).bulk_create(objs, *args, **kwargs)
@@ -0,0 +1,94 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import prefetch_related_objects
+from django.template.loader import render_to_string
+from django.utils import translation
+from django.utils.safestring import mark_safe
+
+from . import metrics
+
+"""
+Хранилище заранее сгенерированных HTML-фрагментов объектов содержимого.
+Фрагмент хранится в кэше отдельно для каждого объекта, языка и значения поля
+updated. Так как отметка времени входит в ключ, устаревшие фрагменты никогда
+не читаются: после сохранения объекта у него появляется новый ключ, а старый
+просто вытесняется из кэша по истечении срока.
+"""
+
+FRAGMENT_TIMEOUT = 60 * 60 * 24 * 7  # неделя
+
+
+def fragment_key(item, language):
+    return 'item_fragment:{}:{}:{}:{}'.format(item._meta.model_name,
+                                              item.pk,
+                                              language,
+                                              item.updated.timestamp())
+
+
+def render_item(item):
+    """Генерирует HTML объекта содержимого по шаблону, названному по имени модели."""
+    return render_to_string('courses/content/{}.html'.format(
+        item._meta.model_name), {'item': item})
+
+
+def build_fragments(item):
+    """Генерирует и сохраняет фрагменты объекта для всех языков сайта."""
+    fragments = {}
+    for language, _ in settings.LANGUAGES:
+        with translation.override(language):
+            fragments[fragment_key(item, language)] = render_item(item)
+    cache.set_many(fragments, FRAGMENT_TIMEOUT)
+
+
+def prefetch_for_render(items):
+    """
+    Загружает связанные объекты, нужные шаблонам содержимого (например, варианты
+    изображений), одним запросом на модель. Модель перечисляет их в fragment_prefetch.
+    """
+    by_model = {}
+    for item in items:
+        by_model.setdefault(type(item), []).append(item)
+    for model, model_items in by_model.items():
+        lookups = getattr(model, 'fragment_prefetch', ())
+        if lookups:
+            prefetch_related_objects(model_items, *lookups)
+
+
+def prefetch_fragments(items, language=None):
+    """
+    Загружает фрагменты для набора объектов одним обращением к кэшу и сохраняет их
+    в атрибуте _fragments каждого объекта. Отсутствующие в кэше фрагменты
+    генерируются и записываются одним вызовом set_many().
+    """
+    language = language or translation.get_language()
+    items = [item for item in items
+             if item.pk and item.updated and language not in getattr(item, '_fragments', {})]
+    if not items:
+        return
+    keys = {fragment_key(item, language): item for item in items}
+    found = cache.get_many(list(keys))
+    metrics.record_cache(len(found), len(keys) - len(found))
+    prefetch_for_render([item for key, item in keys.items() if key not in found])
+    missing = {}
+    for key, item in keys.items():
+        if key in found:
+            html = mark_safe(found[key])
+        else:
+            html = missing[key] = render_item(item)
+        item.__dict__.setdefault('_fragments', {})[language] = html
+    if missing:
+        cache.set_many(missing, FRAGMENT_TIMEOUT)
+
+
+def get_fragment(item):
+    """Возвращает HTML объекта, используя хранилище фрагментов."""
+    if not item.pk or not item.updated:
+        return render_item(item)
+    language = translation.get_language()
+    prefetch_fragments([item], language)
+    return item._fragments[language]
+
+
+def prefetch_content_fragments(contents):
+    """Загружает фрагменты для объектов item набора Content (item должны быть предзагружены)."""
+    prefetch_fragments([content.item for content in contents if content.item is not None])
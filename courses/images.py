@@ -0,0 +1,111 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connection, transaction
+from django.utils import timezone
+
+try:
+    from PIL import Image as PILImage, ImageOps
+except ImportError:  # Pillow не установлен: изображения отдаются без вариантов.
+    PILImage = None
+
+"""
+Генерация уменьшенных вариантов изображений. После сохранения объекта Image
+задача ставится в локальный пул потоков; для каждой ширины из VARIANT_WIDTHS,
+меньшей ширины оригинала, создаются варианты в форматах WebP и JPEG, а их
+размеры сохраняются в ImageVariant. Шаблон image.html выводит их в srcset.
+При COURSES_IMAGE_WORKERS = 0 варианты генерируются синхронно.
+"""
+
+logger = logging.getLogger(__name__)
+
+VARIANT_WIDTHS = (320, 640, 1280)
+
+VARIANT_FORMATS = (('webp', 'WEBP'), ('jpeg', 'JPEG'))
+
+_executor = None
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=settings.COURSES_IMAGE_WORKERS,
+                                       thread_name_prefix='image-variants')
+    return _executor
+
+
+def schedule_variants(image_id):
+    if getattr(settings, 'COURSES_IMAGE_WORKERS', 0):
+        get_executor().submit(_run_in_worker, image_id)
+    else:
+        generate_variants(image_id)
+
+
+def _run_in_worker(image_id):
+    try:
+        generate_variants(image_id)
+    except Exception:
+        logger.exception('Failed to generate variants for image %s', image_id)
+    finally:
+        # Соединение потока пула не закрывается обработчиком запроса.
+        connection.close()
+
+
+def _encode(image, image_format):
+    buffer = BytesIO()
+    if image_format == 'JPEG' and image.mode not in ('RGB', 'L'):
+        image = image.convert('RGB')
+    image.save(buffer, image_format, quality=82)
+    return buffer.getvalue()
+
+
+def generate_variants(image_id):
+    from .models import Image, ImageVariant
+    from .caching import invalidate, course_tag, module_tag
+    from .models import Content
+    from . import fragments
+
+    if PILImage is None:
+        return
+    image = Image.objects.filter(pk=image_id).first()
+    if image is None or not image.file:
+        return
+    try:
+        with image.file.open('rb') as file:
+            source = PILImage.open(file)
+            source.load()
+    except (OSError, SyntaxError):
+        # Загружен файл, который не является изображением.
+        logger.warning('Image %s is not a readable picture', image_id)
+        return
+    source = ImageOps.exif_transpose(source)
+    width, height = source.size
+
+    variants = []
+    for target_width in VARIANT_WIDTHS:
+        if target_width >= width:
+            break
+        target_height = max(round(height * target_width / width), 1)
+        resized = source.resize((target_width, target_height), PILImage.LANCZOS)
+        for extension, image_format in VARIANT_FORMATS:
+            variant = ImageVariant(image=image, format=extension,
+                                   width=target_width, height=target_height)
+            variant.file.save('{}w.{}'.format(target_width, extension),
+                              ContentFile(_encode(resized, image_format)), save=False)
+            variants.append(variant)
+
+    with transaction.atomic():
+        for old in image.variants.all():
+            old.delete()
+        ImageVariant.objects.bulk_create(variants)
+        # Новое значение updated даёт новый ключ HTML-фрагмента.
+        Image.objects.filter(pk=image_id).update(width=width, height=height, updated=timezone.now())
+        tags = []
+        for module_id, course_id in Content.objects.filter(
+                content_type__model='image', object_id=image_id).values_list('module_id', 'module__course_id'):
+            tags += [course_tag(course_id), module_tag(module_id)]
+        invalidate(*tags)
+    fragments.build_fragments(Image.objects.get(pk=image_id))
@@ -0,0 +1,269 @@
+import math
+import pickle
+import random
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+from django.core.cache import caches
+from django.core.cache.backends.base import BaseCache, DEFAULT_TIMEOUT
+
+"""
+Двухуровневый бэкенд кэша: небольшой LRU-кэш в памяти процесса (L1) перед
+общим кэшем, например memcached (L2).
+
+    CACHES = {
+        'default': {
+            'BACKEND': 'courses.layered_cache.LayeredCache',
+            'LOCATION': 'memcached',  # псевдоним кэша L2
+            'OPTIONS': {'L1_TIMEOUT': 5, 'L1_MAX_ENTRIES': 1000},
+        },
+        'memcached': {...},
+    }
+
+Чтение сначала ищет ключ в L1, затем в L2 и запоминает найденное в L1 не
+дольше L1_TIMEOUT секунд. Запись и удаление идут в L2 и сразу меняют L1 этого
+процесса; другие процессы видят изменение не позже, чем через L1_TIMEOUT.
+Значит, и смена версии тега (caching.invalidate()) доходит до других процессов
+с этой задержкой. В L1 значения хранятся сериализованными, как в LocMemCache,
+чтобы изменения полученного объекта не попадали в кэш.
+
+get_or_set() защищает от одновременного пересчёта (cache stampede):
+- пересчёт одного ключа выполняет один поток процесса и один процесс из всех:
+  остальные ждут появления значения в L2, пока существует блокировка (ключ,
+  добавленный через add() в L2, на LOCK_TIMEOUT секунд). Если add() не удался,
+  а блокировки нет (L2 недоступен или вычислявший процесс уже закончил),
+  значение вычисляется сразу;
+- значение может быть пересчитано заранее, до истечения срока (вероятностное
+  раннее обновление XFetch): чем ближе срок и чем дольше значение вычислялось,
+  тем выше вероятность, что очередной запрос обновит его, пока остальные
+  получают прежнее значение. Для этого значения из get_or_set() хранятся
+  вместе со временем вычисления и сроком действия.
+"""
+
+Envelope = namedtuple('Envelope', 'value delta expires')
+
+LOCK_TIMEOUT = 30
+LOCK_WAIT = 5
+LOCK_POLL_INTERVAL = 0.05
+LOCK_STRIPES = 64
+
+
+def _unwrap(value):
+    return value.value if isinstance(value, Envelope) else value
+
+
+class LocalLRU(object):
+    """Потокобезопасный LRU-кэш сериализованных значений со сроком действия."""
+    def __init__(self, max_entries, timeout):
+        self.max_entries = max_entries
+        self.timeout = timeout
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            data = entry[1]
+        return pickle.loads(data)
+
+    def set(self, key, value, timeout=None):
+        """timeout - срок действия записи в L2 (None - бессрочно), L1 хранит не дольше self.timeout."""
+        lifetime = self.timeout if timeout is None else min(self.timeout, timeout)
+        if lifetime <= 0:
+            self.discard(key)
+            return
+        data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        with self.lock:
+            self.entries[key] = (time.monotonic() + lifetime, data)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def discard(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+# Django создаёт экземпляры бэкендов отдельно для каждого потока, а L1 и
+# блокировки пересчёта должны быть общими для процесса (как в LocMemCache).
+_shared = {}
+_shared_lock = threading.Lock()
+
+
+class LayeredCache(BaseCache):
+    def __init__(self, location, params):
+        super(LayeredCache, self).__init__(params)
+        options = params.get('OPTIONS', {})
+        self.l2_alias = location
+        self.xfetch_beta = options.get('XFETCH_BETA', 1.0)
+        with _shared_lock:
+            if location not in _shared:
+                _shared[location] = (LocalLRU(options.get('L1_MAX_ENTRIES', 1000), options.get('L1_TIMEOUT', 5)),
+                                     [threading.RLock() for _ in range(LOCK_STRIPES)])
+            self.l1, self.stripes = _shared[location]
+
+    @property
+    def l2(self):
+        # caches хранит экземпляры бэкендов отдельно для каждого потока.
+        return caches[self.l2_alias]
+
+    def _timeout_seconds(self, timeout):
+        return self.default_timeout if timeout is DEFAULT_TIMEOUT else timeout
+
+    def _l1_key(self, key, version):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return key
+
+    def _read(self, key, version):
+        """Значение (возможно, Envelope) из L1 или L2."""
+        l1_key = self._l1_key(key, version)
+        value = self.l1.get(l1_key)
+        if value is None:
+            value = self.l2.get(key, version=version)
+            if value is not None:
+                self.l1.set(l1_key, value)
+        return value
+
+    def get(self, key, default=None, version=None):
+        value = self._read(key, version)
+        return default if value is None else _unwrap(value)
+
+    def get_many(self, keys, version=None):
+        found = {}
+        missing = []
+        for key in keys:
+            value = self.l1.get(self._l1_key(key, version))
+            if value is None:
+                missing.append(key)
+            else:
+                found[key] = value
+        if missing:
+            for key, value in self.l2.get_many(missing, version=version).items():
+                self.l1.set(self._l1_key(key, version), value)
+                found[key] = value
+        return {key: _unwrap(value) for key, value in found.items()}
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.l2.set(key, value, timeout=timeout, version=version)
+        self.l1.set(self._l1_key(key, version), value, self._timeout_seconds(timeout))
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        added = self.l2.add(key, value, timeout=timeout, version=version)
+        if added:
+            self.l1.set(self._l1_key(key, version), value, self._timeout_seconds(timeout))
+        else:
+            self.l1.discard(self._l1_key(key, version))
+        return added
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        failed = self.l2.set_many(data, timeout=timeout, version=version)
+        for key, value in data.items():
+            if key in failed:
+                self.l1.discard(self._l1_key(key, version))
+            else:
+                self.l1.set(self._l1_key(key, version), value, self._timeout_seconds(timeout))
+        return failed
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        self.l1.discard(self._l1_key(key, version))
+        return self.l2.touch(key, timeout=timeout, version=version)
+
+    def delete(self, key, version=None):
+        self.l1.discard(self._l1_key(key, version))
+        return self.l2.delete(key, version=version)
+
+    def delete_many(self, keys, version=None):
+        for key in keys:
+            self.l1.discard(self._l1_key(key, version))
+        self.l2.delete_many(keys, version=version)
+
+    def has_key(self, key, version=None):
+        return self.l1.get(self._l1_key(key, version)) is not None or self.l2.has_key(key, version=version)
+
+    def incr(self, key, delta=1, version=None):
+        self.l1.discard(self._l1_key(key, version))
+        return self.l2.incr(key, delta, version=version)
+
+    def decr(self, key, delta=1, version=None):
+        self.l1.discard(self._l1_key(key, version))
+        return self.l2.decr(key, delta, version=version)
+
+    def clear(self):
+        self.l1.clear()
+        self.l2.clear()
+
+    def close(self, **kwargs):
+        self.l2.close(**kwargs)
+
+    def should_refresh(self, envelope):
+        """XFetch: истина с вероятностью, растущей к концу срока значения."""
+        if envelope.expires is None:
+            return False
+        # 1 - random() лежит в (0, 1], логарифм не бывает бесконечным.
+        gap = -envelope.delta * self.xfetch_beta * math.log(1 - random.random())
+        return time.time() + gap >= envelope.expires
+
+    def get_or_set(self, key, default, timeout=DEFAULT_TIMEOUT, version=None):
+        value = self._read(key, version)
+        if value is not None and not (isinstance(value, Envelope) and self.should_refresh(value)):
+            return _unwrap(value)
+        if not callable(default):
+            if value is None and default is not None:
+                self.add(key, default, timeout=timeout, version=version)
+                return self.get(key, default, version=version)
+            return _unwrap(value) if value is not None else default
+
+        l1_key = self._l1_key(key, version)
+        with self.stripes[hash(l1_key) % LOCK_STRIPES]:
+            # Пока поток ждал блокировку, значение мог вычислить или обновить другой поток.
+            current = self._read(key, version)
+            if current is not None and (value is None or not isinstance(current, Envelope)
+                                        or current.expires != value.expires):
+                return _unwrap(current)
+            lock_key = '{}:lock'.format(key)
+            if self.l2.add(lock_key, 1, LOCK_TIMEOUT, version=version):
+                try:
+                    return self._compute(key, default, timeout, version)
+                finally:
+                    self.l2.delete(lock_key, version=version)
+            if value is not None:
+                # Раннее обновление уже выполняет другой процесс.
+                return _unwrap(value)
+            deadline = time.monotonic() + LOCK_WAIT
+            while self.l2.get(lock_key, version=version) is not None and time.monotonic() < deadline:
+                time.sleep(LOCK_POLL_INTERVAL)
+                value = self.l2.get(key, version=version)
+                if value is not None:
+                    self.l1.set(l1_key, value)
+                    return _unwrap(value)
+            # Вычислявший процесс мог сохранить значение и снять блокировку между проверками.
+            value = self.l2.get(key, version=version)
+            if value is not None:
+                self.l1.set(l1_key, value)
+                return _unwrap(value)
+            # L2 недоступен, вычислявший процесс завершился с ошибкой или не успел: вычисляем сами.
+            return self._compute(key, default, timeout, version)
+
+    def _compute(self, key, default, timeout, version):
+        start = time.monotonic()
+        value = default()
+        if value is None:
+            return None
+        seconds = self._timeout_seconds(timeout)
+        if seconds is not None and seconds <= 0:
+            return value
+        envelope = Envelope(value, time.monotonic() - start, time.time() + seconds if seconds else None)
+        self.set(key, envelope, timeout=timeout, version=version)
+        return value
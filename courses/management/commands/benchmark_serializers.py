@@ -0,0 +1,66 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.renderers import JSONRenderer
+
+from courses.api.fast import course_values, serialize_courses, serialize_course_tree
+from courses.api.renderers import FastJSONRenderer
+from courses.api.serializers import CourseSerializer, CourseWithContentsSerializer
+from courses.fragments import prefetch_content_fragments
+from courses.models import Course
+
+
+class Command(BaseCommand):
+    help = ('Compares the DRF serializers with the fast read-only path for the course list '
+            'and course contents, including queries and JSON rendering.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('-n', '--repeat', type=int, default=20,
+                            help='Number of runs of each path. Defaults to 20.')
+        parser.add_argument('--course', help='Slug of the course for the contents benchmark. '
+                                             'Defaults to the course with the most modules.')
+
+    def handle(self, *args, **options):
+        if not Course.objects.exists():
+            raise CommandError('There are no courses to serialize.')
+        if options['course']:
+            course = Course.objects.filter(slug=options['course']).first()
+            if course is None:
+                raise CommandError('Course "{}" does not exist.'.format(options['course']))
+        else:
+            course = Course.objects.order_by('-total_modules').first()
+
+        def drf_list():
+            return JSONRenderer().render(CourseSerializer(Course.objects.prefetch_related('modules'),
+                                                          many=True).data)
+
+        def fast_list():
+            return FastJSONRenderer().render(serialize_courses(list(course_values(Course.objects.all()))))
+
+        def drf_contents():
+            tree = Course.objects.with_contents().get(pk=course.pk)
+            prefetch_content_fragments(content for module in tree.modules.all()
+                                       for content in module.contents.all())
+            return JSONRenderer().render(CourseWithContentsSerializer(tree).data)
+
+        def fast_contents():
+            return FastJSONRenderer().render(serialize_course_tree(course))
+
+        self.compare('course list', drf_list, fast_list, options['repeat'])
+        self.compare('contents of "{}"'.format(course.slug), drf_contents, fast_contents, options['repeat'])
+
+    def compare(self, name, drf, fast, repeat):
+        if drf() != fast():
+            # Первый вызов также прогревает кэш фрагментов.
+            self.stderr.write(self.style.ERROR('{}: outputs differ'.format(name)))
+        drf_time = self.measure(drf, repeat)
+        fast_time = self.measure(fast, repeat)
+        self.stdout.write('{}: DRF {:.2f} ms, fast {:.2f} ms, x{:.1f}'.format(
+            name, drf_time * 1000, fast_time * 1000, drf_time / fast_time if fast_time else 0))
+
+    def measure(self, func, repeat):
+        """Среднее время одного вызова."""
+        start = time.perf_counter()
+        for _ in range(repeat):
+            func()
+        return (time.perf_counter() - start) / max(repeat, 1)
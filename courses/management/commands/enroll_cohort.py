@@ -0,0 +1,48 @@
+import csv
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from courses.enrollment import enroll_users, count_results
+from courses.models import Course
+
+
+class Command(BaseCommand):
+    help = ('Enrolls the users listed in a CSV file in a course. The usernames are read from '
+            'the "username" column, or from the first column if there is no such header. '
+            'Prints the outcome for every user as CSV.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('slug', help='Slug of the course.')
+        parser.add_argument('path', help='CSV file with usernames, or "-" for stdin.')
+
+    def handle(self, *args, **options):
+        try:
+            course = Course.objects.get(slug=options['slug'])
+        except Course.DoesNotExist:
+            raise CommandError('Course "{}" does not exist.'.format(options['slug']))
+        if options['path'] == '-':
+            usernames = self.read_usernames(sys.stdin)
+        else:
+            try:
+                with open(options['path'], newline='', encoding='utf-8') as file:
+                    usernames = self.read_usernames(file)
+            except OSError as e:
+                raise CommandError(str(e))
+
+        results = enroll_users(course, usernames)
+        writer = csv.writer(self.stdout, lineterminator='\n')
+        writer.writerow(['username', 'result'])
+        writer.writerows(results.items())
+        totals = count_results(results)
+        self.stderr.write(self.style.SUCCESS(
+            'Enrolled {enrolled}, already enrolled {already_enrolled}, '
+            'unknown users {unknown_user}.'.format(**totals)))
+
+    def read_usernames(self, file):
+        rows = csv.reader(file)
+        header = next(rows, [])
+        column = header.index('username') if 'username' in header else 0
+        usernames = [] if 'username' in header else header[:1]
+        usernames += [row[column] for row in rows if len(row) > column]
+        return usernames
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from courses.models import Course
+from courses.transfer import export_course
+
+
+class Command(BaseCommand):
+    help = 'Exports a course tree as a JSON Lines document.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('slug', help='Slug of the course to export.')
+        parser.add_argument('-o', '--output', help='Output file. Defaults to stdout.')
+
+    def handle(self, *args, **options):
+        try:
+            course = Course.objects.select_related('subject').get(slug=options['slug'])
+        except Course.DoesNotExist:
+            raise CommandError('Course "{}" does not exist.'.format(options['slug']))
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as output:
+                output.writelines(export_course(course))
+        else:
+            for line in export_course(course):
+                self.stdout.write(line, ending='')
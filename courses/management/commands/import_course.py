@@ -0,0 +1,30 @@
+import sys
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from courses.transfer import import_course, CourseImportError
+
+
+class Command(BaseCommand):
+    help = 'Imports a course tree from a JSON Lines document.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='JSON Lines file to import, or "-" for stdin.')
+        parser.add_argument('--owner', required=True, help='Username of the course owner.')
+
+    def handle(self, *args, **options):
+        try:
+            owner = User.objects.get(username=options['owner'])
+        except User.DoesNotExist:
+            raise CommandError('User "{}" does not exist.'.format(options['owner']))
+        try:
+            if options['path'] == '-':
+                course = import_course(sys.stdin, owner)
+            else:
+                with open(options['path'], encoding='utf-8') as lines:
+                    course = import_course(lines, owner)
+        except CourseImportError as e:
+            raise CommandError(str(e))
+        self.stdout.write(self.style.SUCCESS(
+            'Imported course "{}" ({} modules).'.format(course.slug, course.modules.count())))
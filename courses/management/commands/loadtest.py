@@ -0,0 +1,81 @@
+import json
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import setup_databases, teardown_databases, setup_test_environment, \
+    teardown_test_environment
+from django.utils import translation
+
+from courses import benchmark
+
+
+class Command(BaseCommand):
+    help = ('Generates synthetic courses and runs request scenarios against them with the Django '
+            'test client, reporting latency percentiles, query counts and memory per scenario. '
+            'By default a throwaway test database is used.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--subjects', type=int, default=5)
+        parser.add_argument('--courses', type=int, default=20, help='Courses per subject.')
+        parser.add_argument('--modules', type=int, default=10, help='Modules per course.')
+        parser.add_argument('--items', type=int, default=4, help='Content items per module.')
+        parser.add_argument('--students', type=int, default=200)
+        parser.add_argument('-n', '--requests', type=int, default=200, help='Measured requests per scenario.')
+        parser.add_argument('--warmup', type=int, default=20, help='Unmeasured requests per scenario.')
+        parser.add_argument('--scenario', action='append', choices=sorted(benchmark.SCENARIOS),
+                            help='Scenario to run; may be repeated. Defaults to all.')
+        parser.add_argument('--memory', action='store_true',
+                            help='Measure peak memory per request with tracemalloc (slower).')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('-o', '--output', help='Save the results as JSON.')
+        parser.add_argument('--compare', help='JSON results of a previous run to compare with.')
+        parser.add_argument('--threshold', type=float, default=0.1,
+                            help='Allowed latency growth before a regression is reported. Defaults to 0.1.')
+
+    def handle(self, *args, **options):
+        baseline = None
+        if options['compare']:
+            try:
+                with open(options['compare'], encoding='utf-8') as file:
+                    baseline = json.load(file)['results']
+            except (OSError, ValueError, KeyError) as e:
+                raise CommandError('Cannot read {}: {}'.format(options['compare'], e))
+
+        setup_test_environment()
+        old_config = setup_databases(verbosity=0, interactive=False)
+        try:
+            with translation.override(settings.LANGUAGES[0][0]), benchmark.isolated_caches():
+                report = self.run(options)
+        finally:
+            teardown_databases(old_config, verbosity=0)
+            teardown_test_environment()
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                json.dump(report, file, indent=2)
+        if baseline is not None:
+            regressions = benchmark.compare(report['results'], baseline, options['threshold'])
+            if regressions:
+                raise CommandError('Regressions:\n' + '\n'.join(regressions))
+            self.stdout.write(self.style.SUCCESS('No regressions against {}.'.format(options['compare'])))
+
+    def run(self, options):
+        parameters = {name: options[name] for name in ('subjects', 'courses', 'modules', 'items',
+                                                       'students', 'requests', 'warmup', 'seed')}
+        benchmark.generate_fixtures(options['subjects'], options['courses'], options['modules'],
+                                    options['items'], options['students'], seed=options['seed'])
+        state = benchmark.BenchmarkState(seed=options['seed'])
+        results = {}
+        self.stdout.write('{:<16}{:>8}{:>8}{:>10}{:>10}{:>10}{:>10}{:>10}'.format(
+            'scenario', 'reqs', 'errors', 'p50 ms', 'p90 ms', 'p99 ms', 'queries', 'peak KB'))
+        for name in options['scenario'] or list(benchmark.SCENARIOS):
+            scenario = benchmark.SCENARIOS[name]
+            benchmark.run_scenario(state, scenario, options['warmup'])
+            summary = benchmark.summarize(benchmark.run_scenario(state, scenario, options['requests'],
+                                                                 measure_memory=options['memory']))
+            results[name] = summary
+            self.stdout.write('{:<16}{:>8}{:>8}{:>10.2f}{:>10.2f}{:>10.2f}{:>10.1f}{:>10}'.format(
+                name, summary['requests'], summary['errors'], summary['p50_ms'], summary['p90_ms'],
+                summary['p99_ms'], summary['queries'],
+                '{:.0f}'.format(summary['peak_kb']) if 'peak_kb' in summary else '-'))
+        return {'environment': benchmark.environment(), 'parameters': parameters, 'results': results}
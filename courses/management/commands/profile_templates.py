@@ -0,0 +1,54 @@
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from courses.profiling import profile_templates
+
+
+class Command(BaseCommand):
+    help = ('Requests a page of the site with the Django test client against the current database '
+            'and reports template render time per template and per tag.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Page path including the language prefix, e.g. /en/course/module/1/.')
+        parser.add_argument('--user', help='Username to log in as.')
+        parser.add_argument('-n', '--repeat', type=int, default=5,
+                            help='Number of profiled requests after a warm-up request. Defaults to 5.')
+        parser.add_argument('--limit', type=int, default=20, help='Rows per table. Defaults to 20.')
+
+    def handle(self, *args, **options):
+        client = Client()
+        if options['user']:
+            user = User.objects.filter(username=options['user']).first()
+            if user is None:
+                raise CommandError('User "{}" does not exist.'.format(options['user']))
+            client.force_login(user)
+        repeat = max(options['repeat'], 1)
+
+        with override_settings(ALLOWED_HOSTS=list(settings.ALLOWED_HOSTS) + ['testserver']):
+            # Первый запрос компилирует шаблоны и заполняет кэши, его не учитываем.
+            start = time.perf_counter()
+            response = client.get(options['path'])
+            cold = time.perf_counter() - start
+            if response.status_code != 200:
+                raise CommandError('{} returned {}.'.format(options['path'], response.status_code))
+
+            elapsed = 0.0
+            with profile_templates() as profile:
+                for _ in range(repeat):
+                    with CaptureQueriesContext(connection) as queries:
+                        start = time.perf_counter()
+                        client.get(options['path'])
+                        elapsed += time.perf_counter() - start
+                    # Журнал запросов очищается в начале следующего запроса.
+                    query_count = len(queries)
+
+        self.stdout.write('First request: {:.2f} ms'.format(cold * 1000))
+        self.stdout.write('Request: {:.2f} ms, {} SQL queries'.format(elapsed / repeat * 1000, query_count))
+        self.stdout.write('Totals over {} requests:\n'.format(repeat))
+        self.stdout.write(profile.report(options['limit']))
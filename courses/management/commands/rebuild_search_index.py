@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from courses import search
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the course search index from scratch.'
+
+    def handle(self, *args, **options):
+        search.rebuild()
+        self.stdout.write(self.style.SUCCESS('Search index rebuilt with {}.'.format(
+            type(search.get_backend()).__name__)))
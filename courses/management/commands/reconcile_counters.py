@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from courses import counters
+
+
+class Command(BaseCommand):
+    help = 'Recomputes the total_courses, total_modules and total_students counters.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('course_ids', nargs='*', type=int,
+                            help='Courses to reconcile. Defaults to all courses.')
+
+    def handle(self, *args, **options):
+        counters.reconcile(options['course_ids'] or None)
+        self.stdout.write(self.style.SUCCESS('Counters reconciled.'))
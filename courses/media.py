@@ -0,0 +1,164 @@
+import hashlib
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.files.uploadhandler import TemporaryFileUploadHandler, SkipFile
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+"""
+Передача файлов и изображений содержимого.
+
+ChecksumUploadHandler пишет загружаемый файл на диск частями, считает его
+SHA-256 по мере получения данных и отбрасывает файлы больше
+COURSES_MAX_UPLOAD_SIZE. Контрольная сумма доступна в атрибуте sha256
+загруженного файла.
+
+serve_file() отдаёт файл с поддержкой ETag, Last-Modified и заголовка Range.
+В режиме COURSES_MEDIA_SENDFILE = 'x-accel' (nginx) или 'x-sendfile' (Apache,
+lighttpd) Django отдаёт только заголовки, а сами байты передаёт веб-сервер.
+"""
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+CHUNK_SIZE = 256 * 1024
+
+
+def get_max_upload_size():
+    return getattr(settings, 'COURSES_MAX_UPLOAD_SIZE', 512 * 1024 * 1024)
+
+
+class ChecksumUploadHandler(TemporaryFileUploadHandler):
+    chunk_size = CHUNK_SIZE
+
+    def new_file(self, *args, **kwargs):
+        super(ChecksumUploadHandler, self).new_file(*args, **kwargs)
+        self.checksum = hashlib.sha256()
+        self.size = 0
+
+    def receive_data_chunk(self, raw_data, start):
+        self.size += len(raw_data)
+        if self.size > get_max_upload_size():
+            # Запоминаем отклонённое поле, чтобы обработчик показал ошибку в форме.
+            rejected = getattr(self.request, 'rejected_uploads', [])
+            rejected.append(self.field_name)
+            self.request.rejected_uploads = rejected
+            self.file.close()
+            raise SkipFile
+        self.checksum.update(raw_data)
+        return super(ChecksumUploadHandler, self).receive_data_chunk(raw_data, start)
+
+    def file_complete(self, file_size):
+        file = super(ChecksumUploadHandler, self).file_complete(file_size)
+        file.sha256 = self.checksum.hexdigest()
+        return file
+
+
+def file_etag(fieldfile, last_modified):
+    # Для хранилища с адресацией по содержимому хэш файла уже есть в его имени.
+    digest_of = getattr(fieldfile.storage, 'digest', None)
+    digest = digest_of(fieldfile.name) if digest_of else None
+    if digest:
+        return quote_etag(digest)
+    # Имя и размер файла вместе с отметкой изменения объекта: без чтения содержимого.
+    return quote_etag(hashlib.md5('{}:{}:{}'.format(fieldfile.name, fieldfile.size,
+                                                    last_modified.timestamp()).encode()).hexdigest())
+
+
+def parse_range(header, size):
+    """
+    Разбирает заголовок Range с одним диапазоном.
+    :return: (start, end) включительно, None если заголовок не поддерживается,
+    или False если диапазон невыполним.
+    """
+    match = RANGE_RE.match(header.strip())
+    if not match or match.groups() == ('', ''):
+        return None
+    first, last = match.groups()
+    if first:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+    else:
+        # bytes=-N: последние N байт файла.
+        start = max(size - int(last), 0)
+        end = size - 1
+    if start > end or start >= size:
+        return False
+    return start, end
+
+
+def iter_range(file, start, length):
+    file.seek(start)
+    try:
+        while length > 0:
+            data = file.read(min(CHUNK_SIZE, length))
+            if not data:
+                break
+            length -= len(data)
+            yield data
+    finally:
+        file.close()
+
+
+def content_disposition(filename):
+    try:
+        filename.encode('ascii')
+        return 'inline; filename="{}"'.format(filename.replace('"', ''))
+    except UnicodeEncodeError:
+        return "inline; filename*=utf-8''{}".format(quote(filename))
+
+
+def sendfile_response(fieldfile, mode):
+    response = HttpResponse()
+    if mode == 'x-accel':
+        prefix = getattr(settings, 'COURSES_MEDIA_ACCEL_PREFIX', '/protected-media/')
+        response['X-Accel-Redirect'] = prefix + fieldfile.name
+    else:
+        response['X-Sendfile'] = fieldfile.path
+    # Тип содержимого определит веб-сервер.
+    del response['Content-Type']
+    return response
+
+
+def serve_file(request, fieldfile, last_modified):
+    """Отдаёт файл из FileField с поддержкой условных запросов и диапазонов."""
+    etag = file_etag(fieldfile, last_modified)
+    timestamp = int(last_modified.timestamp())
+    response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+    if response is not None:
+        return response
+
+    filename = os.path.basename(fieldfile.name)
+    mode = getattr(settings, 'COURSES_MEDIA_SENDFILE', None)
+    if mode in ('x-accel', 'x-sendfile'):
+        response = sendfile_response(fieldfile, mode)
+    else:
+        size = fieldfile.size
+        byte_range = None
+        if 'HTTP_RANGE' in request.META and request.META.get('HTTP_IF_RANGE', etag) == etag:
+            byte_range = parse_range(request.META['HTTP_RANGE'], size)
+        if byte_range is False:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = 'bytes */{}'.format(size)
+            return response
+        file = fieldfile.storage.open(fieldfile.name, 'rb')
+        if byte_range:
+            start, end = byte_range
+            content_type = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+            response = StreamingHttpResponse(iter_range(file, start, end - start + 1),
+                                             status=206, content_type=content_type)
+            response['Content-Range'] = 'bytes {}-{}/{}'.format(start, end, size)
+            response['Content-Length'] = end - start + 1
+        else:
+            # FileResponse использует wsgi.file_wrapper, если сервер его поддерживает.
+            response = FileResponse(file)
+        response['Accept-Ranges'] = 'bytes'
+    if not response.has_header('Content-Disposition'):
+        response['Content-Disposition'] = content_disposition(filename)
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(timestamp)
+    return response
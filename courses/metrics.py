@@ -0,0 +1,275 @@
+import logging
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter, deque
+from contextvars import ContextVar
+
+from django.conf import settings
+
+"""
+Метрики запросов в памяти процесса и их выдача в текстовом формате Prometheus.
+
+MetricsMiddleware (middleware.py) для каждого запроса создаёт RequestMetrics и
+делает его текущим через contextvar, поэтому данные собираются и в синхронных,
+и в асинхронных обработчиках, в том числе в потоках sync_to_async. SQL-запросы
+считает обёртка execute_wrapper(), которая добавляется к каждому новому
+соединению с базой данных (signals.py); обращения к кэшу отмечают функции
+caching.py и fragments.py через record_cache(). После ответа показатели
+запроса попадают в гистограммы registry с меткой view - именем URL
+(например, api:course-contents).
+
+Гистограммы хранятся в памяти каждого процесса отдельно: при нескольких
+процессах сервера Prometheus опрашивает каждый из них (метка instance).
+
+Подозрение на N+1: для каждого представления запоминаются последние пары
+(размер результата, число SQL-запросов). Если число запросов растёт вместе с
+размером результата (наклон прямой регрессии не меньше N_PLUS_ONE_SLOPE
+запросов на объект), представление отмечается метрикой
+courses_n_plus_one_suspected, а в журнал пишется самый частый SQL-запрос.
+"""
+
+logger = logging.getLogger(__name__)
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 200, 500)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+N_PLUS_ONE_WINDOW = 200
+N_PLUS_ONE_MIN_SAMPLES = 20
+N_PLUS_ONE_SLOPE = 0.5
+
+UNRESOLVED = '<unresolved>'
+
+
+def is_enabled():
+    return getattr(settings, 'COURSES_METRICS_ENABLED', True)
+
+
+class RequestMetrics(object):
+    """Показатели одного запроса."""
+    def __init__(self):
+        self.queries = 0
+        self.query_time = 0.0
+        self.statements = Counter()
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.render_time = 0.0
+        self.result_size = None
+
+    def record_query(self, sql, duration):
+        self.queries += 1
+        self.query_time += duration
+        # SQL передаётся с параметрами-заполнителями, поэтому одинаковые запросы
+        # с разными значениями совпадают.
+        self.statements[sql] += 1
+
+
+_current = ContextVar('courses_request_metrics', default=None)
+
+
+def start_request():
+    """Делает новый RequestMetrics текущим; возвращает (метрики, токен для finish_request())."""
+    collector = RequestMetrics()
+    return collector, _current.set(collector)
+
+
+def finish_request(token):
+    _current.reset(token)
+
+
+def current():
+    return _current.get()
+
+
+def execute_wrapper(execute, sql, params, many, context):
+    collector = _current.get()
+    if collector is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        collector.record_query(sql, time.perf_counter() - start)
+
+
+def install_execute_wrapper(connection):
+    # connection_created приходит и при повторном подключении того же объекта соединения.
+    if execute_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(execute_wrapper)
+
+
+def record_cache(hits, misses):
+    collector = _current.get()
+    if collector is not None:
+        collector.cache_hits += hits
+        collector.cache_misses += misses
+
+
+def set_result_size(size):
+    """
+    Сообщает размер результата (число объектов в ответе) для поиска N+1, если
+    его нельзя определить по object_list шаблона или списку в ответе API.
+    """
+    collector = _current.get()
+    if collector is not None:
+        collector.result_size = size
+
+
+def response_result_size(response):
+    context = getattr(response, 'context_data', None)
+    if context and 'object_list' in context:
+        try:
+            return len(context['object_list'])
+        except TypeError:
+            return None
+    data = getattr(response, 'data', None)
+    if isinstance(data, dict):
+        data = data.get('results')
+    if isinstance(data, list):
+        return len(data)
+    return None
+
+
+class Histogram(object):
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        total = 0
+        for bound, count in zip(self.buckets + ('+Inf',), self.counts):
+            total += count
+            yield bound, total
+
+
+class NPlusOneDetector(object):
+    def __init__(self, window=N_PLUS_ONE_WINDOW):
+        self.samples = deque(maxlen=window)
+        self.slope = None
+        self.suspected = False
+
+    def add(self, result_size, queries):
+        """Добавляет замер; возвращает True, если представление только что попало под подозрение."""
+        self.samples.append((result_size, queries))
+        if len(self.samples) < N_PLUS_ONE_MIN_SAMPLES:
+            return False
+        count = len(self.samples)
+        mean_x = sum(x for x, _ in self.samples) / count
+        mean_y = sum(y for _, y in self.samples) / count
+        variance = sum((x - mean_x) ** 2 for x, _ in self.samples)
+        if not variance:
+            # Все результаты одного размера: зависимость не определить.
+            return False
+        self.slope = sum((x - mean_x) * (y - mean_y) for x, y in self.samples) / variance
+        suspected = self.slope >= N_PLUS_ONE_SLOPE
+        newly = suspected and not self.suspected
+        self.suspected = suspected
+        return newly
+
+
+# (имя, тип, описание, границы корзин гистограммы)
+METRICS = (
+    ('courses_request_duration_seconds', 'histogram', 'Request wall time.', DURATION_BUCKETS),
+    ('courses_db_queries', 'histogram', 'SQL queries per request.', QUERY_BUCKETS),
+    ('courses_db_query_duration_seconds', 'histogram', 'Total SQL time per request.', DURATION_BUCKETS),
+    ('courses_render_duration_seconds', 'histogram', 'Template response render time per request.',
+     DURATION_BUCKETS),
+    ('courses_response_size_bytes', 'histogram', 'Response body size.', SIZE_BUCKETS),
+    ('courses_cache_hits_total', 'counter', 'Cache hits.', None),
+    ('courses_cache_misses_total', 'counter', 'Cache misses.', None),
+)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Registry(object):
+    """Потокобезопасное хранилище метрик по представлениям."""
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.histograms = {}
+            self.counters = {}
+            self.detectors = {}
+
+    def observe(self, view, collector, duration, size):
+        values = {
+            'courses_request_duration_seconds': duration,
+            'courses_db_queries': collector.queries,
+            'courses_db_query_duration_seconds': collector.query_time,
+            'courses_render_duration_seconds': collector.render_time,
+            'courses_response_size_bytes': size,
+        }
+        with self.lock:
+            for name, kind, _, buckets in METRICS:
+                if kind == 'histogram':
+                    if values[name] is None:
+                        continue
+                    key = (name, view)
+                    if key not in self.histograms:
+                        self.histograms[key] = Histogram(buckets)
+                    self.histograms[key].observe(values[name])
+            for name, value in (('courses_cache_hits_total', collector.cache_hits),
+                                ('courses_cache_misses_total', collector.cache_misses)):
+                self.counters[(name, view)] = self.counters.get((name, view), 0) + value
+            newly_suspected = False
+            if collector.result_size is not None:
+                detector = self.detectors.setdefault(view, NPlusOneDetector())
+                newly_suspected = detector.add(collector.result_size, collector.queries)
+        if newly_suspected:
+            statement, repeats = collector.statements.most_common(1)[0] if collector.statements else ('', 0)
+            logger.warning('Possible N+1 queries in %s: %.2f queries per result object; '
+                           'most repeated query (%d times): %s',
+                           view, detector.slope, repeats, statement)
+
+    def suspected_views(self):
+        with self.lock:
+            return sorted(view for view, detector in self.detectors.items() if detector.suspected)
+
+    def render(self):
+        """Метрики в текстовом формате Prometheus 0.0.4."""
+        lines = []
+        with self.lock:
+            for name, kind, help_text, _ in METRICS:
+                lines += ['# HELP {} {}'.format(name, help_text), '# TYPE {} {}'.format(name, kind)]
+                if kind == 'histogram':
+                    for (metric, view), histogram in sorted(self.histograms.items()):
+                        if metric != name:
+                            continue
+                        label = 'view="{}"'.format(_escape(view))
+                        for bound, total in histogram.cumulative():
+                            lines.append('{}_bucket{{{},le="{}"}} {}'.format(name, label, bound, total))
+                        lines.append('{}_sum{{{}}} {}'.format(name, label, _format_number(histogram.sum)))
+                        lines.append('{}_count{{{}}} {}'.format(name, label, histogram.count))
+                else:
+                    for (metric, view), value in sorted(self.counters.items()):
+                        if metric == name:
+                            lines.append('{}{{view="{}"}} {}'.format(name, _escape(view), value))
+            lines += ['# HELP courses_queries_per_result Slope of SQL queries over result size.',
+                      '# TYPE courses_queries_per_result gauge']
+            lines += ['courses_queries_per_result{{view="{}"}} {}'.format(_escape(view), repr(detector.slope))
+                      for view, detector in sorted(self.detectors.items()) if detector.slope is not None]
+            lines += ['# HELP courses_n_plus_one_suspected 1 if SQL queries grow with the result size.',
+                      '# TYPE courses_n_plus_one_suspected gauge']
+            lines += ['courses_n_plus_one_suspected{{view="{}"}} {}'.format(_escape(view), int(detector.suspected))
+                      for view, detector in sorted(self.detectors.items()) if detector.slope is not None]
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
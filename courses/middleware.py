@@ -0,0 +1,68 @@
+import asyncio
+import time
+
+from django.core.exceptions import MiddlewareNotUsed
+
+from . import metrics
+
+"""
+MetricsMiddleware собирает показатели каждого запроса (см. metrics.py).
+Её следует ставить первой в MIDDLEWARE, чтобы время запроса включало работу
+остальных middleware, а время рендеринга шаблона измерялось непосредственно
+перед рендерингом. Работает и в синхронном, и в асинхронном режиме, не
+переводя асинхронные обработчики в поток синхронного кода.
+"""
+
+
+class MetricsMiddleware(object):
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not metrics.is_enabled():
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            # Так же, как в MiddlewareMixin: обработчик считает middleware асинхронной.
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        collector, token = metrics.start_request()
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            metrics.finish_request(token)
+        self.observe(request, response, collector, time.perf_counter() - start)
+        return response
+
+    async def __acall__(self, request):
+        collector, token = metrics.start_request()
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            metrics.finish_request(token)
+        self.observe(request, response, collector, time.perf_counter() - start)
+        return response
+
+    def process_template_response(self, request, response):
+        collector = metrics.current()
+        if collector is not None:
+            start = time.perf_counter()
+
+            def rendered(response):
+                collector.render_time += time.perf_counter() - start
+                if collector.result_size is None:
+                    collector.result_size = metrics.response_result_size(response)
+
+            response.add_post_render_callback(rendered)
+        return response
+
+    def observe(self, request, response, collector, duration):
+        match = request.resolver_match
+        view = match.view_name if match is not None else metrics.UNRESOLVED
+        size = None if response.streaming else len(response.content)
+        metrics.registry.observe(view, collector, duration, size)
@@ -0,0 +1,21 @@
+# Generated by Django 3.1.14 on 2026-10-17 22:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='content',
+            index=models.Index(fields=['module', 'order'], name='courses_con_module__93918d_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='module',
+            index=models.Index(fields=['course', 'order'], name='courses_mod_course__20183c_idx'),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 3.1.14 on 2026-10-17 22:33
+
+import courses.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0002_order_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Blob',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True)),
+                ('references', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='file',
+            name='file',
+            field=models.FileField(storage=courses.storage.ContentAddressedStorage(), upload_to='files'),
+        ),
+        migrations.AlterField(
+            model_name='image',
+            name='file',
+            field=models.FileField(storage=courses.storage.ContentAddressedStorage(), upload_to='images'),
+        ),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 3.1.14 on 2026-10-17 22:33
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('courses', '0005_counters'),
+    ]
+
+    # Enrollment использует существующую промежуточную таблицу Course.students
+    # (courses_course_students с уникальной парой course, user): модель и through
+    # меняются только в состоянии миграций, в базе добавляется индекс (user, course).
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.CreateModel(
+                    name='Enrollment',
+                    fields=[
+                        ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False,
+                                                verbose_name='ID')),
+                        ('course', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE,
+                                                     to='courses.course')),
+                        ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE,
+                                                   to=settings.AUTH_USER_MODEL)),
+                    ],
+                    options={
+                        'db_table': 'courses_course_students',
+                    },
+                ),
+                migrations.AlterField(
+                    model_name='course',
+                    name='students',
+                    field=models.ManyToManyField(blank=True, related_name='courses_joined',
+                                                 through='courses.Enrollment', to=settings.AUTH_USER_MODEL),
+                ),
+                migrations.AlterUniqueTogether(
+                    name='enrollment',
+                    unique_together={('course', 'user')},
+                ),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='enrollment',
+            index=models.Index(fields=['user', 'course'], name='courses_cou_user_id_3369bb_idx'),
+        ),
+    ]
@@ -0,0 +1,41 @@
+"""
+Поисковый индекс SearchTerm хранит слова по документам (строкам курса, модуля и
+текстового содержимого), а не по курсам. Прежние записи удаляются: индекс
+заполняется заново командой rebuild_search_index.
+"""
+
+from django.db import migrations, models
+
+
+def clear_search_terms(apps, schema_editor):
+    apps.get_model('courses', 'SearchTerm').objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0009_progress'),
+    ]
+
+    operations = [
+        migrations.RunPython(clear_search_terms, migrations.RunPython.noop),
+        migrations.AlterUniqueTogether(
+            name='searchterm',
+            unique_together=set(),
+        ),
+        migrations.AddField(
+            model_name='searchterm',
+            name='document',
+            field=models.BigIntegerField(default=0),
+            preserve_default=False,
+        ),
+        migrations.AlterField(
+            model_name='searchterm',
+            name='term',
+            field=models.CharField(db_index=True, max_length=64),
+        ),
+        migrations.AlterUniqueTogether(
+            name='searchterm',
+            unique_together={('document', 'term')},
+        ),
+    ]
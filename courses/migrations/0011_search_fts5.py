@@ -0,0 +1,38 @@
+"""
+Виртуальная таблица FTS5 поискового индекса (см. search.py). Создаётся только
+на SQLite, собранном с FTS5; на остальных базах поиск использует SearchTerm.
+Столбцы и имя таблицы записаны здесь, а не взяты из search.py, чтобы миграция
+не менялась вместе с кодом. После миграции индекс заполняется командой
+rebuild_search_index.
+"""
+
+from django.db import migrations, transaction, OperationalError
+
+
+def create_fts5_table(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    try:
+        with transaction.atomic(using=schema_editor.connection.alias):
+            schema_editor.execute("CREATE VIRTUAL TABLE courses_search USING fts5("
+                                  "title, overview, modules, texts, course_id UNINDEXED, "
+                                  "tokenize='unicode61 remove_diacritics 2')")
+    except OperationalError:
+        # SQLite собран без FTS5.
+        pass
+
+
+def drop_fts5_table(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute('DROP TABLE IF EXISTS courses_search')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0010_searchterm_document'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_fts5_table, drop_fts5_table),
+    ]
@@ -2,11 +2,12 @@ from django.db import models
 from django.contrib.auth.models import User
 from django.contrib.contenttypes.models import ContentType
 from django.contrib.contenttypes.fields import GenericForeignKey
-from django.template.loader import render_to_string
-from django.utils.safestring import mark_safe
+from django.utils.functional import cached_property
 from django.utils.translation import gettext_lazy as _
 
-from .fields import OrderField
+from .fields import OrderField, OrderedModelMixin, OrderedQuerySet
+from . import fragments
+from .storage import content_storage
 
 """
 owner - пользователь, который создал курс
@@ -15,14 +16,34 @@ title - название курса
 slug - слаг курса, будет использоваться для формирования понятных URL'ов
 overview - текстовое поле для создания краткого описания курса
 created - дата и время создания курса ПРОСТАВЛЯЮТСЯ АВТОМАТИЧЕСКИ
+total_courses, total_modules, total_students, total_contents - денормализованные счётчики,
+поддерживаются обработчиками сигналов (signals.py), сверяются командой reconcile_counters
 """
 
 
-class Subject(models.Model):
+class CounterFieldsMixin(object):
+    """
+    Денормализованные счётчики (counter_fields) изменяются только атомарными
+    UPDATE ... F() в обработчиках сигналов. Чтобы save() с устаревшими значениями
+    в памяти их не перезаписал, при обновлении объекта они исключаются из update_fields.
+    """
+    counter_fields = ()
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding and kwargs.get('update_fields') is None and not kwargs.get('force_insert'):
+            kwargs['update_fields'] = [field.name for field in self._meta.concrete_fields
+                                       if not field.primary_key and field.name not in self.counter_fields]
+        super(CounterFieldsMixin, self).save(*args, **kwargs)
+
+
+class Subject(CounterFieldsMixin, models.Model):
     title = models.CharField(_('title'), max_length=200)
     slug = models.SlugField(_('slug'), max_length=200, unique=True)  # “Slug” – это короткое название-метка, которое содержит
 
     # только буквы, числа, подчеркивание или дефис. В основном используются в URL.
+    total_courses = models.PositiveIntegerField(default=0, editable=False)
+
+    counter_fields = ('total_courses',)
 
     class Meta:
         ordering = ['title']
@@ -31,14 +52,32 @@ class Subject(models.Model):
         return self.title
 
 
-class Course(models.Model):
+class CourseQuerySet(models.QuerySet):
+    def with_contents(self):
+        """
+        Загружает всё дерево курса (модули, содержимое и сами объекты содержимого)
+        фиксированным числом запросов. GenericForeignKey item группирует объекты
+        по content_type, поэтому на каждую модель (Text, Video, Image, File)
+        выполняется ровно один запрос, независимо от размера курса.
+        """
+        return self.prefetch_related('modules__contents__item')
+
+
+class Course(CounterFieldsMixin, models.Model):
     owner = models.ForeignKey(User, related_name='courses_created', on_delete=models.CASCADE)
     subject = models.ForeignKey(Subject, related_name='courses', on_delete=models.CASCADE)
     title = models.CharField(_('title'), max_length=200)
     slug = models.SlugField(_('slug'), max_length=200, unique=True)
     overview = models.TextField(_('overview'))
     created = models.DateTimeField(_('created'), auto_now_add=True)
-    students = models.ManyToManyField(User, related_name='courses_joined', blank=True)
+    students = models.ManyToManyField(User, related_name='courses_joined', blank=True, through='Enrollment')
+    total_modules = models.PositiveIntegerField(default=0, editable=False)
+    total_students = models.PositiveIntegerField(default=0, editable=False)
+    total_contents = models.PositiveIntegerField(default=0, editable=False)
+
+    objects = CourseQuerySet.as_manager()
+
+    counter_fields = ('total_modules', 'total_students', 'total_contents')
 
     class Meta:
         ordering = ['-created']
@@ -47,20 +86,75 @@ class Course(models.Model):
         return self.title
 
 
-class Module(models.Model):
+class Enrollment(models.Model):
+    """
+    Запись студента на курс, промежуточная таблица Course.students. Таблица называется
+    так же, как созданная бы Django автоматически. Индекс (user, course) позволяет
+    выбрать курсы студента, не читая саму таблицу.
+    """
+    course = models.ForeignKey(Course, on_delete=models.CASCADE)
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+
+    class Meta:
+        db_table = 'courses_course_students'
+        unique_together = [['course', 'user']]
+        indexes = [models.Index(fields=['user', 'course'])]
+
+
+class SearchTerm(models.Model):
+    """
+    Запись инвертированного индекса поиска курсов (см. search.py): слово и его вес
+    в документе курса. Используется на базах данных без FTS5.
+    """
+    term = models.CharField(max_length=64, db_index=True)
+    document = models.BigIntegerField()
+    course = models.ForeignKey(Course, related_name='search_terms', on_delete=models.CASCADE)
+    weight = models.FloatField()
+
+    class Meta:
+        unique_together = [['document', 'term']]
+
+
+class ApiToken(models.Model):
+    """
+    Токен доступа к API. В базе хранится только SHA-256 токена (key_hash),
+    сам токен выдаётся клиенту один раз при создании.
+    """
+    user = models.ForeignKey(User, related_name='api_tokens', on_delete=models.CASCADE)
+    key_hash = models.CharField(max_length=64, unique=True)
+    created = models.DateTimeField(auto_now_add=True)
+    expires = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return '{} ({})'.format(self.user, self.expires)
+
+
+class ModuleQuerySet(OrderedQuerySet):
+    def with_contents(self):
+        """
+        Подгружает содержимое модулей вместе с объектами item: один запрос на Content
+        и по одному запросу на каждую модель содержимого.
+        """
+        return self.prefetch_related('contents__item')
+
+
+class Module(OrderedModelMixin, models.Model):
     course = models.ForeignKey(Course, related_name='modules', on_delete=models.CASCADE)
     title = models.CharField(_('title'), max_length=200)
     description = models.TextField(_('description'), blank=True)
     order = OrderField(blank=True, for_fields=['course'])
 
+    objects = ModuleQuerySet.as_manager()
+
     class Meta:
         ordering = ['order']
+        indexes = [models.Index(fields=['course', 'order'])]
 
     def __str__(self):
         return '{}. {}'.format(self.order, self.title)
 
 
-class Content(models.Model):
+class Content(OrderedModelMixin, models.Model):
     module = models.ForeignKey(Module, related_name='contents', on_delete=models.CASCADE)
     content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE,
                                      limit_choices_to={'model__in': ('text',
@@ -71,8 +165,53 @@ class Content(models.Model):
     item = GenericForeignKey('content_type', 'object_id')
     order = OrderField(blank=True, for_fields=['module'])
 
+    objects = OrderedQuerySet.as_manager()
+
     class Meta:
         ordering = ['order']
+        indexes = [models.Index(fields=['module', 'order'])]
+
+
+class ContentProgress(models.Model):
+    """
+    Просмотр и завершение объекта содержимого студентом. Строки записываются
+    пакетами из буфера progress.py; course повторяет курс модуля, чтобы прогресс
+    по курсу пересчитывался без соединения с модулями.
+    """
+    user = models.ForeignKey(User, related_name='content_progress', on_delete=models.CASCADE)
+    content = models.ForeignKey(Content, related_name='progress', on_delete=models.CASCADE)
+    course = models.ForeignKey(Course, related_name='+', on_delete=models.CASCADE)
+    last_viewed = models.DateTimeField()
+    completed = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        unique_together = [['user', 'content']]
+
+
+class CourseProgress(models.Model):
+    """
+    Прогресс студента по курсу: число завершённых объектов содержимого. Счётчик
+    увеличивается при сохранении буфера progress.py на число впервые завершённых
+    объектов, процент завершения - completed_contents / Course.total_contents.
+    """
+    user = models.ForeignKey(User, related_name='course_progress', on_delete=models.CASCADE)
+    course = models.ForeignKey(Course, related_name='+', on_delete=models.CASCADE)
+    completed_contents = models.PositiveIntegerField(default=0)
+    last_viewed = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        unique_together = [['user', 'course']]
+
+
+class Blob(models.Model):
+    """
+    Файл в хранилище content_storage и число объектов File и Image, которые на него ссылаются.
+    """
+    name = models.CharField(max_length=255, unique=True)
+    references = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return self.name
 
 
 class ItemBase(models.Model):
@@ -92,11 +231,11 @@ class ItemBase(models.Model):
         Метод render() предоставляет общий интерфейс для генерации шаблона под конкретный тип содержимого.
         Атрибут self._meta.model_name динамически формирует имя шаблона
         :return:
-        render_to_string() чтобы сгенерировать шаблон с контекстом и получить результат в виде строки.
+        HTML-фрагмент из хранилища fragments. Фрагмент генерируется через render_to_string()
+        только если его ещё нет для текущего языка и значения updated.
         Каждый тип содержимого будет использовать соответствующий ему шаблон, полученный по названию модели.
         """
-        return render_to_string('courses/content/{}.html'.format(
-            self._meta.model_name), {'item': self})
+        return fragments.get_fragment(self)
 
 
 class Text(ItemBase):
@@ -104,11 +243,47 @@ class Text(ItemBase):
 
 
 class File(ItemBase):
-    file = models.FileField(upload_to='files')
+    file = models.FileField(upload_to='files', storage=content_storage)
 
 
 class Image(ItemBase):
-    file = models.FileField(upload_to='images')
+    file = models.FileField(upload_to='images', storage=content_storage)
+    width = models.PositiveIntegerField(null=True, blank=True)
+    height = models.PositiveIntegerField(null=True, blank=True)
+
+    # Связанные объекты, которые загружаются пакетно перед генерацией фрагментов.
+    fragment_prefetch = ['variants']
+
+    @cached_property
+    def variant_list(self):
+        return list(self.variants.all())
+
+    def get_srcset(self, format):
+        return ', '.join('{} {}w'.format(variant.file.url, variant.width)
+                         for variant in self.variant_list if variant.format == format)
+
+    @property
+    def webp_srcset(self):
+        return self.get_srcset('webp')
+
+    @property
+    def jpeg_srcset(self):
+        return self.get_srcset('jpeg')
+
+
+class ImageVariant(models.Model):
+    """
+    Уменьшенная копия изображения заданной ширины в формате WebP или JPEG.
+    Создаётся в фоне модулем images после сохранения Image.
+    """
+    image = models.ForeignKey(Image, related_name='variants', on_delete=models.CASCADE)
+    file = models.FileField(upload_to='images/variants', storage=content_storage)
+    format = models.CharField(max_length=10)
+    width = models.PositiveIntegerField()
+    height = models.PositiveIntegerField()
+
+    class Meta:
+        ordering = ['width']
 
 
 class Video(ItemBase):
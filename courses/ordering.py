@@ -0,0 +1,49 @@
+from django.db import transaction
+from django.db.models import Case, When, Value, PositiveIntegerField
+
+"""
+Пакетное изменение порядка модулей и содержимого. Права доступа проверяются
+одним запросом для всего набора идентификаторов, а новые значения order
+записываются одним UPDATE с выражением CASE внутри транзакции. Количество
+запросов не зависит от числа переупорядочиваемых объектов.
+"""
+
+
+class ReorderError(ValueError):
+    pass
+
+
+def parse_order_map(order_map):
+    """Приводит словарь {id: order} из JSON-запроса к целым числам."""
+    try:
+        parsed = {int(pk): int(order) for pk, order in order_map.items()}
+    except (AttributeError, TypeError, ValueError):
+        raise ReorderError('Expected a JSON object mapping ids to orders.')
+    if any(order < 0 for order in parsed.values()):
+        raise ReorderError('Orders must be non-negative integers.')
+    return parsed
+
+
+def reorder(queryset, order_map, parent_field):
+    """
+    Применяет новый порядок к объектам queryset. queryset должен быть уже
+    отфильтрован по владельцу: если хотя бы один идентификатор в него не входит,
+    изменения не вносятся и выбрасывается ReorderError.
+    :return: список идентификаторов в новом порядке и множество значений
+    parent_field (курсов или модулей), затронутых изменением.
+    """
+    order_map = parse_order_map(order_map)
+    if not order_map:
+        return [], set()
+    model = queryset.model
+    with transaction.atomic(using=queryset.db):
+        rows = dict(queryset.select_for_update()
+                    .filter(id__in=order_map)
+                    .values_list('id', parent_field))
+        if len(rows) != len(order_map):
+            raise ReorderError('Some objects do not exist or belong to another user.')
+        model._default_manager.using(queryset.db).filter(id__in=order_map).update(
+            order=Case(*[When(id=pk, then=Value(order)) for pk, order in order_map.items()],
+                       output_field=PositiveIntegerField()))
+    order = sorted(order_map, key=lambda pk: (order_map[pk], pk))
+    return order, set(rows.values())
@@ -0,0 +1,114 @@
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.template.base import Node, TokenType
+
+"""
+Профилировщик рендеринга шаблонов.
+
+Внутри profile_templates() время рендеринга каждого узла шаблона ({% tag %},
+{{ переменная }}, текст) измеряется обёрткой Node.render_annotated(). Для узла
+учитывается собственное время - без времени вложенных узлов, - поэтому время
+{% for %} не включает его тело, а время {% include %} - включаемый шаблон.
+Собственное время суммируется по шаблону и по паре (шаблон, тег).
+
+Обёртка ставится один раз и вне profile_templates() только проверяет
+contextvar, поэтому профилирование одного запроса не влияет на другие.
+"""
+
+_current = ContextVar('courses_template_profile', default=None)
+
+_installed = False
+
+
+def node_tag(node):
+    token = getattr(node, 'token', None)
+    if token is None:
+        return type(node).__name__
+    if token.token_type == TokenType.BLOCK:
+        return '{{% {} %}}'.format(token.contents.split()[0])
+    if token.token_type == TokenType.VAR:
+        return '{{ }}'
+    return 'text'
+
+
+def node_template(node):
+    origin = getattr(node, 'origin', None)
+    return (origin.template_name or origin.name) if origin is not None else '<unknown>'
+
+
+class TemplateProfile(object):
+    def __init__(self):
+        # (шаблон, тег) -> [вызовы, собственное время, полное время]
+        self.tags = {}
+        self._children = []
+
+    def measure(self, node, render, context):
+        self._children.append(0.0)
+        start = time.perf_counter()
+        try:
+            return render(node, context)
+        finally:
+            elapsed = time.perf_counter() - start
+            children = self._children.pop()
+            if self._children:
+                self._children[-1] += elapsed
+            stats = self.tags.setdefault((node_template(node), node_tag(node)), [0, 0.0, 0.0])
+            stats[0] += 1
+            stats[1] += elapsed - children
+            stats[2] += elapsed
+
+    @property
+    def total(self):
+        return sum(stats[1] for stats in self.tags.values())
+
+    def by_template(self):
+        """[(шаблон, собственное время)] по убыванию времени."""
+        templates = {}
+        for (template, _), stats in self.tags.items():
+            templates[template] = templates.get(template, 0.0) + stats[1]
+        return sorted(templates.items(), key=lambda item: -item[1])
+
+    def by_tag(self):
+        """[(шаблон, тег, вызовы, собственное время, полное время)] по убыванию собственного времени."""
+        return sorted(((template, tag) + tuple(stats) for (template, tag), stats in self.tags.items()),
+                      key=lambda row: -row[3])
+
+    def report(self, limit=20):
+        lines = ['Template render time: {:.2f} ms'.format(self.total * 1000), '',
+                 '{:>10}  {}'.format('self ms', 'template')]
+        lines += ['{:>10.2f}  {}'.format(seconds * 1000, template)
+                  for template, seconds in self.by_template()[:limit]]
+        lines += ['', '{:>10}{:>10}{:>10}  {}'.format('self ms', 'total ms', 'calls', 'tag')]
+        lines += ['{:>10.2f}{:>10.2f}{:>10}  {} in {}'.format(self_time * 1000, total * 1000, calls, tag, template)
+                  for template, tag, calls, self_time, total in self.by_tag()[:limit]]
+        return '\n'.join(lines)
+
+
+def install():
+    global _installed
+    if _installed:
+        return
+    render_annotated = Node.render_annotated
+
+    def profiled_render_annotated(node, context):
+        profile = _current.get()
+        if profile is None:
+            return render_annotated(node, context)
+        return profile.measure(node, render_annotated, context)
+
+    Node.render_annotated = profiled_render_annotated
+    _installed = True
+
+
+@contextmanager
+def profile_templates():
+    """Профилирует рендеринг шаблонов внутри блока with; возвращает TemplateProfile."""
+    install()
+    profile = TemplateProfile()
+    token = _current.set(profile)
+    try:
+        yield profile
+    finally:
+        _current.reset(token)
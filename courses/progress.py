@@ -0,0 +1,250 @@
+import logging
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import transaction, DatabaseError
+from django.utils import timezone
+
+from .caching import cached, invalidate, course_tag, progress_tag
+from .models import Content, ContentProgress, CourseProgress
+from . import counters
+
+"""
+Прогресс студентов: просмотренные и завершённые объекты содержимого курса.
+
+Отметки не пишутся в базу при каждом просмотре страницы. record_view() и
+record_completion() складывают их в буфер в памяти процесса, где повторные
+просмотры одного объекта сливаются в одну отметку. Буфер сохраняется целиком,
+когда в нём набирается COURSES_PROGRESS_FLUSH_SIZE отметок или по окончании
+запроса, если первой отметке больше COURSES_PROGRESS_FLUSH_INTERVAL секунд
+(signals.py). При остановке процесса несохранённые отметки теряются - это
+не больше отметок за один интервал.
+
+Сохранение выполняется пакетами по BATCH_SIZE отметок, число запросов на пакет
+не зависит от числа отметок, студентов и курсов: недостающие строки
+ContentProgress и CourseProgress вставляются через bulk_create() с
+ignore_conflicts, затем строки пакета читаются с блокировкой
+(select_for_update()) и записываются через bulk_update() - каждая строка
+получает своё время просмотра. Счётчик CourseProgress.completed_contents
+увеличивается на число строк, у которых completed проставлен впервые; строки
+заблокированы до конца транзакции, поэтому повторное завершение объекта или
+одновременное сохранение двумя процессами не учитывается дважды.
+
+Процент завершения курса - CourseProgress.completed_contents от
+Course.total_contents: строки отметок на каждой странице не пересчитываются.
+Счётчики студента хранятся в кэше под тегом progress:<id>, который
+сбрасывается при сохранении новых завершений. К ним прибавляются ещё не
+сохранённые завершения из буфера этого процесса, поэтому студент сразу видит
+свою отметку; до сохранения это оценка (повторное завершение может быть
+учтено дважды), и процент не превышает 100.
+"""
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 500
+
+
+def get_flush_size():
+    return getattr(settings, 'COURSES_PROGRESS_FLUSH_SIZE', 1000)
+
+
+def get_flush_interval():
+    return getattr(settings, 'COURSES_PROGRESS_FLUSH_INTERVAL', 5)
+
+
+class ProgressBuffer(object):
+    """
+    Потокобезопасный буфер отметок:
+    {(студент, объект содержимого): [курс, время просмотра, время завершения или None]}.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.entries = {}
+        self.started = None
+
+    def add(self, user_id, course_id, content_ids, completed=False):
+        """Добавляет отметки; возвращает число отметок в буфере."""
+        now = timezone.now()
+        with self.lock:
+            if not self.entries:
+                self.started = time.monotonic()
+            for content_id in content_ids:
+                entry = self.entries.setdefault((user_id, content_id), [course_id, now, None])
+                entry[1] = now
+                if completed and entry[2] is None:
+                    entry[2] = now
+            return len(self.entries)
+
+    def age(self):
+        """Сколько секунд в буфере лежит первая отметка (0, если буфер пуст)."""
+        with self.lock:
+            return time.monotonic() - self.started if self.entries else 0
+
+    def take(self):
+        """Забирает все отметки, оставляя буфер пустым."""
+        with self.lock:
+            entries, self.entries = self.entries, {}
+            self.started = None
+        return entries
+
+    def pending_completions(self, user_id):
+        """Counter {курс: число несохранённых завершений} студента."""
+        with self.lock:
+            return Counter(course_id for (entry_user_id, _), (course_id, _, completed) in self.entries.items()
+                           if entry_user_id == user_id and completed is not None)
+
+    def __len__(self):
+        return len(self.entries)
+
+
+buffer = ProgressBuffer()
+
+
+def record_view(user, course_id, content_ids):
+    _record(user, course_id, content_ids, False)
+
+
+def record_completion(user, course_id, content_ids):
+    _record(user, course_id, content_ids, True)
+
+
+def _record(user, course_id, content_ids, completed):
+    if not user.is_authenticated or not content_ids:
+        return
+    if buffer.add(user.pk, course_id, content_ids, completed) >= get_flush_size():
+        flush()
+
+
+def flush_if_due():
+    if len(buffer) and buffer.age() >= get_flush_interval():
+        flush()
+
+
+def flush():
+    """Сохраняет все отметки буфера; возвращает их число."""
+    entries = sorted(buffer.take().items())
+    for start in range(0, len(entries), BATCH_SIZE):
+        batch = entries[start:start + BATCH_SIZE]
+        try:
+            save(batch)
+        except DatabaseError:
+            # Прогресс не стоит ошибки в ответе: пакет теряется, остальные сохраняются.
+            logger.exception('Failed to save %d progress marks', len(batch))
+    return len(entries)
+
+
+def save(entries):
+    """Сохраняет пакет отметок [((студент, объект), [курс, просмотр, завершение])]."""
+    # Объект содержимого или студент могли быть удалены, пока отметки ждали в буфере.
+    content_courses = dict(Content.objects.filter(pk__in={content_id for (_, content_id), _ in entries})
+                           .order_by().values_list('pk', 'module__course_id'))
+    user_ids = set(User.objects.filter(pk__in={user_id for (user_id, _), _ in entries})
+                   .values_list('pk', flat=True))
+    marks = {(user_id, content_id): (viewed, completed)
+             for (user_id, content_id), (_, viewed, completed) in entries
+             if content_id in content_courses and user_id in user_ids}
+    if not marks:
+        return
+    # (студент, курс) -> последний просмотр
+    groups = {}
+    for (user_id, content_id), (viewed, _) in marks.items():
+        key = (user_id, content_courses[content_id])
+        groups[key] = max(groups.get(key, viewed), viewed)
+    with transaction.atomic():
+        ContentProgress.objects.bulk_create([
+            ContentProgress(user_id=user_id, content_id=content_id, course_id=content_courses[content_id],
+                            last_viewed=viewed)
+            for (user_id, content_id), (viewed, _) in marks.items()], ignore_conflicts=True)
+        CourseProgress.objects.bulk_create([CourseProgress(user_id=user_id, course_id=course_id)
+                                            for user_id, course_id in groups], ignore_conflicts=True)
+
+        rows = [row for row in ContentProgress.objects.select_for_update().filter(
+            user_id__in={user_id for user_id, _ in marks}, content_id__in={content_id for _, content_id in marks})
+            if (row.user_id, row.content_id) in marks]
+        newly_completed = Counter()
+        for row in rows:
+            viewed, completed = marks[row.user_id, row.content_id]
+            row.last_viewed = max(row.last_viewed, viewed)
+            if completed is not None and row.completed is None:
+                row.completed = completed
+                newly_completed[row.user_id, content_courses[row.content_id]] += 1
+        ContentProgress.objects.bulk_update(rows, ['last_viewed', 'completed'])
+
+        course_rows = [row for row in CourseProgress.objects.select_for_update().filter(
+            user_id__in={user_id for user_id, _ in groups}, course_id__in={course_id for _, course_id in groups})
+            if (row.user_id, row.course_id) in groups]
+        for row in course_rows:
+            viewed = groups[row.user_id, row.course_id]
+            row.completed_contents += newly_completed[row.user_id, row.course_id]
+            row.last_viewed = max(row.last_viewed, viewed) if row.last_viewed else viewed
+        CourseProgress.objects.bulk_update(course_rows, ['completed_contents', 'last_viewed'])
+        invalidate(*[progress_tag(user_id) for user_id in {user_id for user_id, _ in newly_completed}])
+
+
+def refresh(course_ids):
+    """Пересчитывает прогресс студентов курсов, например после удаления содержимого."""
+    course_ids = list(course_ids)
+    counters.refresh_progress(course_ids)
+    invalidate(*[progress_tag(user_id) for user_id in CourseProgress.objects.filter(
+        course__in=course_ids).values_list('user_id', flat=True).distinct()])
+
+
+_pending = threading.local()
+
+
+def schedule_refresh(course_ids):
+    """
+    Пересчитывает прогресс студентов курсов после фиксации текущей транзакции.
+    Курсы, затронутые несколько раз за транзакцию (например, при удалении модуля
+    со всем его содержимым), пересчитываются один раз.
+    """
+    course_ids = {course_id for course_id in course_ids if course_id}
+    if not course_ids:
+        return
+    if not hasattr(_pending, 'course_ids'):
+        _pending.course_ids = set()
+    _pending.course_ids.update(course_ids)
+    transaction.on_commit(_refresh_pending)
+
+
+def _refresh_pending():
+    course_ids = getattr(_pending, 'course_ids', None)
+    if course_ids:
+        _pending.course_ids = set()
+        refresh(sorted(course_ids))
+
+
+def course_content_ids(course_id):
+    """{модуль: [объекты содержимого]} курса, общий для всех студентов."""
+    def load():
+        content_ids = {}
+        for module_id, content_id in (Content.objects.filter(module__course_id=course_id)
+                                      .order_by('module_id', 'order').values_list('module_id', 'pk')):
+            content_ids.setdefault(module_id, []).append(content_id)
+        return content_ids
+
+    return cached('course_content_ids_{}'.format(course_id), [course_tag(course_id)], load)
+
+
+def completed_counts(user):
+    """Counter {курс: число завершённых объектов} студента, включая несохранённые завершения."""
+    if not user.is_authenticated:
+        return Counter()
+    counts = Counter(cached('course_progress_{}'.format(user.pk), [progress_tag(user.pk)],
+                            lambda: dict(CourseProgress.objects.filter(user_id=user.pk)
+                                         .values_list('course_id', 'completed_contents'))))
+    counts.update(buffer.pending_completions(user.pk))
+    return counts
+
+
+def summary(completed, total):
+    completed = min(completed, total)
+    return {'completed': completed, 'total': total, 'percent': completed * 100 // total if total else 0}
+
+
+def course_progress(user, course):
+    """Прогресс студента по курсу: {'completed', 'total', 'percent'}."""
+    return summary(completed_counts(user)[course.pk], course.total_contents)
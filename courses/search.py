@@ -0,0 +1,242 @@
+import math
+import re
+import threading
+import unicodedata
+from collections import Counter
+
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.db import connections, transaction, DEFAULT_DB_ALIAS
+from django.db.models import Count, Sum
+
+from .models import Course, Module, Content, Text, SearchTerm
+
+"""
+Полнотекстовый поиск курсов по названию и описанию курса, названиям и описаниям
+модулей и текстовому содержимому (Text).
+
+Индекс состоит из документов по одному на строку источника: курс (поля title и
+overview), модуль (поле modules) и объект Content с текстом (поле texts). Поля
+имеют веса FIELD_WEIGHTS. Курс подходит под запрос, если каждое слово запроса
+есть хотя бы в одном из его документов; релевантность - сумма оценок слов.
+После фиксации транзакции, изменившей курс, модуль, содержимое или текст,
+заново индексируются только изменённые строки (signals.py). Индекс целиком
+перестраивается командой rebuild_search_index.
+
+Индекс ведут два бэкенда с одинаковым интерфейсом:
+FTS5Backend - виртуальная таблица SQLite FTS5 с ранжированием bm25(), создаётся
+миграцией 0002_search_index на базах SQLite с FTS5;
+TermIndexBackend - таблица SearchTerm (слово, документ, курс, вес) с индексом
+по слову, работает на любой базе данных.
+Бэкенд выбирается настройкой COURSES_SEARCH_BACKEND: 'fts5', 'index' или
+'auto' (FTS5, если его таблица есть в базе, иначе SearchTerm).
+"""
+
+FIELD_WEIGHTS = (('title', 10.0), ('overview', 4.0), ('modules', 3.0), ('texts', 1.0))
+
+# Источники документов; номер источника входит в идентификатор документа.
+SOURCES = ('course', 'module', 'content')
+
+FTS5_TABLE = 'courses_search'
+
+BATCH_SIZE = 100
+
+MAX_QUERY_TERMS = 10
+
+WORD_RE = re.compile(r'\w+')
+
+
+def tokenize(text):
+    """Слова текста в нижнем регистре без диакритических знаков, короче двух букв отбрасываются."""
+    text = unicodedata.normalize('NFKD', text.lower())
+    text = ''.join(char for char in text if not unicodedata.combining(char))
+    return [word[:64] for word in WORD_RE.findall(text.replace('_', ' ')) if len(word) > 1]
+
+
+def query_terms(query):
+    return list(dict.fromkeys(tokenize(query or '')))[:MAX_QUERY_TERMS]
+
+
+def document_id(source, pk):
+    """Идентификатор документа строки источника, он же rowid в таблице FTS5."""
+    return pk * len(SOURCES) + SOURCES.index(source)
+
+
+def documents(source, ids):
+    """Возвращает {идентификатор документа: (course_id, {поле: текст})} для существующих строк."""
+    if source == 'course':
+        rows = [(course_id, course_id, {'title': title, 'overview': overview})
+                for course_id, title, overview in Course.objects.filter(pk__in=ids).values_list(
+                    'id', 'title', 'overview')]
+    elif source == 'module':
+        rows = [(module_id, course_id, {'modules': '\n'.join([title, description])})
+                for module_id, course_id, title, description in Module.objects.filter(pk__in=ids).values_list(
+                    'id', 'course_id', 'title', 'description')]
+    else:
+        contents = list(Content.objects.filter(pk__in=ids, content_type=ContentType.objects.get_for_model(Text))
+                        .values_list('id', 'module__course_id', 'object_id'))
+        texts = {text_id: '\n'.join([title, content]) for text_id, title, content in Text.objects.filter(
+            pk__in={object_id for _, _, object_id in contents}).values_list('id', 'title', 'content')}
+        rows = [(content_id, course_id, {'texts': texts[object_id]})
+                for content_id, course_id, object_id in contents if object_id in texts]
+    return {document_id(source, pk): (course_id, fields) for pk, course_id, fields in rows}
+
+
+def all_source_ids():
+    """Строки всех источников для полной перестройки индекса: [(источник, [id])]."""
+    return [('course', Course.objects.order_by('pk').values_list('pk', flat=True)),
+            ('module', Module.objects.order_by('pk').values_list('pk', flat=True)),
+            ('content', Content.objects.filter(content_type=ContentType.objects.get_for_model(Text))
+             .order_by('pk').values_list('pk', flat=True))]
+
+
+def _batches(values):
+    values = list(values)
+    for start in range(0, len(values), BATCH_SIZE):
+        yield values[start:start + BATCH_SIZE]
+
+
+class TermIndexBackend(object):
+    def __init__(self, using=DEFAULT_DB_ALIAS):
+        self.using = using
+
+    def index(self, source, ids):
+        """Заменяет документы строк источника; документы удалённых строк удаляются."""
+        for batch in _batches(ids):
+            terms = []
+            for document, (course_id, fields) in documents(source, batch).items():
+                weights = Counter()
+                for field, field_weight in FIELD_WEIGHTS:
+                    for term, count in Counter(tokenize(fields.get(field, ''))).items():
+                        weights[term] += field_weight * (1 + math.log(count))
+                terms += [SearchTerm(term=term, document=document, course_id=course_id, weight=weight)
+                          for term, weight in weights.items()]
+            with transaction.atomic(using=self.using):
+                SearchTerm.objects.using(self.using).filter(
+                    document__in=[document_id(source, pk) for pk in batch]).delete()
+                SearchTerm.objects.using(self.using).bulk_create(terms, batch_size=500)
+
+    def clear(self):
+        SearchTerm.objects.using(self.using).all().delete()
+
+    def search(self, query, limit):
+        terms = query_terms(query)
+        if not terms:
+            return []
+        rows = (SearchTerm.objects.using(self.using).filter(term__in=terms)
+                .values('course_id')
+                .annotate(matched=Count('term', distinct=True), score=Sum('weight'))
+                .filter(matched=len(terms))
+                .order_by('-score', 'course_id')
+                .values_list('course_id', flat=True))
+        return list(rows[:limit])
+
+
+class FTS5Backend(object):
+    table = FTS5_TABLE
+
+    def __init__(self, using=DEFAULT_DB_ALIAS):
+        self.using = using
+
+    def index(self, source, ids):
+        """Заменяет документы строк источника; документы удалённых строк удаляются."""
+        fields = [field for field, _ in FIELD_WEIGHTS]
+        insert = 'INSERT INTO {} (rowid, course_id, {}) VALUES (%s, %s, {})'.format(
+            self.table, ', '.join(fields), ', '.join(['%s'] * len(fields)))
+        for batch in _batches(ids):
+            rows = [[document, course_id] + [values.get(field, '') for field in fields]
+                    for document, (course_id, values) in documents(source, batch).items()]
+            with transaction.atomic(using=self.using), connections[self.using].cursor() as cursor:
+                # rowid записи индекса - идентификатор документа (document_id()).
+                cursor.execute('DELETE FROM {} WHERE rowid IN ({})'.format(
+                    self.table, ', '.join(['%s'] * len(batch))), [document_id(source, pk) for pk in batch])
+                cursor.executemany(insert, rows)
+
+    def clear(self):
+        with connections[self.using].cursor() as cursor:
+            cursor.execute('DELETE FROM {}'.format(self.table))
+
+    def search(self, query, limit):
+        terms = query_terms(query)
+        if not terms:
+            return []
+        # Слова ищутся по отдельности: они могут быть в разных документах курса.
+        # Каждое слово в кавычках: пользовательский ввод не разбирается как синтаксис FTS5.
+        weights = ', '.join([str(weight) for _, weight in FIELD_WEIGHTS] + ['0'])
+        matches = ' UNION ALL '.join(
+            'SELECT course_id, {1} AS term, bm25({0}, {2}) AS rank FROM {0} WHERE {0} MATCH %s'.format(
+                self.table, number, weights) for number in range(len(terms)))
+        with connections[self.using].cursor() as cursor:
+            # LIMIT -1 не даёт SQLite встроить подзапрос в группировку, где bm25() недоступна.
+            cursor.execute('SELECT course_id FROM ({} LIMIT -1) GROUP BY course_id HAVING COUNT(DISTINCT term) = %s '
+                           'ORDER BY SUM(rank), course_id LIMIT %s'.format(matches),
+                           ['"{}"'.format(term) for term in terms] + [len(terms), -1 if limit is None else limit])
+            return [row[0] for row in cursor.fetchall()]
+
+
+_backends = {}
+
+
+def get_backend(using=DEFAULT_DB_ALIAS):
+    connection = connections[using]
+    key = (using, connection.settings_dict['NAME'])
+    if key in _backends:
+        return _backends[key]
+    name = getattr(settings, 'COURSES_SEARCH_BACKEND', 'auto')
+    if name == 'fts5' or (name == 'auto' and connection.vendor == 'sqlite'
+                          and FTS5_TABLE in connection.introspection.table_names()):
+        backend = FTS5Backend(using)
+    else:
+        # Не SQLite или SQLite собран без FTS5 (миграция не создала таблицу).
+        backend = TermIndexBackend(using)
+    # Таблицу создаёт миграция, а не первый вызов, поэтому выбор не меняется,
+    # пока не сменится база данных, и его можно запомнить.
+    _backends[key] = backend
+    return backend
+
+
+def search_course_ids(query, limit=50):
+    """Идентификаторы курсов, подходящих под запрос, в порядке релевантности."""
+    return get_backend().search(query, limit)
+
+
+def search_courses(query, limit=50, queryset=None):
+    """Курсы, подходящие под запрос, в порядке релевантности."""
+    ids = search_course_ids(query, limit)
+    courses = (queryset if queryset is not None else Course.objects.all()).in_bulk(ids)
+    # В индексе могут остаться удалённые курсы, если их удаление не было зафиксировано в индексе.
+    return [courses[course_id] for course_id in ids if course_id in courses]
+
+
+def rebuild():
+    backend = get_backend()
+    backend.clear()
+    for source, ids in all_source_ids():
+        backend.index(source, ids)
+
+
+_pending = threading.local()
+
+
+def schedule_index(source, ids):
+    """
+    Обновляет документы строк источника после фиксации текущей транзакции.
+    Строки, изменённые несколько раз за транзакцию, индексируются один раз.
+    """
+    ids = {pk for pk in ids if pk}
+    if not ids:
+        return
+    if not hasattr(_pending, 'ids'):
+        _pending.ids = {}
+    _pending.ids.setdefault(source, set()).update(ids)
+    transaction.on_commit(_index_pending)
+
+
+def _index_pending():
+    pending = getattr(_pending, 'ids', None)
+    if pending:
+        _pending.ids = {}
+        backend = get_backend()
+        for source in SOURCES:
+            if source in pending:
+                backend.index(source, sorted(pending[source]))
@@ -0,0 +1,265 @@
+import functools
+
+from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
+from django.core.signals import request_started, request_finished
+from django.db.backends.signals import connection_created
+from django.db.models.signals import pre_save, post_save, post_delete, m2m_changed
+from django.dispatch import receiver
+
+from .models import Subject, Course, Module, Content, Text, Video, Image, File, ImageVariant, ApiToken
+from . import db, fragments, images, metrics, progress, search
+from .caching import invalidate, CATALOG, course_tag, module_tag, user_tag
+from .counters import increment, refresh_student_counts
+from .api.authentication import token_cache
+
+
+def skip_raw(handler):
+    """
+    Не вызывает обработчик для сохранений raw=True (loaddata и импорт курса,
+    см. transfer.bulk_create_with_pks()): кэш, счётчики и поисковый индекс для
+    таких строк обновляет вызывающий код.
+    """
+    @functools.wraps(handler)
+    def wrapper(sender, instance, **kwargs):
+        if not kwargs.get('raw'):
+            handler(sender, instance, **kwargs)
+    return wrapper
+
+
+@receiver(post_save, sender=Text)
+@receiver(post_save, sender=Video)
+@receiver(post_save, sender=Image)
+@receiver(post_save, sender=File)
+@skip_raw
+def rebuild_item_fragments(sender, instance, **kwargs):
+    """После сохранения объекта содержимого заново генерирует его HTML-фрагменты."""
+    transaction.on_commit(lambda: fragments.build_fragments(instance))
+
+
+@receiver(post_save, sender=Subject)
+@receiver(post_delete, sender=Subject)
+def invalidate_subject(sender, instance, **kwargs):
+    invalidate(CATALOG)
+
+
+@receiver(post_save, sender=Course)
+@receiver(post_delete, sender=Course)
+def invalidate_course(sender, instance, **kwargs):
+    invalidate(CATALOG, course_tag(instance.id))
+
+
+@receiver(post_save, sender=Module)
+@receiver(post_delete, sender=Module)
+@skip_raw
+def invalidate_module(sender, instance, **kwargs):
+    # В каталоге выводится количество модулей курса.
+    invalidate(CATALOG, course_tag(instance.course_id), module_tag(instance.id))
+
+
+@receiver(post_save, sender=Content)
+@receiver(post_delete, sender=Content)
+def invalidate_content(sender, instance, **kwargs):
+    course_id = Module.objects.filter(id=instance.module_id).values_list('course_id', flat=True).first()
+    # При каскадном удалении модуля его курс уже сброшен обработчиком модуля.
+    invalidate(course_tag(course_id) if course_id else None, module_tag(instance.module_id))
+
+
+@receiver(post_save, sender=Text)
+@receiver(post_save, sender=Video)
+@receiver(post_save, sender=Image)
+@receiver(post_save, sender=File)
+@receiver(post_delete, sender=Text)
+@receiver(post_delete, sender=Video)
+@receiver(post_delete, sender=Image)
+@receiver(post_delete, sender=File)
+@skip_raw
+def invalidate_item(sender, instance, **kwargs):
+    """Объект содержимого может входить в несколько модулей, сбрасываем теги каждого из них."""
+    content_type = ContentType.objects.get_for_model(instance)
+    tags = []
+    for module_id, course_id in Content.objects.filter(content_type=content_type,
+                                                       object_id=instance.id).values_list(
+            'module_id', 'module__course_id'):
+        tags += [course_tag(course_id), module_tag(module_id)]
+    invalidate(*tags)
+
+
+@receiver(pre_save, sender=Image)
+@receiver(pre_save, sender=File)
+@skip_raw
+def release_replaced_file(sender, instance, **kwargs):
+    """При замене файла освобождаем ссылку на прежний файл в хранилище."""
+    instance._file_changed = True
+    if not instance.pk:
+        return
+    old_name = sender.objects.filter(pk=instance.pk).values_list('file', flat=True).first()
+    instance._file_changed = old_name != instance.file.name
+    if old_name and instance._file_changed:
+        storage = instance.file.storage
+        transaction.on_commit(lambda: storage.delete(old_name))
+
+
+@receiver(post_save, sender=Image)
+@skip_raw
+def generate_image_variants(sender, instance, **kwargs):
+    """Варианты изображения создаются заново только при загрузке нового файла."""
+    if getattr(instance, '_file_changed', False) and instance.file:
+        image_id = instance.id
+        transaction.on_commit(lambda: images.schedule_variants(image_id))
+
+
+@receiver(post_delete, sender=Image)
+@receiver(post_delete, sender=File)
+@receiver(post_delete, sender=ImageVariant)
+def release_deleted_file(sender, instance, **kwargs):
+    if instance.file.name:
+        storage = instance.file.storage
+        name = instance.file.name
+        transaction.on_commit(lambda: storage.delete(name))
+
+
+@receiver(pre_save, sender=Course)
+def remember_course_subject(sender, instance, **kwargs):
+    instance._old_subject_id = None
+    if not instance._state.adding:
+        instance._old_subject_id = sender.objects.filter(pk=instance.pk).values_list(
+            'subject_id', flat=True).first()
+
+
+@receiver(post_save, sender=Course)
+def count_subject_courses(sender, instance, created, **kwargs):
+    old_subject_id = getattr(instance, '_old_subject_id', None)
+    if created:
+        increment(Subject.objects.filter(pk=instance.subject_id), 'total_courses', 1)
+    elif old_subject_id and old_subject_id != instance.subject_id:
+        increment(Subject.objects.filter(pk=old_subject_id), 'total_courses', -1)
+        increment(Subject.objects.filter(pk=instance.subject_id), 'total_courses', 1)
+
+
+@receiver(post_delete, sender=Course)
+def uncount_subject_course(sender, instance, **kwargs):
+    increment(Subject.objects.filter(pk=instance.subject_id), 'total_courses', -1)
+
+
+@receiver(post_save, sender=Module)
+@skip_raw
+def count_course_modules(sender, instance, created, **kwargs):
+    if created:
+        increment(Course.objects.filter(pk=instance.course_id), 'total_modules', 1)
+
+
+@receiver(post_delete, sender=Module)
+def uncount_course_module(sender, instance, **kwargs):
+    increment(Course.objects.filter(pk=instance.course_id), 'total_modules', -1)
+
+
+@receiver(post_save, sender=Content)
+def count_course_contents(sender, instance, created, **kwargs):
+    if created:
+        increment(Course.objects.filter(modules=instance.module_id), 'total_contents', 1)
+
+
+@receiver(post_delete, sender=Content)
+def uncount_course_content(sender, instance, **kwargs):
+    courses = Course.objects.filter(modules=instance.module_id)
+    increment(courses, 'total_contents', -1)
+    # Отметки удалённого объекта удалены каскадно, пересчитываем прогресс студентов
+    # один раз после удаления, а не на каждый объект.
+    progress.schedule_refresh(courses.values_list('pk', flat=True))
+
+
+@receiver(m2m_changed, sender=Course.students.through)
+def count_course_students(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Поддерживает Course.total_students для course.students.add()/remove()/clear()
+    и обратных вызовов user.courses_joined. При добавлении pk_set содержит только
+    новые связи, поэтому счётчик увеличивается на их число; после удаления
+    затронутые курсы пересчитываются.
+    """
+    if action == 'pre_clear' and reverse:
+        instance._cleared_course_ids = list(instance.courses_joined.values_list('pk', flat=True))
+    elif action == 'post_add':
+        if reverse:
+            increment(Course.objects.filter(pk__in=pk_set), 'total_students', 1)
+        else:
+            increment(Course.objects.filter(pk=instance.pk), 'total_students', len(pk_set))
+    elif action == 'post_remove':
+        refresh_student_counts(pk_set if reverse else [instance.pk])
+    elif action == 'post_clear':
+        refresh_student_counts(getattr(instance, '_cleared_course_ids', []) if reverse else [instance.pk])
+
+
+@receiver(m2m_changed, sender=Course.students.through)
+def invalidate_enrollment(sender, instance, action, reverse, pk_set, **kwargs):
+    """Сбрасывает закэшированные данные о записи на курсы затронутых студентов."""
+    if action == 'pre_clear' and not reverse:
+        instance._cleared_student_ids = list(instance.students.values_list('pk', flat=True))
+    elif action in ('post_add', 'post_remove', 'post_clear'):
+        if reverse:
+            user_ids = [instance.pk]
+            # Множество курсов, запомненное в объекте пользователя, устарело.
+            instance.__dict__.pop('_enrolled_course_ids', None)
+        elif action == 'post_clear':
+            user_ids = getattr(instance, '_cleared_student_ids', [])
+        else:
+            user_ids = pk_set
+        invalidate(*[user_tag(user_id) for user_id in user_ids])
+
+
+@receiver(post_delete, sender=ApiToken)
+def forget_deleted_token(sender, instance, **kwargs):
+    """Отозванный токен сразу перестаёт приниматься этим процессом."""
+    token_cache.discard(instance.key_hash)
+
+
+@receiver(post_save, sender=Course)
+@receiver(post_delete, sender=Course)
+def index_course(sender, instance, **kwargs):
+    search.schedule_index('course', [instance.id])
+
+
+@receiver(post_save, sender=Module)
+@receiver(post_delete, sender=Module)
+@skip_raw
+def index_module(sender, instance, **kwargs):
+    search.schedule_index('module', [instance.id])
+
+
+@receiver(post_save, sender=Content)
+@receiver(post_delete, sender=Content)
+def index_content(sender, instance, **kwargs):
+    """В поисковый индекс входит только текстовое содержимое."""
+    if instance.content_type_id == ContentType.objects.get_for_model(Text).id:
+        search.schedule_index('content', [instance.id])
+
+
+@receiver(post_save, sender=Text)
+@receiver(post_delete, sender=Text)
+@skip_raw
+def index_text_contents(sender, instance, **kwargs):
+    search.schedule_index('content', Content.objects.filter(
+        content_type=ContentType.objects.get_for_model(Text), object_id=instance.id).values_list('id', flat=True))
+
+
+@receiver(connection_created)
+def count_queries(sender, connection, **kwargs):
+    """Подключает подсчёт SQL-запросов для метрик к каждому соединению с базой данных."""
+    metrics.install_execute_wrapper(connection)
+
+
+@receiver(connection_created)
+def configure_connection(sender, connection, **kwargs):
+    """Применяет PRAGMAS из настроек базы данных SQLite (см. db.py)."""
+    db.apply_pragmas(connection)
+
+
+@receiver(request_started)
+def check_connections(sender, **kwargs):
+    db.check_connections()
+
+
+@receiver(request_finished)
+def flush_progress(sender, **kwargs):
+    """Сохраняет буфер прогресса студентов, если отметки ждут дольше интервала (см. progress.py)."""
+    progress.flush_if_due()
@@ -0,0 +1,86 @@
+import hashlib
+import os
+import posixpath
+import re
+
+from django.apps import apps
+from django.core.files.storage import FileSystemStorage
+from django.db import transaction, IntegrityError
+from django.db.models import F
+from django.utils.deconstruct import deconstructible
+
+"""
+Хранилище файлов содержимого с адресацией по содержимому.
+Имя файла строится из его SHA-256: files/ab/cd/abcd...pdf. Одинаковые файлы,
+загруженные в разные курсы, хранятся на диске один раз, а число ссылок на
+каждый файл учитывается в модели Blob. Файл удаляется с диска, когда на него
+не остаётся ссылок.
+Так как содержимое файла по адресу никогда не меняется, веб-сервер может
+отдавать MEDIA_URL с заголовком Cache-Control: public, max-age=31536000, immutable.
+"""
+
+DIGEST_RE = re.compile(r'^[0-9a-f]{2}/[0-9a-f]{2}/([0-9a-f]{64})(\.[^/]*)?$')
+
+
+def file_digest(content):
+    checksum = hashlib.sha256()
+    for chunk in content.chunks():
+        checksum.update(chunk)
+    content.seek(0)
+    return checksum.hexdigest()
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    def blob_name(self, name, digest):
+        directory = posixpath.dirname(name)
+        extension = os.path.splitext(name)[1].lower()
+        return posixpath.join(directory, digest[:2], digest[2:4], digest + extension)
+
+    def digest(self, name):
+        """Возвращает SHA-256 файла по его имени или None для файлов вне этой схемы."""
+        match = DIGEST_RE.match(name.split('/', 1)[-1])
+        return match.group(1) if match else None
+
+    def _save(self, name, content):
+        # ChecksumUploadHandler уже посчитал хэш при загрузке, повторно файл не читаем.
+        digest = getattr(content, 'sha256', None) or file_digest(content)
+        name = self.blob_name(name, digest)
+        with transaction.atomic():
+            # Ссылка учитывается до записи: параллельный release() не удалит файл.
+            self.retain(name)
+            if self.exists(name):
+                return name
+            return super(ContentAddressedStorage, self)._save(name, content)
+
+    def retain(self, name):
+        """Увеличивает число ссылок на файл."""
+        Blob = apps.get_model('courses', 'Blob')
+        with transaction.atomic():
+            if Blob.objects.filter(name=name).update(references=F('references') + 1):
+                return
+            try:
+                with transaction.atomic():
+                    Blob.objects.create(name=name, references=1)
+            except IntegrityError:
+                Blob.objects.filter(name=name).update(references=F('references') + 1)
+
+    def delete(self, name):
+        """
+        Уменьшает число ссылок на файл и удаляет его, когда ссылок не осталось.
+        Файлы, которые не учитываются в Blob (загруженные до появления хранилища),
+        не удаляются: на них могут ссылаться другие объекты.
+        """
+        Blob = apps.get_model('courses', 'Blob')
+        with transaction.atomic():
+            blob = Blob.objects.select_for_update().filter(name=name).first()
+            if blob is None:
+                return
+            if blob.references > 1:
+                Blob.objects.filter(pk=blob.pk).update(references=F('references') - 1)
+                return
+            blob.delete()
+            super(ContentAddressedStorage, self).delete(name)
+
+
+content_storage = ContentAddressedStorage()
@@ -1,5 +1,7 @@
 from django import template
 
+from .. import urltable
+
 register = template.Library()
 
 
@@ -9,3 +11,16 @@ def model_name(obj):
         return obj._meta.model_name
     except AttributeError:
         return None
+
+
+@register.simple_tag(takes_context=True)
+def fast_url(context, name, *args):
+    """
+    Как {% url %} с позиционными аргументами, но через таблицу адресов
+    (courses/urltable.py). Для ссылок внутри циклов по модулям и содержимому.
+    """
+    templates = context.render_context.setdefault('fast_url', {})
+    key = (name, len(args))
+    if key not in templates:
+        templates[key] = urltable.url_template(name, len(args))
+    return urltable.build(templates[key], name, args)
@@ -1,3 +1,1051 @@
-from django.test import TestCase
+from django.contrib.auth.models import User, Permission
+from django.db import connection
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, RequestFactory, override_settings
+from io import BytesIO, StringIO
+from unittest import skipIf
+from django.urls import reverse, NoReverseMatch
+from django.utils import translation
+from django.test.utils import CaptureQueriesContext
+import base64
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from rest_framework.renderers import JSONRenderer
+
+from .api.serializers import CourseSerializer, CourseWithContentsSerializer
+from .api.fast import course_values, row_serializer, serialize_courses, serialize_course_tree
+from .api.renderers import FastJSONRenderer
+from .api.views import CourseViewSet
+from .api.authentication import token_cache, create_token
+from .fragments import prefetch_fragments, prefetch_content_fragments
+from .transfer import export_course, import_course, CourseImportError
+from .models import (Subject, Course, Module, Content, Text, Video, Image, File, Blob, ApiToken,
+                     ContentProgress, CourseProgress)
+from .storage import ContentAddressedStorage
+from .images import generate_variants, PILImage
+from . import counters
+from . import enrollment
+from . import search
+from . import benchmark
+from . import metrics
+from . import progress
+from .db import ReplicaRouter, use_replica, reads_from_replica, replica_active
+from . import caching
+from .layered_cache import LayeredCache, Envelope
+from . import layered_cache
+from . import urltable
+from .profiling import profile_templates
+
+
+def content_storage_name(name, digest):
+    return ContentAddressedStorage().blob_name(name, digest)
+
+
+def basic_auth(username, password):
+    credentials = '{}:{}'.format(username, password).encode()
+    return 'Basic ' + base64.b64encode(credentials).decode()
+
+
+class CourseTreeMixin(object):
+    """Создаёт курс с модулями, в каждом из которых есть все четыре типа содержимого."""
+
+    def setUp(self):
+        # LANGUAGE_CODE 'en-us' отсутствует в LANGUAGES, адреса строим для 'en'.
+        translation.activate('en')
+        self.addCleanup(translation.deactivate)
+        # Версии тегов не меняются внутри TestCase (on_commit не вызывается), поэтому
+        # записи кэша одного теста не должны попасть в другой.
+        cache.clear()
+        # Буфер прогресса общий для процесса: отметки одного теста не должны попасть в другой.
+        progress.buffer.take()
+        self.owner = User.objects.create_user('instructor', password='secret')
+        self.subject = Subject.objects.create(title='Programming', slug='programming')
+        self.course = Course.objects.create(owner=self.owner, subject=self.subject,
+                                            title='Python', slug='python',
+                                            overview='Python for beginners')
+
+    def add_module(self, course=None):
+        module = Module.objects.create(course=course or self.course, title='Module')
+        items = [Text(content='Lorem ipsum'),
+                 Video(url='https://www.youtube.com/watch?v=dQw4w9WgXcQ'),
+                 Image(file='images/lecture.png'),
+                 File(file='files/lecture.pdf')]
+        for item in items:
+            item.owner = self.owner
+            item.title = 'Item'
+            item.save()
+            Content.objects.create(module=module, item=item)
+        return module
+
+
+class CourseContentsQueryTest(CourseTreeMixin, TestCase):
+    def count_queries(self):
+        with CaptureQueriesContext(connection) as context:
+            course = Course.objects.with_contents().get(pk=self.course.pk)
+            prefetch_content_fragments(content for module in course.modules.all()
+                                       for content in module.contents.all())
+            data = CourseWithContentsSerializer(course).data
+        return len(context), data
+
+    def test_query_count_does_not_grow_with_course_size(self):
+        self.add_module()
+        small, data = self.count_queries()
+        self.assertEqual(len(data['modules'][0]['contents']), 4)
+
+        for _ in range(10):
+            self.add_module()
+        large, data = self.count_queries()
+
+        self.assertEqual(len(data['modules']), 11)
+        self.assertEqual(small, large)
+        # курс, модули, содержимое, по одному запросу на Text, Video, Image, File
+        # и варианты изображений для генерации недостающих фрагментов
+        self.assertLessEqual(large, 8)
+
+
+class ItemFragmentTest(CourseTreeMixin, TestCase):
+    def test_fragment_is_versioned_by_updated(self):
+        text = Text.objects.create(owner=self.owner, title='Intro', content='first')
+        self.assertIn('first', text.render())
+
+        text.content = 'second'
+        text.save()
+        text = Text.objects.get(pk=text.pk)
+        self.assertIn('second', text.render())
+
+    def test_prefetch_reads_fragments_in_bulk(self):
+        module = self.add_module()
+        items = [content.item for content in module.contents.all()]
+        prefetch_fragments(items)
+        with self.assertNumQueries(0):
+            rendered = [item.render() for item in items]
+        self.assertIn('Lorem ipsum', rendered[0])
+
+
+class CourseListCacheTest(CourseTreeMixin, TransactionTestCase):
+    def test_catalog_is_invalidated_on_save(self):
+        url = reverse('course_list_subject', args=[self.subject.slug])
+        self.assertContains(self.client.get(url), 'Python')
+        with self.assertNumQueries(0):
+            self.client.get(url)
+
+        Course.objects.create(owner=self.owner, subject=self.subject, title='Django',
+                              slug='django', overview='Web development')
+        self.assertContains(self.client.get(url), 'Django')
+
+
+class ReorderTest(CourseTreeMixin, TestCase):
+    def setUp(self):
+        super(ReorderTest, self).setUp()
+        self.client.force_login(self.owner)
+
+    def post_order(self, url_name, order_map):
+        return self.client.post(reverse(url_name), json.dumps(order_map),
+                                content_type='application/json')
+
+    def reverse_contents(self, module):
+        ids = list(module.contents.values_list('id', flat=True))
+        order_map = {pk: position for position, pk in enumerate(reversed(ids))}
+        with CaptureQueriesContext(connection) as context:
+            response = self.post_order('content_order', order_map)
+        self.assertEqual(response.json()['order'], list(reversed(ids)))
+        self.assertEqual(list(module.contents.values_list('id', flat=True)), list(reversed(ids)))
+        return len(context)
+
+    def test_query_count_does_not_grow_with_module_size(self):
+        small = self.reverse_contents(self.add_module())
+        module = self.add_module()
+        for _ in range(10):
+            for content in self.add_module().contents.all():
+                content.module = module
+                content.order = None
+                content.save()
+        self.assertEqual(self.reverse_contents(module), small)
+
+    def test_modules_are_saved(self):
+        first, second = self.add_module(), self.add_module()
+        response = self.post_order('module_order', {first.id: 1, second.id: 0})
+        self.assertEqual(response.json()['order'], [second.id, first.id])
+        self.assertEqual(list(self.course.modules.values_list('id', flat=True)), [second.id, first.id])
+
+    def test_foreign_ids_are_rejected(self):
+        module = self.add_module()
+        stranger = User.objects.create_user('stranger', password='secret')
+        self.client.force_login(stranger)
+        ids = list(module.contents.values_list('id', flat=True))
+        response = self.post_order('content_order', {ids[0]: 3, ids[3]: 0})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(list(module.contents.values_list('id', flat=True)), ids)
+
+
+class OrderFieldTest(CourseTreeMixin, TestCase):
+    def test_bulk_create_allocates_orders_per_parent(self):
+        first, second = self.add_module(), self.add_module()
+        text = Text.objects.create(owner=self.owner, title='Note', content='Note')
+        contents = [Content(module=module, item=text) for module in (first, second, first, second)]
+        with self.assertNumQueries(3):  # блокировка модулей, MAX ... GROUP BY, INSERT
+            Content.objects.bulk_create(contents)
+        self.assertEqual([content.order for content in contents], [4, 4, 5, 5])
+
+    def test_new_module_gets_next_order(self):
+        self.add_module()
+        self.assertEqual(self.add_module().order, 1)
+
+
+class OrderFieldTransactionTest(CourseTreeMixin, TransactionTestCase):
+    def test_create_outside_atomic_allocates_in_transaction(self):
+        Module.objects.create(course=self.course, title='First')
+        with CaptureQueriesContext(connection) as context:
+            module = Module.objects.create(course=self.course, title='Second')
+        self.assertEqual(module.order, 1)
+        statements = [query['sql'].split()[0] for query in context.captured_queries]
+        # Блокировка курса, MAX и INSERT выполняются в одной транзакции.
+        self.assertEqual(statements[:4], ['BEGIN', 'SELECT', 'SELECT', 'INSERT'])
+        self.assertIn('MAX(', context.captured_queries[2]['sql'])
+
+
+class CourseTransferTest(CourseTreeMixin, TestCase):
+    def store_files(self):
+        """Переносит файлы содержимого в хранилище с адресацией по содержимому (только записи Blob)."""
+        for model in (Image, File):
+            for item in model.objects.all():
+                digest = hashlib.sha256(str(item.pk).encode()).hexdigest()
+                item.file.name = content_storage_name(item.file.name, digest)
+                model.objects.filter(pk=item.pk).update(file=item.file.name)
+                Blob.objects.create(name=item.file.name, references=1)
+
+    def test_export_import_round_trip(self):
+        for _ in range(3):
+            self.add_module()
+        self.store_files()
+        Module.objects.create(course=self.course, title='Empty')
+        lines = list(export_course(self.course))
+        self.assertEqual(len(lines), 1 + 4 + 3 * 4)
+
+        self.course.slug = 'python-old'
+        self.course.save()
+        course = import_course(lines, self.owner)
+
+        self.assertEqual(list(export_course(course)), lines)
+        # Импортированные объекты ссылаются на те же файлы.
+        self.assertEqual(set(Blob.objects.values_list('references', flat=True)), {2})
+
+    def test_unknown_files_are_rejected(self):
+        self.add_module()
+        self.store_files()
+        lines = list(export_course(self.course))
+        self.course.delete()
+        missing = File.objects.get().file.name
+        Blob.objects.filter(name=missing).delete()
+        with self.assertRaisesMessage(CourseImportError, 'Unknown files: {}.'.format(missing)):
+            import_course(lines, self.owner)
+        lines = [line.replace(missing, 'files/lecture.pdf') for line in lines]
+        with self.assertRaisesMessage(CourseImportError, 'Files outside the content store: files/lecture.pdf.'):
+            import_course(lines, self.owner)
+        self.assertFalse(Course.objects.exists())
+
+    def test_invalid_document_is_rolled_back(self):
+        lines = list(export_course(self.course)) + ['{"type": "content", "model": "text"}\n']
+        self.course.delete()
+        with self.assertRaisesMessage(CourseImportError, 'Line 2: Content must follow a module.'):
+            import_course(lines, self.owner)
+        self.assertFalse(Course.objects.exists())
+
+    def test_invalid_order_is_rejected(self):
+        self.add_module()
+        lines = list(export_course(self.course))
+        self.course.delete()
+        for number in (2, 3):
+            data = json.loads(lines[number - 1])
+            data['order'] = 'abc'
+            invalid = lines[:number - 1] + [json.dumps(data) + '\n'] + lines[number:]
+            with self.assertRaisesMessage(CourseImportError,
+                                          "Line {}: Order must be an integer, got 'abc'.".format(number)):
+                import_course(invalid, self.owner)
+        self.owner.user_permissions.add(Permission.objects.get(codename='add_course'))
+        response = self.client.post(reverse('api:course-import-tree'), ''.join(invalid),
+                                    content_type='application/x-ndjson',
+                                    HTTP_AUTHORIZATION=basic_auth('instructor', 'secret'))
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Course.objects.exists())
+
+    def test_api_export_streams_course(self):
+        self.add_module()
+        response = self.client.get(reverse('api:course-export', args=[self.course.id]),
+                                   HTTP_AUTHORIZATION=basic_auth('instructor', 'secret'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content).decode().count('\n'), 6)
+
+
+class ContentFileTest(CourseTreeMixin, TestCase):
+    def setUp(self):
+        super(ContentFileTest, self).setUp()
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.file = File(owner=self.owner, title='Slides')
+        self.file.file.save('slides.pdf', ContentFile(b'0123456789'), save=False)
+        self.file.save()
+        self.url = reverse('content_file', args=['file', self.file.id])
+        self.client.force_login(self.owner)
+
+    def test_range_request(self):
+        response = self.client.get(self.url, HTTP_RANGE='bytes=2-5')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], 'bytes 2-5/10')
+        self.assertEqual(b''.join(response.streaming_content), b'2345')
+
+    def test_conditional_request(self):
+        response = self.client.get(self.url)
+        self.assertEqual(b''.join(response.streaming_content), b'0123456789')
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    @override_settings(COURSES_MEDIA_SENDFILE='x-accel')
+    def test_x_accel_redirect(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response['X-Accel-Redirect'], '/protected-media/' + self.file.file.name)
+        self.assertEqual(response.content, b'')
+
+    def test_not_enrolled_user_gets_404(self):
+        self.client.force_login(User.objects.create_user('stranger', password='secret'))
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+
+    @override_settings(COURSES_MAX_UPLOAD_SIZE=5)
+    def test_oversized_upload_is_rejected(self):
+        module = self.add_module()
+        upload = ContentFile(b'0123456789', name='big.pdf')
+        response = self.client.post(reverse('module_content_create', args=[module.id, 'file']),
+                                    {'title': 'Big', 'file': upload})
+        self.assertContains(response, 'The file is too large.')
+        self.assertEqual(module.contents.count(), 4)
+
+
+class ContentAddressedStorageTest(TestCase):
+    def setUp(self):
+        self.storage = ContentAddressedStorage(location=tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.storage.location)
+
+    def test_duplicates_share_one_blob(self):
+        first = self.storage.save('files/a.pdf', ContentFile(b'lecture'))
+        second = self.storage.save('files/b.PDF', ContentFile(b'lecture'))
+        self.assertEqual(first, second)
+        self.assertRegex(first, r'^files/[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{64}\.pdf$')
+        self.assertEqual(Blob.objects.get(name=first).references, 2)
+
+        self.storage.delete(first)
+        self.assertTrue(self.storage.exists(first))
+        self.storage.delete(first)
+        self.assertFalse(self.storage.exists(first))
+        self.assertFalse(Blob.objects.exists())
+
+
+@skipIf(PILImage is None, 'Pillow is not installed')
+class ImageVariantTest(CourseTreeMixin, TestCase):
+    def setUp(self):
+        super(ImageVariantTest, self).setUp()
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def test_variants_are_rendered_in_srcset(self):
+        buffer = BytesIO()
+        PILImage.new('RGB', (800, 400), 'green').save(buffer, 'PNG')
+        image = Image(owner=self.owner, title='Diagram')
+        image.file.save('diagram.png', ContentFile(buffer.getvalue()), save=False)
+        image.save()
+
+        generate_variants(image.id)
+
+        image = Image.objects.get(pk=image.id)
+        self.assertEqual((image.width, image.height), (800, 400))
+        self.assertEqual([(v.format, v.width, v.height) for v in image.variants.order_by('width', 'format')],
+                         [('jpeg', 320, 160), ('webp', 320, 160), ('jpeg', 640, 320), ('webp', 640, 320)])
+        html = image.render()
+        self.assertIn('type="image/webp"', html)
+        self.assertIn('640w', html)
+        self.assertIn('width="800" height="400"', html)
+
+
+class CounterTest(CourseTreeMixin, TestCase):
+    def assertCounters(self, courses, modules, students):
+        self.subject.refresh_from_db()
+        self.course.refresh_from_db()
+        self.assertEqual((self.subject.total_courses, self.course.total_modules, self.course.total_students),
+                         (courses, modules, students))
+
+    def test_counters_follow_changes(self):
+        self.add_module()
+        module = self.add_module()
+        student = User.objects.create_user('student', password='secret')
+        self.course.students.add(student)
+        self.course.students.add(student)
+        self.assertCounters(1, 2, 1)
+
+        # Устаревший объект в памяти не перезаписывает счётчики.
+        stale = Course.objects.get(pk=self.course.pk)
+        module.delete()
+        student.courses_joined.clear()
+        stale.title = 'Python 3'
+        stale.save()
+        self.assertCounters(1, 1, 0)
+
+    def test_reconcile(self):
+        self.add_module()
+        Course.objects.filter(pk=self.course.pk).update(total_modules=10)
+        Subject.objects.update(total_courses=0)
+        counters.reconcile()
+        self.assertCounters(1, 1, 0)
+
+
+class CourseApiListTest(CourseTreeMixin, TestCase):
+    def setUp(self):
+        super(CourseApiListTest, self).setUp()
+        for number in range(5):
+            course = Course.objects.create(owner=self.owner, subject=self.subject,
+                                           title='Course {}'.format(number),
+                                           slug='course-{}'.format(number), overview='...')
+            self.add_module(course)
+
+    def test_keyset_pagination(self):
+        url = reverse('api:course-list') + '?page_size=2'
+        seen = []
+        while url:
+            with self.assertNumQueries(2):
+                data = self.client.get(url).json()
+            seen += [course['slug'] for course in data['results']]
+            url = data['next']
+        self.assertEqual(seen, list(Course.objects.order_by('-created', 'id').values_list('slug', flat=True)))
+
+    def test_sparse_fields_skip_modules(self):
+        with self.assertNumQueries(1):
+            data = self.client.get(reverse('api:course-list'), {'fields': 'id,title'}).json()
+        self.assertEqual(set(data['results'][0]), {'id', 'title'})
+
+
+class FastSerializerTest(CourseTreeMixin, TestCase):
+    def setUp(self):
+        super(FastSerializerTest, self).setUp()
+        self.add_module()
+        self.add_module()
+        self.course.overview = 'Строка\u2028с "кавычками" и <тегами>'
+        self.course.save()
+        Course.objects.create(owner=self.owner, subject=self.subject, title='Empty',
+                              slug='empty', overview='')
+
+    def assertSameJSON(self, data, expected):
+        self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(expected))
+
+    def test_courses_are_byte_identical(self):
+        courses = Course.objects.prefetch_related('modules')
+        self.assertSameJSON(serialize_courses(list(course_values(Course.objects.all()))),
+                            CourseSerializer(courses, many=True).data)
+
+    def test_course_tree_is_byte_identical(self):
+        course = Course.objects.with_contents().get(pk=self.course.pk)
+        self.assertSameJSON(serialize_course_tree(self.course),
+                            CourseWithContentsSerializer(course).data)
+
+    def test_renderer_falls_back_for_unsupported_data(self):
+        data = {1: 2 ** 70, 'created': self.course.created}
+        self.assertSameJSON(data, data)
+
+    def test_renderer_rejects_non_finite_floats(self):
+        for value in (float('nan'), float('inf')):
+            with self.assertRaises(ValueError):
+                FastJSONRenderer().render({'score': value})
+
+    def test_row_serializer_is_built_once(self):
+        self.assertIs(row_serializer(CourseSerializer, {'id', 'title'}),
+                      row_serializer(CourseSerializer, ['title', 'id', 'unknown']))
+        self.assertIs(row_serializer(CourseSerializer), row_serializer(CourseSerializer))
+
+    def test_benchmark_command(self):
+        stdout, stderr = StringIO(), StringIO()
+        call_command('benchmark_serializers', repeat=1, course='python', stdout=stdout, stderr=stderr)
+        self.assertIn('course list: DRF', stdout.getvalue())
+        self.assertEqual(stderr.getvalue(), '')
+
+
+class ConditionalGetTest(CourseTreeMixin, TransactionTestCase):
+    def setUp(self):
+        super(ConditionalGetTest, self).setUp()
+        self.module = self.add_module()
+        self.student = User.objects.create_user('student', password='secret')
+        self.course.students.add(self.student)
+        self.auth = basic_auth('student', 'secret')
+
+    def test_contents_not_modified(self):
+        url = reverse('api:course-contents', args=[self.course.id])
+        response = self.client.get(url, HTTP_AUTHORIZATION=self.auth)
+        etag = response['ETag']
+        with self.assertNumQueries(2):
+            # пользователь и курс: запись на курс берётся из кэша, дерево курса не строится
+            response = self.client.get(url, HTTP_AUTHORIZATION=self.auth, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+        text = Text.objects.get()
+        text.content = 'Changed'
+        text.save()
+        response = self.client.get(url, HTTP_AUTHORIZATION=self.auth, HTTP_IF_NONE_MATCH=etag)
+        self.assertContains(response, 'Changed')
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_course_page_depends_on_user(self):
+        url = reverse('course_detail', args=[self.course.slug])
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.client.force_login(self.student)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_student_page_not_modified(self):
+        self.client.force_login(self.student)
+        url = reverse('student_course_detail', args=[self.course.id])
+        response = self.client.get(url)
+        self.assertContains(response, 'Lorem ipsum')
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(response.status_code, 304)
+
+
+class BulkEnrollmentTest(CourseTreeMixin, TestCase):
+    def setUp(self):
+        super(BulkEnrollmentTest, self).setUp()
+        User.objects.bulk_create([User(username='student{}'.format(number)) for number in range(1200)])
+        self.course.students.add(User.objects.get(username='student0'))
+
+    def test_cohort_is_enrolled_in_batches(self):
+        usernames = ['student{}'.format(number) for number in range(1200)] + ['student1', 'nobody']
+        # пользователи и записи по 3 пакета, 3 вставки, счётчик, SAVEPOINT и RELEASE
+        with self.assertNumQueries(12):
+            results = enrollment.enroll_users(self.course, usernames)
+        self.assertEqual(enrollment.count_results(results),
+                         {'enrolled': 1199, 'already_enrolled': 1, 'unknown_user': 1})
+        self.assertEqual(results['student0'], 'already_enrolled')
+        self.assertEqual(Course.objects.get().total_students, 1200)
+
+    def test_api_requires_course_owner(self):
+        url = reverse('api:course-enroll-cohort', args=[self.course.id])
+        data = {'usernames': ['student1', 'nobody']}
+        User.objects.create_user('stranger', password='secret')
+        response = self.client.post(url, data, content_type='application/json',
+                                    HTTP_AUTHORIZATION=basic_auth('stranger', 'secret'))
+        self.assertEqual(response.status_code, 403)
+
+        response = self.client.post(url, data, content_type='application/json',
+                                    HTTP_AUTHORIZATION=basic_auth('instructor', 'secret'))
+        self.assertEqual(response.json()['results'], {'student1': 'enrolled', 'nobody': 'unknown_user'})
+
+    def test_command_reads_csv(self):
+        path = tempfile.mktemp(suffix='.csv')
+        self.addCleanup(os.remove, path)
+        with open(path, 'w') as file:
+            file.write('email,username\na@example.com,student1\nb@example.com,nobody\n')
+        stdout = StringIO()
+        call_command('enroll_cohort', 'python', path, stdout=stdout, stderr=StringIO())
+        self.assertEqual(stdout.getvalue().splitlines(),
+                         ['username,result', 'student1,enrolled', 'nobody,unknown_user'])
+
+
+class TokenAuthenticationTest(CourseTreeMixin, TestCase):
+    def setUp(self):
+        super(TokenAuthenticationTest, self).setUp()
+        token_cache.clear()
+        self.add_module()
+        self.student = User.objects.create_user('student', password='secret')
+        self.course.students.add(self.student)
+        self.url = reverse('api:course-contents', args=[self.course.id])
+
+    def test_token_replaces_password_check(self):
+        response = self.client.post(reverse('api:token'), HTTP_AUTHORIZATION=basic_auth('student', 'secret'))
+        key = response.json()['token']
+        self.assertEqual(ApiToken.objects.get().key_hash, hashlib.sha256(key.encode()).hexdigest())
+
+        auth = 'Token ' + key
+        self.assertEqual(self.client.get(self.url, HTTP_AUTHORIZATION=auth).status_code, 200)
+        with CaptureQueriesContext(connection) as context:
+            self.client.get(self.url, HTTP_AUTHORIZATION=auth)
+        self.assertFalse([query for query in context.captured_queries if 'auth_user' in query['sql']])
+
+        self.assertEqual(self.client.delete(reverse('api:token'), HTTP_AUTHORIZATION=auth).status_code, 204)
+        self.assertEqual(self.client.get(self.url, HTTP_AUTHORIZATION=auth).status_code, 401)
+
+    def test_expired_token_is_rejected(self):
+        key, token = create_token(self.student)
+        ApiToken.objects.filter(pk=token.pk).update(expires=token.created)
+        response = self.client.get(self.url, HTTP_AUTHORIZATION='Token ' + key)
+        self.assertEqual(response.status_code, 401)
+
+    def test_challenge_stays_basic(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response['WWW-Authenticate'], 'Basic realm="api"')
+
+
+class CourseSearchTest(CourseTreeMixin, TransactionTestCase):
+    def setUp(self):
+        # Таблица FTS5 не очищается вместе с таблицами моделей.
+        search.get_backend().clear()
+        super(CourseSearchTest, self).setUp()
+        module = self.add_module()
+        module.title = 'Генераторы и итераторы'
+        module.save()
+        Course.objects.create(owner=self.owner, subject=self.subject, title='Django',
+                              slug='django', overview='Web development with Python')
+
+    def check_backend(self, backend):
+        backend.clear()
+        for source, ids in search.all_source_ids():
+            backend.index(source, ids)
+        # Название курса весит больше описания.
+        self.assertEqual(backend.search('python', 10), [self.course.id, Course.objects.get(slug='django').id])
+        self.assertEqual(backend.search('ГЕНЕРАТОРЫ', 10), [self.course.id])
+        self.assertEqual(backend.search('lorem web', 10), [])
+        self.assertEqual(backend.search('"*', 10), [])
+        # Слова запроса могут быть в разных документах курса.
+        self.assertEqual(backend.search('python итераторы', 10), [self.course.id])
+
+    def test_fts5_backend(self):
+        self.check_backend(search.FTS5Backend())
+
+    def test_term_index_backend(self):
+        self.check_backend(search.TermIndexBackend())
+
+    def test_index_follows_changes(self):
+        text = Text.objects.get()
+        text.content = 'Комбинаторика'
+        text.save()
+        self.assertEqual(search.search_course_ids('комбинаторика'), [self.course.id])
+        with CaptureQueriesContext(connection) as context:
+            Module.objects.filter(pk=Module.objects.get().pk).update(title='Декораторы')
+            Module.objects.get().save()
+        # Заново индексируется только изменённый модуль, а не весь курс.
+        self.assertFalse([query for query in context.captured_queries if 'courses_text' in query['sql']])
+        self.assertEqual(search.search_course_ids('декораторы'), [self.course.id])
+        Module.objects.get().delete()
+        self.assertEqual(search.search_course_ids('комбинаторика'), [])
+        self.assertEqual(search.search_course_ids('декораторы'), [])
+
+    def test_imported_course_is_indexed(self):
+        text = Text.objects.get()
+        text.content = 'Zebrafish'
+        text.save()
+        module = Module.objects.get()
+        module.title = 'Quantum'
+        module.save()
+        # Файлы вне хранилища не импортируются, поэтому переносим только текст.
+        lines = [line for line in export_course(self.course)
+                 if json.loads(line).get('model') not in ('image', 'file')]
+        self.course.delete()
+        course = import_course(lines, self.owner)
+        self.assertEqual(search.search_course_ids('quantum'), [course.id])
+        self.assertEqual(search.search_course_ids('zebrafish'), [course.id])
+
+    def test_course_with_search_slug(self):
+        self.course.slug = 'search'
+        self.course.save()
+        self.assertContains(self.client.get(reverse('course_detail', args=['search'])), 'Python')
+
+    def test_search_page_and_api(self):
+        response = self.client.get(reverse('course_search'), {'q': 'итераторы'})
+        self.assertContains(response, 'Python')
+        self.assertNotContains(response, 'Django')
+        response = self.client.get(reverse('api:course-search'), {'q': 'web', 'fields': 'slug'})
+        self.assertEqual(response.json(), {'results': [{'slug': 'django'}]})
+
+
+class AsyncCatalogTest(CourseTreeMixin, TestCase):
+    def setUp(self):
+        super(AsyncCatalogTest, self).setUp()
+        self.add_module()
+
+    def test_api_list_matches_drf(self):
+        url = reverse('api:course-list')
+        response = self.client.get(url, HTTP_ACCEPT='application/json')
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(url, HTTP_ACCEPT='application/json').content, response.content)
+
+        drf_response = CourseViewSet.as_view({'get': 'list'})(RequestFactory().get(url, HTTP_ACCEPT='application/json'))
+        self.assertEqual(drf_response.render().content, response.content)
+        self.assertEqual(response['Allow'], drf_response['Allow'])
+
+    @override_settings(COURSES_DB_REPLICAS=['default'])
+    def test_api_list_from_replica_is_cached_briefly(self):
+        url = reverse('api:course-list')
+        self.client.get(url, HTTP_ACCEPT='application/json')
+        key = caching.make_key('api_list:{}'.format(hashlib.md5(('http://testserver' + url).encode()).hexdigest()),
+                               [caching.CATALOG])
+        # Срок действия записи LocMemCache.
+        self.assertLessEqual(cache._expire_info[cache.make_key(key)] - time.time(), caching.REPLICA_CACHE_TIMEOUT)
+
+    def test_browsable_api_is_served_by_drf(self):
+        response = self.client.get(reverse('api:subject_list'), HTTP_ACCEPT='text/html')
+        self.assertContains(response, 'Programming')
+        self.assertEqual(response['Content-Type'], 'text/html; charset=utf-8')
+
+    async def test_catalog_pages_over_asgi(self):
+        response = await self.async_client.get(reverse('course_list'))
+        self.assertContains(response, 'Python')
+        response = await self.async_client.get(reverse('course_detail', args=['python']))
+        self.assertContains(response, 'Python for beginners')
+        # AsyncClient в Django 3.1 передаёт дополнительные аргументы как заголовки ASGI.
+        response = await self.async_client.get(reverse('course_detail', args=['python']),
+                                               **{'If-None-Match': response['ETag']})
+        self.assertEqual(response.status_code, 304)
+        response = await self.async_client.get(reverse('course_detail', args=['missing']))
+        self.assertEqual(response.status_code, 404)
+
+
+@override_settings(COURSES_METRICS_TOKEN='scrape')
+class MetricsTest(CourseTreeMixin, TestCase):
+    def setUp(self):
+        super(MetricsTest, self).setUp()
+        metrics.registry.reset()
+        self.add_module()
+        self.student = User.objects.create_user('student', password='secret')
+        self.course.students.add(self.student)
+
+    def sample(self, name, view):
+        prefix = '{}{{view="{}"}} '.format(name, view)
+        lines = self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer scrape').content.decode().splitlines()
+        return next(float(line[len(prefix):]) for line in lines if line.startswith(prefix))
+
+    def test_request_metrics(self):
+        self.client.force_login(self.student)
+        url = reverse('student_course_detail', args=[self.course.id])
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        # Журнал запросов соединения очищается в начале следующего запроса.
+        queries = len(context.captured_queries)
+        self.assertEqual(self.sample('courses_db_queries_count', 'student_course_detail'), 1)
+        self.assertEqual(self.sample('courses_db_queries_sum', 'student_course_detail'), queries)
+        self.assertEqual(self.sample('courses_response_size_bytes_sum', 'student_course_detail'),
+                         len(response.content))
+        self.assertGreater(self.sample('courses_render_duration_seconds_sum', 'student_course_detail'), 0)
+        self.assertGreater(self.sample('courses_cache_misses_total', 'student_course_detail'), 0)
+
+        self.client.get(url)
+        self.assertGreater(self.sample('courses_cache_hits_total', 'student_course_detail'), 0)
+        self.assertEqual(self.sample('courses_request_duration_seconds_count', 'student_course_detail'), 2)
+
+    def test_metrics_are_not_public(self):
+        # Запросы через прокси на том же сервере приходят с 127.0.0.1.
+        self.assertEqual(self.client.get(reverse('metrics'), REMOTE_ADDR='127.0.0.1').status_code, 403)
+        self.assertEqual(self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer wrong').status_code, 403)
+        self.client.force_login(self.student)
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 403)
+        User.objects.filter(pk=self.student.pk).update(is_staff=True)
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 200)
+
+    def test_n_plus_one_is_flagged(self):
+        with self.assertLogs('courses.metrics', 'WARNING') as logs:
+            for size in range(metrics.N_PLUS_ONE_MIN_SAMPLES):
+                collector = metrics.RequestMetrics()
+                collector.result_size = size
+                for _ in range(size + 1):
+                    collector.record_query('SELECT * FROM courses_module WHERE id = %s', 0.001)
+                metrics.registry.observe('course_list', collector, 0.01, 100)
+        self.assertIn('courses_module', logs.output[0])
+        self.assertEqual(metrics.registry.suspected_views(), ['course_list'])
+
+        detector = metrics.NPlusOneDetector()
+        for size in range(metrics.N_PLUS_ONE_MIN_SAMPLES):
+            self.assertFalse(detector.add(size, 3))
+        self.assertFalse(detector.suspected)
+
+
+class TemplateRenderingTest(CourseTreeMixin, TestCase):
+    def setUp(self):
+        super(TemplateRenderingTest, self).setUp()
+        self.module = self.add_module()
+
+    def test_url_table_matches_reverse(self):
+        cases = [('module_content_list', [self.module.id]),
+                 ('module_content_update', [self.module.id, 'text', 7]),
+                 ('course_list_subject', ['programming']),
+                 ('course_detail', ['python']),
+                 ('student_course_detail_module', [self.course.id, str(self.module.id)])]
+        for language in ('en', 'ru'):
+            with translation.override(language):
+                for name, args in cases:
+                    self.assertEqual(urltable.reverse(name, args), reverse(name, args=args))
+                    # Второй вызов - из таблицы.
+                    self.assertEqual(urltable.reverse(name, args), reverse(name, args=args))
+        # Значения, которые нельзя подставить без проверки, обрабатывает reverse().
+        self.assertEqual(urltable.reverse('module_content_update', [1, 'a b', 2]),
+                         reverse('module_content_update', args=[1, 'a b', 2]))
+        with self.assertRaises(NoReverseMatch):
+            urltable.reverse('module_content_list', ['text'])
+
+    def test_profile_content_list(self):
+        self.client.force_login(self.owner)
+        url = reverse('module_content_list', args=[self.module.id])
+        with profile_templates() as profile:
+            response = self.client.get(url)
+        self.assertContains(response, reverse('module_content_delete', args=[self.module.contents.first().id]))
+        templates = dict(profile.by_template())
+        self.assertIn('courses/manage/module/content_list.html', templates)
+        self.assertIn('base.html', templates)
+        calls = {(template, tag): calls for template, tag, calls, _, _ in profile.by_tag()}
+        self.assertEqual(calls['courses/manage/module/content_list.html', '{% fast_url %}'], 2 * 4 + 1)
+        self.assertIn('Template render time', profile.report())
+
+
+@override_settings(COURSES_DB_REPLICAS=['replica'])
+class ReplicaRouterTest(SimpleTestCase):
+    def test_reads_go_to_replica_only_when_requested(self):
+        router = ReplicaRouter()
+        self.assertIsNone(router.db_for_read(Course))
+        with use_replica():
+            self.assertEqual(router.db_for_read(Course), 'replica')
+            self.assertEqual(router.db_for_write(Course), 'default')
+        self.assertFalse(router.allow_migrate('replica', 'courses'))
+        with override_settings(COURSES_DB_REPLICAS=[]), use_replica():
+            self.assertIsNone(router.db_for_read(Course))
+
+    def test_decorator(self):
+        self.assertTrue(reads_from_replica(replica_active)())
+
+        async def view():
+            return replica_active()
+
+        self.assertTrue(async_to_sync(reads_from_replica(view))())
+        self.assertFalse(replica_active())
+
+    def test_replica_data_is_cached_briefly(self):
+        self.assertEqual(caching._timeout(caching.CACHE_TIMEOUT), caching.CACHE_TIMEOUT)
+        with use_replica():
+            self.assertEqual(caching._timeout(caching.CACHE_TIMEOUT), caching.REPLICA_CACHE_TIMEOUT)
+            self.assertEqual(caching._timeout(None), caching.REPLICA_CACHE_TIMEOUT)
+
+
+@override_settings(CACHES=dict(settings.CACHES, layered_l2={
+    'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'layered-test'}, layered_down={
+    'BACKEND': 'django.core.cache.backends.memcached.MemcachedCache', 'LOCATION': '127.0.0.1:1'}))
+class LayeredCacheTest(SimpleTestCase):
+    def setUp(self):
+        self.cache = LayeredCache('layered_l2', {'OPTIONS': {'L1_TIMEOUT': 60}})
+        self.cache.clear()
+        self.l2 = caches['layered_l2']
+
+    def test_l1_serves_reads(self):
+        self.cache.set('subjects', ['Programming'])
+        self.l2.delete('subjects')
+        self.assertEqual(self.cache.get('subjects'), ['Programming'])
+        self.assertEqual(self.cache.get_many(['subjects', 'missing']), {'subjects': ['Programming']})
+        # Изменение полученного объекта не меняет кэш.
+        self.cache.get('subjects').append('Math')
+        self.assertEqual(self.cache.get('subjects'), ['Programming'])
+        self.cache.delete('subjects')
+        self.assertIsNone(self.cache.get('subjects'))
+
+        self.l2.set('versions', 1)
+        self.assertEqual(self.cache.get('versions'), 1)
+        self.assertFalse(self.cache.add('versions', 2))
+        self.l2.set('versions', 3)
+        self.assertEqual(self.cache.get('versions'), 3)
+
+    def test_get_or_set_computes_once(self):
+        calls = []
+
+        def compute():
+            calls.append(1)
+            return 'courses'
+
+        self.assertEqual(self.cache.get_or_set('courses', compute, 60), 'courses')
+        self.assertEqual(self.cache.get_or_set('courses', compute, 60), 'courses')
+        self.assertEqual(len(calls), 1)
+        self.assertIsInstance(self.l2.get('courses'), Envelope)
+        self.assertEqual(self.cache.get('courses'), 'courses')
+
+    def test_waits_for_other_process(self):
+        # Другой процесс уже пересчитывает значение и держит блокировку.
+        self.l2.add('courses:lock', 1)
+        timer = threading.Timer(0.2, lambda: self.l2.set('courses', 'from other process'))
+        timer.start()
+        self.addCleanup(timer.cancel)
+        self.assertEqual(self.cache.get_or_set('courses', lambda: 'computed', 60), 'from other process')
+
+    def test_unreachable_l2_does_not_wait(self):
+        # add() блокировки не удаётся, но блокировки нет: ждать некого.
+        cache = LayeredCache('layered_down', {})
+        start = time.monotonic()
+        self.assertEqual(cache.get_or_set('courses', lambda: 'computed', 60), 'computed')
+        self.assertLess(time.monotonic() - start, layered_cache.LOCK_WAIT)
+
+    def test_early_refresh(self):
+        # Срок уже наступил: XFetch обновляет значение при любом случайном числе.
+        stale = Envelope('old', 10.0, time.time() - 1)
+        self.l2.set('courses', stale)
+        self.assertTrue(self.cache.should_refresh(stale))
+        self.assertEqual(self.cache.get_or_set('courses', lambda: 'new', 60), 'new')
+        self.assertFalse(self.cache.should_refresh(Envelope('new', 0.01, time.time() + 60)))
+        # Пока другой процесс обновляет значение, отдаётся прежнее.
+        self.l2.set('catalog', stale)
+        self.l2.add('catalog:lock', 1)
+        self.assertEqual(self.cache.get_or_set('catalog', lambda: 'new', 60), 'old')
+
+
+class ProgressTest(CourseTreeMixin, TransactionTestCase):
+    def setUp(self):
+        super(ProgressTest, self).setUp()
+        self.module = self.add_module()
+        self.other_module = self.add_module()
+        self.student = User.objects.create_user('student', password='secret')
+        self.course.students.add(self.student)
+        self.client.force_login(self.student)
+
+    def module_url(self, module):
+        return reverse('student_course_detail_module', args=[self.course.id, module.id])
+
+    def test_views_are_written_behind(self):
+        self.course.refresh_from_db()
+        self.assertEqual(self.course.total_contents, 8)
+        self.client.get(self.module_url(self.module))
+        self.client.get(self.module_url(self.module))
+        self.assertEqual(len(progress.buffer), 4)
+        self.assertFalse(ContentProgress.objects.exists())
+
+        self.assertEqual(progress.flush(), 4)
+        self.assertEqual(ContentProgress.objects.filter(user=self.student, completed=None).count(), 4)
+        self.assertEqual(CourseProgress.objects.get(user=self.student, course=self.course).completed_contents, 0)
+        self.assertEqual(len(progress.buffer), 0)
+
+    @override_settings(COURSES_PROGRESS_FLUSH_INTERVAL=0)
+    def test_buffer_is_flushed_after_request(self):
+        self.client.get(self.module_url(self.module))
+        self.assertEqual(ContentProgress.objects.count(), 4)
+
+    def test_completion_percentage(self):
+        url = reverse('student_module_complete', args=[self.course.id, self.module.id])
+        response = self.client.post(url)
+        self.assertRedirects(response, self.module_url(self.module), fetch_redirect_response=False)
+        # Несохранённые завершения этого процесса уже видны студенту.
+        self.assertContains(self.client.get(self.module_url(self.module)), 'Completed 50% (4 of 8)')
+        progress.flush()
+        self.assertEqual(CourseProgress.objects.get().completed_contents, 4)
+
+        # Повторное завершение не учитывается дважды.
+        self.client.post(url)
+        progress.flush()
+        self.assertEqual(CourseProgress.objects.get().completed_contents, 4)
+        response = self.client.get(reverse('student_course_list'))
+        self.assertContains(response, 'Completed 50%')
+
+        # Отметки удалённого объекта не учитываются.
+        Content.objects.filter(module=self.module).first().delete()
+        self.assertEqual(CourseProgress.objects.get().completed_contents, 3)
+        self.course.refresh_from_db()
+        self.assertEqual(self.course.total_contents, 7)
+
+        CourseProgress.objects.update(completed_contents=0)
+        Course.objects.update(total_contents=0)
+        counters.reconcile()
+        self.assertEqual(CourseProgress.objects.get().completed_contents, 3)
+        self.course.refresh_from_db()
+        self.assertEqual(self.course.total_contents, 7)
+
+    def test_flush_queries_do_not_depend_on_contents(self):
+        other = User.objects.create_user('other', password='secret')
+        for module in (self.module, self.other_module):
+            content_ids = progress.course_content_ids(self.course.id)[module.id]
+            progress.record_view(self.student, self.course.id, content_ids)
+            progress.record_completion(other, self.course.id, content_ids)
+        # объекты и студенты, BEGIN, две вставки, чтение и bulk_update отметок и прогресса
+        with self.assertNumQueries(9):
+            self.assertEqual(progress.flush(), 16)
+        self.assertEqual(CourseProgress.objects.get(user=other).completed_contents, 8)
+
+    def test_each_mark_keeps_its_view_time(self):
+        first, second = progress.course_content_ids(self.course.id)[self.module.id][:2]
+        progress.record_view(self.student, self.course.id, [first])
+        time.sleep(0.01)
+        progress.record_view(self.student, self.course.id, [second])
+        progress.flush()
+        viewed = dict(ContentProgress.objects.values_list('content_id', 'last_viewed'))
+        self.assertLess(viewed[first], viewed[second])
+        self.assertEqual(CourseProgress.objects.get().last_viewed, viewed[second])
+
+    def test_deleting_module_refreshes_progress_once(self):
+        progress.record_completion(self.student, self.course.id,
+                                   progress.course_content_ids(self.course.id)[self.module.id])
+        progress.flush()
+        with CaptureQueriesContext(connection) as context:
+            self.module.delete()
+        refreshes = [query for query in context.captured_queries
+                     if query['sql'].startswith('UPDATE "courses_courseprogress"')]
+        self.assertEqual(len(refreshes), 1)
+        self.assertEqual(CourseProgress.objects.get().completed_contents, 0)
+
+    def test_deleted_content_is_skipped(self):
+        content_ids = progress.course_content_ids(self.course.id)[self.module.id]
+        progress.record_completion(self.student, self.course.id, content_ids)
+        Content.objects.filter(pk=content_ids[0]).delete()
+        progress.flush()
+        self.assertEqual(CourseProgress.objects.get().completed_contents, 3)
+
+    def test_api(self):
+        url = reverse('api:course-progress', args=[self.course.id])
+        auth = basic_auth('student', 'secret')
+        content_ids = progress.course_content_ids(self.course.id)[self.other_module.id]
+        response = self.client.post(url, {'completed': content_ids[:2]}, content_type='application/json',
+                                    HTTP_AUTHORIZATION=auth)
+        self.assertEqual(response.json(), {'completed': 2, 'total': 8, 'percent': 25})
+        response = self.client.post(url, {'completed': [0]}, content_type='application/json',
+                                    HTTP_AUTHORIZATION=auth)
+        self.assertEqual(response.status_code, 400)
+        self.client.logout()
+        self.assertEqual(self.client.get(url, HTTP_AUTHORIZATION=basic_auth('instructor', 'secret')).status_code,
+                         403)
+
+
+class LoadTestHarnessTest(TestCase):
+    def setUp(self):
+        translation.activate('en')
+        cache.clear()
+        benchmark.generate_fixtures(subjects=2, courses=2, modules=2, items=4, students=5)
+
+    def test_fixtures(self):
+        self.assertEqual(Course.objects.count(), 4)
+        self.assertEqual(Module.objects.count(), 8)
+        self.assertEqual(Content.objects.count(), 32)
+        self.assertEqual(Text.objects.count(), 8)
+        self.assertEqual(sum(Course.objects.values_list('total_students', flat=True)),
+                         Course.students.through.objects.count())
+        self.assertEqual(len(search.search_course_ids('synthetic')), 4)
+
+    def test_scenarios(self):
+        state = benchmark.BenchmarkState()
+        for name, scenario in benchmark.SCENARIOS.items():
+            summary = benchmark.summarize(benchmark.run_scenario(state, scenario, 3, measure_memory=True))
+            self.assertEqual(summary['errors'], 0, name)
+            self.assertEqual(summary['requests'], 3)
+            self.assertIn('peak_kb', summary)
+
+    def test_isolated_caches(self):
+        cache.set('shared', 'site')
+        with benchmark.isolated_caches():
+            self.assertIsNone(cache.get('shared'))
+            cache.set('shared', 'loadtest')
+        self.assertEqual(cache.get('shared'), 'site')
+
+    def test_compare(self):
+        baseline = {'catalog': {'p50_ms': 10.0, 'p90_ms': 20.0, 'queries': 2}}
+        self.assertEqual(benchmark.compare({'catalog': {'p50_ms': 10.5, 'p90_ms': 21.0, 'queries': 2}}, baseline), [])
+        self.assertEqual(len(benchmark.compare({'catalog': {'p50_ms': 12.0, 'p90_ms': 21.0, 'queries': 3}},
+                                               baseline)), 2)
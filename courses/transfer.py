@@ -0,0 +1,272 @@
+import json
+
+from django.contrib.contenttypes.models import ContentType
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections, router, transaction, IntegrityError
+from django.db.models import FileField
+
+from .fields import OrderField
+from .models import Subject, Course, Module, Content, Text, Video, Image, File, Blob
+from .caching import invalidate, CATALOG
+from .storage import content_storage
+from . import counters, search
+
+"""
+Импорт и экспорт дерева курса (Course -> Module -> Content -> Text/Video/Image/File)
+в формате JSON Lines. Каждая строка - отдельный JSON-объект с полем type:
+
+{"type": "course", "subject": "programming", "title": ..., "slug": ..., "overview": ...}
+{"type": "module", "order": 0, "title": ..., "description": ...}
+{"type": "content", "model": "text", "order": 0, "title": ..., "content": ...}
+
+Содержимое относится к последнему модулю перед ним. Для файлов и изображений
+переносится только имя файла в хранилище, сами файлы не копируются: при импорте
+имя должно принадлежать хранилищу с адресацией по содержимому и быть учтено в Blob.
+
+Экспорт читает содержимое курса итератором и загружает объекты пакетами по
+BATCH_SIZE, поэтому расход памяти не зависит от размера курса. Импорт накапливает
+строки пакетами и сохраняет их через bulk_create() в одной транзакции.
+"""
+
+BATCH_SIZE = 500
+
+ITEM_MODELS = {model._meta.model_name: model for model in (Text, Video, Image, File)}
+
+ITEM_EXCLUDED_FIELDS = ('id', 'owner', 'created', 'updated')
+
+
+class CourseImportError(ValueError):
+    pass
+
+
+def item_fields(model):
+    return [field for field in model._meta.concrete_fields if field.name not in ITEM_EXCLUDED_FIELDS]
+
+
+def dump_line(data):
+    return json.dumps(data, cls=DjangoJSONEncoder, ensure_ascii=False) + '\n'
+
+
+def _content_lines(course):
+    """Генерирует пары (module_id, строка) для содержимого курса, загружая объекты пакетами."""
+    rows = (Content.objects.filter(module__course=course)
+            .order_by('module__order', 'module_id', 'order', 'id')
+            .values_list('module_id', 'order', 'content_type_id', 'object_id')
+            .iterator(chunk_size=BATCH_SIZE))
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= BATCH_SIZE:
+            yield from _load_batch(batch)
+            batch = []
+    if batch:
+        yield from _load_batch(batch)
+
+
+def _load_batch(batch):
+    ids_by_type = {}
+    for module_id, order, content_type_id, object_id in batch:
+        ids_by_type.setdefault(content_type_id, []).append(object_id)
+    items = {}
+    for content_type_id, ids in ids_by_type.items():
+        model = ContentType.objects.get_for_id(content_type_id).model_class()
+        for pk, item in model._default_manager.in_bulk(ids).items():
+            items[content_type_id, pk] = item
+    for module_id, order, content_type_id, object_id in batch:
+        item = items.get((content_type_id, object_id))
+        if item is None:
+            continue
+        data = {'type': 'content', 'model': item._meta.model_name, 'order': order}
+        for field in item_fields(type(item)):
+            value = field.value_from_object(item)
+            # Для файлов переносим только имя в хранилище.
+            data[field.name] = value.name if isinstance(field, FileField) else value
+        yield module_id, dump_line(data)
+
+
+def export_course(course):
+    """Генерирует строки JSON Lines с полным деревом курса."""
+    yield dump_line({'type': 'course',
+                     'subject': course.subject.slug,
+                     'title': course.title,
+                     'slug': course.slug,
+                     'overview': course.overview})
+    contents = _content_lines(course)
+    pending = next(contents, None)
+    modules = (course.modules.order_by('order', 'id')
+               .values('id', 'order', 'title', 'description')
+               .iterator(chunk_size=BATCH_SIZE))
+    for module in modules:
+        yield dump_line({'type': 'module',
+                         'order': module['order'],
+                         'title': module['title'],
+                         'description': module['description']})
+        while pending is not None and pending[0] == module['id']:
+            yield pending[1]
+            pending = next(contents, None)
+
+
+def bulk_create_with_pks(model, objs):
+    """
+    bulk_create(), гарантирующий заполненные первичные ключи. Если бэкенд не
+    возвращает ключи вставленных строк (SQLite в Django 3.1), строки
+    сохраняются по одной через save_base(raw=True), как при loaddata: ключ
+    каждой строки возвращает сама база, а обработчики сигналов пропускают такие
+    сохранения (signals.skip_raw), как и bulk_create(). Порядковые номера
+    OrderField назначаются всему пакету заранее.
+    """
+    using = router.db_for_write(model)
+    if connections[using].features.can_return_rows_from_bulk_insert:
+        model._default_manager.db_manager(using).bulk_create(objs, batch_size=BATCH_SIZE)
+        return objs
+    fields = model._meta.local_concrete_fields
+    with transaction.atomic(using=using, savepoint=False):
+        for field in fields:
+            if isinstance(field, OrderField):
+                field.allocate(objs, using=using)
+        for obj in objs:
+            # raw=True сохраняет значения как есть: auto_now_add и другие значения,
+            # которые вычисляет поле, проставляем так же, как Model.save().
+            for field in fields:
+                setattr(obj, field.attname, field.pre_save(obj, add=True))
+            obj.save_base(raw=True, force_insert=True, using=using)
+    return objs
+
+
+def _order(data):
+    """Порядковый номер строки: целое число или None (номер назначит OrderField)."""
+    order = data.get('order')
+    if order is not None and (isinstance(order, bool) or not isinstance(order, int)):
+        raise CourseImportError('Order must be an integer, got {!r}.'.format(order))
+    return order
+
+
+class CourseImporter(object):
+    def __init__(self, owner):
+        self.owner = owner
+        self.course = None
+        self.module = None
+        self.modules = []
+        self.contents = []
+
+    def feed(self, data):
+        kind = data.get('type') if isinstance(data, dict) else None
+        if self.course is None:
+            if kind != 'course':
+                raise CourseImportError('The first line must describe the course.')
+            self.create_course(data)
+        elif kind == 'module':
+            self.module = Module(course=self.course,
+                                 order=_order(data),
+                                 title=data.get('title', ''),
+                                 description=data.get('description', ''))
+            self.modules.append(self.module)
+        elif kind == 'content':
+            if self.module is None:
+                raise CourseImportError('Content must follow a module.')
+            self.contents.append((self.module, _order(data), self.build_item(data)))
+        else:
+            raise CourseImportError('Unknown line type: {!r}.'.format(kind))
+        if len(self.modules) + len(self.contents) >= BATCH_SIZE:
+            self.flush()
+
+    def create_course(self, data):
+        try:
+            subject = Subject.objects.get(slug=data.get('subject'))
+        except Subject.DoesNotExist:
+            raise CourseImportError('Unknown subject: {!r}.'.format(data.get('subject')))
+        if Course.objects.filter(slug=data.get('slug')).exists():
+            raise CourseImportError('Course with slug {!r} already exists.'.format(data.get('slug')))
+        self.course = Course.objects.create(owner=self.owner,
+                                            subject=subject,
+                                            title=data.get('title', ''),
+                                            slug=data.get('slug'),
+                                            overview=data.get('overview', ''))
+
+    def build_item(self, data):
+        model = ITEM_MODELS.get(data.get('model'))
+        if model is None:
+            raise CourseImportError('Unknown content model: {!r}.'.format(data.get('model')))
+        names = {field.name for field in item_fields(model)}
+        unknown = set(data) - names - {'type', 'model', 'order'}
+        if unknown:
+            raise CourseImportError('Unknown {} fields: {}.'.format(model._meta.model_name,
+                                                                   ', '.join(sorted(unknown))))
+        return model(owner=self.owner, **{name: data[name] for name in names if name in data})
+
+    def check_files(self, items):
+        """
+        Проверяет, что файлы объектов - существующие файлы хранилища с адресацией
+        по содержимому. Записи Blob блокируются до конца импорта, чтобы файл не
+        был удалён до того, как на него появится новая ссылка.
+        """
+        names = {item.file.name for item in items if item.file.name}
+        foreign = sorted(name for name in names if not content_storage.digest(name))
+        if foreign:
+            raise CourseImportError('Files outside the content store: {}.'.format(', '.join(foreign)))
+        known = set(Blob.objects.select_for_update().filter(name__in=names).values_list('name', flat=True))
+        unknown = sorted(names - known)
+        if unknown:
+            raise CourseImportError('Unknown files: {}.'.format(', '.join(unknown)))
+
+    def flush(self):
+        bulk_create_with_pks(Module, self.modules)
+        items_by_model = {}
+        for module, order, item in self.contents:
+            items_by_model.setdefault(type(item), []).append(item)
+        for model, items in items_by_model.items():
+            if model in (Image, File):
+                self.check_files(items)
+            bulk_create_with_pks(model, items)
+            if model in (Image, File):
+                # Импортированные объекты ссылаются на уже существующие файлы хранилища.
+                for item in items:
+                    if item.file.name:
+                        content_storage.retain(item.file.name)
+        Content.objects.bulk_create(
+            [Content(module_id=module.pk,
+                     content_type=ContentType.objects.get_for_model(item),
+                     object_id=item.pk,
+                     order=order) for module, order, item in self.contents],
+            batch_size=BATCH_SIZE)
+        self.modules = []
+        self.contents = []
+
+
+def import_course(lines, owner):
+    """
+    Создаёт курс со всем содержимым из строк JSON Lines в одной транзакции.
+    :return: созданный объект Course
+    """
+    importer = CourseImporter(owner)
+    try:
+        with transaction.atomic():
+            for number, line in enumerate(lines, 1):
+                if isinstance(line, bytes):
+                    line = line.decode('utf-8')
+                if not line.strip():
+                    continue
+                try:
+                    importer.feed(json.loads(line))
+                except ValueError as e:
+                    # CourseImportError и ошибки разбора JSON - подклассы ValueError.
+                    raise CourseImportError('Line {}: {}'.format(number, e))
+            if importer.course is None:
+                raise CourseImportError('The document is empty.')
+            try:
+                importer.flush()
+            except (ValueError, TypeError) as e:
+                # Значения, которые поле модели не может преобразовать.
+                raise CourseImportError(str(e))
+            # Модули созданы через bulk_create() без сигналов, пересчитываем счётчики курса.
+            counters.reconcile([importer.course.id])
+    except IntegrityError as e:
+        raise CourseImportError(str(e))
+    # bulk_create() не отправляет сигналы, поэтому сбрасываем кэш каталога и
+    # добавляем модули и тексты курса в поисковый индекс вручную.
+    invalidate(CATALOG)
+    search.schedule_index('module', importer.course.modules.values_list('pk', flat=True))
+    search.schedule_index('content', Content.objects.filter(
+        module__course=importer.course, content_type=ContentType.objects.get_for_model(Text))
+        .values_list('pk', flat=True))
+    return importer.course
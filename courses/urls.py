@@ -15,6 +15,8 @@ urlpatterns = [
          name='module_content_delete'),
     path('module/<int:module_id>/', views.ModuleContentListView.as_view(),
          name='module_content_list'),
+    path('content/<model_name>/<int:id>/download/', views.ContentFileView.as_view(),
+         name='content_file'),
     path('module/order/', views.ModuleOrderView.as_view(), name='module_order'),
     path('content/order/', views.ContentOrderView.as_view(), name='content_order'),
 
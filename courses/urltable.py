@@ -0,0 +1,104 @@
+import re
+
+from django.conf import settings
+from django.urls import reverse as django_reverse, get_script_prefix, get_urlconf, NoReverseMatch
+from django.utils import translation
+
+"""
+Таблица адресов для reverse(), повторяющихся в циклах шаблонов.
+
+Для имени URL и числа аргументов один раз вызывается настоящий reverse() с
+аргументами-заполнителями, и полученный адрес разбивается на неизменные части.
+Дальше адрес собирается склейкой строк, без перебора шаблонов URL и проверки
+регулярных выражений. Таблица своя для каждого языка (префикс i18n_patterns),
+префикса скрипта и набора URL. Тег {% fast_url %} запоминает найденные в
+таблице записи на время рендеринга шаблона, чтобы не читать язык и префикс
+(локальные для потока значения) для каждой ссылки.
+
+Быстрый путь используется только для аргументов, которые любой конвертер
+пропускает без изменений: неотрицательных целых чисел и строк из цифр, а если
+адрес принимает и слаги - строк из букв, цифр, '-' и '_'. Такие значения не
+требуют экранирования. Для остальных аргументов вызывается reverse().
+"""
+
+DIGITS_RE = re.compile(r'[0-9]+\Z')
+SLUG_RE = re.compile(r'[-a-zA-Z0-9_]+\Z')
+
+_table = {}
+
+
+def _placeholders(count, prefix):
+    return ['{}{:02d}'.format(prefix, number) for number in range(count)]
+
+
+def _split(url, placeholders):
+    parts = []
+    for placeholder in placeholders:
+        before, found, url = url.partition(placeholder)
+        if not found or placeholder in url:
+            return None
+        parts.append(before)
+    parts.append(url)
+    return parts
+
+
+def url_template(name, count):
+    """
+    Возвращает (части адреса, для каждого аргумента - принимает ли он слаги)
+    для имени URL с count аргументами или None, если адрес так не разбирается.
+    """
+    key = (settings.ROOT_URLCONF, get_urlconf(), get_script_prefix(), translation.get_language(), name, count)
+    try:
+        return _table[key]
+    except KeyError:
+        pass
+    template = None
+    placeholders = _placeholders(count, '73918')
+    try:
+        parts = _split(django_reverse(name, args=placeholders), placeholders)
+    except NoReverseMatch:
+        parts = None
+    if parts is not None:
+        accepts_slugs = []
+        for position in range(count):
+            # Буквенный заполнитель на одной позиции: int-конвертер его не примет.
+            args = list(placeholders)
+            args[position] = 'urltableslug'
+            try:
+                accepts_slugs.append(_split(django_reverse(name, args=args), args) == parts)
+            except NoReverseMatch:
+                accepts_slugs.append(False)
+        template = (parts, accepts_slugs)
+    _table[key] = template
+    return template
+
+
+def _plain(value, accepts_slugs):
+    if isinstance(value, int) and not isinstance(value, bool):
+        return str(value) if value >= 0 else None
+    if isinstance(value, str) and (SLUG_RE if accepts_slugs else DIGITS_RE).match(value):
+        return value
+    return None
+
+
+def build(template, name, args):
+    """Адрес по результату url_template(name, len(args))."""
+    if template is not None:
+        parts, accepts_slugs = template
+        url = [parts[0]]
+        for value, slugs, part in zip(args, accepts_slugs, parts[1:]):
+            value = _plain(value, slugs)
+            if value is None:
+                return django_reverse(name, args=args)
+            url += [value, part]
+        return ''.join(url)
+    return django_reverse(name, args=args)
+
+
+def reverse(name, args=()):
+    """То же, что django.urls.reverse(name, args=args), для повторяющихся адресов."""
+    return build(url_template(name, len(args)), name, args)
+
+
+def clear():
+    _table.clear()
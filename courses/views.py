@@ -1,3 +1,8 @@
+import asyncio
+import functools
+import hmac
+
+from asgiref.sync import sync_to_async
 from django.shortcuts import render
 from django.urls import reverse_lazy
 from django.views.generic.list import ListView
@@ -7,16 +12,26 @@ from django.shortcuts import redirect, get_object_or_404
 from django.views.generic.base import TemplateResponseMixin, View
 from django.forms.models import modelform_factory
 from django.apps import apps
+from django.contrib.contenttypes.models import ContentType
+from django.utils.translation import gettext as _
 from braces.views import CsrfExemptMixin, JsonRequestResponseMixin
-from django.db.models import Count
+from django.db import transaction
 from django.views.generic.detail import DetailView
-from django.core.cache import cache
+from django.conf import settings
+from django.core.exceptions import PermissionDenied
+from django.http import Http404, HttpResponse
 
 from .models import Module, Content
 from .forms import ModuleFormSet
 from .models import Course
 from .models import Subject
 from students.forms import CourseEnrollForm
+from .caching import cached, cached_async, invalidate, CATALOG, course_tag, module_tag
+from .conditional import course_validators, conditional_response, set_validators
+from .ordering import reorder, ReorderError
+from .media import serve_file
+from . import metrics, search
+from .db import reads_from_replica
 
 # class ManageCourseListView(ListView):
 #     model = Course
@@ -37,6 +52,26 @@ from students.forms import CourseEnrollForm
 """
 
 
+class AsyncViewMixin(object):
+    """
+    Позволяет объявлять методы get() и т.п. классов-обработчиков как async def.
+    Django 3.1 вызывает асинхронно только обработчики-корутины, поэтому as_view()
+    возвращает корутину, которая ждёт результат dispatch().
+    """
+    @classmethod
+    def as_view(cls, **initkwargs):
+        view = super(AsyncViewMixin, cls).as_view(**initkwargs)
+
+        async def async_view(request, *args, **kwargs):
+            response = view(request, *args, **kwargs)
+            # http_method_not_allowed() и options() возвращают готовый ответ.
+            if asyncio.iscoroutine(response):
+                response = await response
+            return response
+
+        return functools.wraps(view)(async_view)
+
+
 class OwnerMixin(object):
     def get_queryset(self):
         qs = super(OwnerMixin, self).get_queryset()
@@ -106,7 +141,9 @@ class CourseModuleUpdateView(TemplateResponseMixin, View):
     def post(self, request, *args, **kwargs):
         formset = self.get_formset(data=request.POST)
         if formset.is_valid():
-            formset.save()
+            # Порядковые номера новых модулей выделяются под блокировкой курса.
+            with transaction.atomic():
+                formset.save()
             return redirect('manage_course_list')
         return self.render_to_response({'course': self.course,
                                         'formset': formset})
@@ -148,7 +185,9 @@ class ContentCreateUpdateView(TemplateResponseMixin, View):
         Form = modelform_factory(model, exclude=['owner',
                                                  'order',
                                                  'created',
-                                                 'updated'])
+                                                 'updated',
+                                                 'width',
+                                                 'height'])
         return Form(*args, **kwargs)
 
     def dispatch(self, request, module_id, model_name, id=None):
@@ -172,13 +211,19 @@ class ContentCreateUpdateView(TemplateResponseMixin, View):
                              instance=self.obj,
                              data=request.POST,
                              files=request.FILES)
+        form.is_valid()
+        # Файлы больше допустимого размера отбрасываются обработчиком загрузки.
+        for field in getattr(request, 'rejected_uploads', []):
+            if field in form.fields:
+                form.add_error(field, _('The file is too large.'))
         if form.is_valid():
             obj = form.save(commit=False)
             obj.owner = request.user
-            obj.save()
-            if not id:
-                # Создаем новый объект.
-                Content.objects.create(module=self.module, item=obj)
+            with transaction.atomic():
+                obj.save()
+                if not id:
+                    # Создаем новый объект.
+                    Content.objects.create(module=self.module, item=obj)
             return redirect('module_content_list', self.module.id)
         return self.render_to_response({'form': form, 'object': self.obj})
 
@@ -194,6 +239,26 @@ class ContentDeleteView(View):
         return redirect('module_content_list', module.id)
 
 
+class ContentFileView(LoginRequiredMixin, View):
+    """
+    Отдаёт файл объекта File или Image владельцу содержимого и слушателям курсов,
+    в модули которых оно входит. Поддерживает условные запросы, диапазоны и
+    передачу файла веб-сервером (см. media.serve_file).
+    """
+    def get(self, request, model_name, id):
+        if model_name not in ('file', 'image'):
+            raise Http404
+        model = apps.get_model(app_label='courses', model_name=model_name)
+        item = get_object_or_404(model, id=id)
+        if item.owner_id != request.user.id:
+            enrolled = Content.objects.filter(content_type=ContentType.objects.get_for_model(model),
+                                              object_id=item.id,
+                                              module__course__students=request.user).exists()
+            if not enrolled:
+                raise Http404
+        return serve_file(request, item.file, item.updated)
+
+
 """
 ModuleContentListView - получает из базы данных модуль по
 переданному ID и генерирует для него страницу подробностей.
@@ -204,7 +269,7 @@ class ModuleContentListView(TemplateResponseMixin, View):
     template_name = 'courses/manage/module/content_list.html'
 
     def get(self, request, module_id):
-        module = get_object_or_404(Module,
+        module = get_object_or_404(Module.objects.with_contents().select_related('course'),
                                    id=module_id,
                                    course__owner=request.user)
         return self.render_to_response({'module': module})
@@ -212,79 +277,104 @@ class ModuleContentListView(TemplateResponseMixin, View):
 
 """
 ModuleOrderView - обработчик, который получает новый порядок модулей в формате JSON
-
+ContentOrderView - то же самое для содержимого модуля. Оба обработчика проверяют права
+на весь набор идентификаторов сразу и сохраняют порядок одним запросом (см. ordering.reorder)
+и возвращают итоговый порядок идентификаторов.
 """
 
 
 class ModuleOrderView(CsrfExemptMixin, JsonRequestResponseMixin, View):
-    def pos(self, request):
-        for id, order in self.request_json.items():
-            Module.objects.filter(id=id,
-                                  course__owner=request.user).update(order=order)
-        return self.render_json_response({'saved': 'OK'})
+    def post(self, request):
+        try:
+            order, course_ids = reorder(Module.objects.filter(course__owner=request.user),
+                                        self.request_json, 'course_id')
+        except ReorderError as e:
+            return self.render_bad_request_response({'error': str(e)})
+        # Порядок модулей выводится и в списке курсов API, закэшированном с тегом каталога.
+        invalidate(CATALOG, *[course_tag(course_id) for course_id in course_ids])
+        return self.render_json_response({'saved': 'OK', 'order': order})
 
 
 class ContentOrderView(CsrfExemptMixin, JsonRequestResponseMixin, View):
     def post(self, request):
-        for id, order in self.request_json.items():
-            Content.objects.filter(id=id,
-                                   module__course__owner=request.user).update(order=order)
-
-        return self.render_json_response({'saved': 'OK'})
+        try:
+            order, module_ids = reorder(Content.objects.filter(module__course__owner=request.user),
+                                        self.request_json, 'module_id')
+        except ReorderError as e:
+            return self.render_bad_request_response({'error': str(e)})
+        course_ids = Module.objects.filter(id__in=module_ids).values_list('course_id', flat=True)
+        invalidate(*[module_tag(module_id) for module_id in module_ids],
+                   *[course_tag(course_id) for course_id in course_ids])
+        return self.render_json_response({'saved': 'OK', 'order': order})
 
 
 """Отображение курсов для студентов"""
 
 
-class CourseListView(TemplateResponseMixin, View):
+class CourseListView(AsyncViewMixin, TemplateResponseMixin, View):
     """
     При обработке запроса на получение курсов мы выполняем следующие действия:
-    1) получаем список всех предметов, добавляя количество курсов по каждому из них.
-     Для этого применяем метод annotate() QuerySetʼа и функцию агрегации Count();
-    2) получаем все доступные курсы, включая количество модулей для каждого из них;
+    1) получаем список всех предметов с количеством курсов по каждому из них
+     (денормализованное поле total_courses);
+    2) получаем все доступные курсы, включая количество модулей для каждого из них (total_modules);
     3) если в URLʼе задан слаг предмета, получаем объект предмета и фильтруем список курсов по нему;
     4) для формирования результата используем метод render_to_response() из примеси TemplateResponseMixin.
+
+    Обработчик асинхронный: при попадании в кэш запрос не занимает поток, а шаблон
+    отрисовывается Django уже после возврата ответа.
     """
     model = Course
     template_name = 'courses/course/list.html'
 
-    def get(self, request, subject=None):
+    @reads_from_replica
+    async def get(self, request, subject=None):
         # subjects = Subject.objects.annotate(total_courses=Count('courses'))
         """
         Добавлена возможность кэширования страницы(курсов), если кеша нет, то страница сначала кэшируется
-        а потом из кэша отрисовывается у пользователя
+        а потом из кэша отрисовывается у пользователя.
+        В кэше хранятся уже вычисленные списки, а не ленивые QuerySet'ы. Записи помечены
+        тегом каталога, который сбрасывается при изменении предметов, курсов и модулей.
         :param request:
         :param subject:
         :return:
         """
-        subjects = cache.get('all_subjects')
-        if not subjects:
-            subjects = Subject.objects.annotate(total_courses=Count('courses'))
-            cache.set('all_subjects', subjects)
-        all_courses = Course.objects.annotate(total_modules=Count('modules'))
+        subjects = await cached_async('all_subjects', [CATALOG], lambda: list(Subject.objects.all()))
+        # total_courses и total_modules - поля-счётчики, группировка с JOIN не нужна.
+        all_courses = Course.objects.select_related('subject', 'owner')
 
-        # courses = Course.objects.annotate(total_modules=Count('modules'))
         if subject:
-            # subject = get_object_or_404(Subject, slug=subject)
-            # courses = courses.filter(subject=subject)
-            subject = get_object_or_404(Subject, slug=subject)
-            key = 'subject_{}_courses'.format(subject.id)
-            courses = cache.get(key)
-            if not courses:
-                courses = all_courses.filter(subject=subject)
-                cache.set(key, courses)
+            # Предмет берём из закэшированного списка, без отдельного запроса.
+            subject = next((s for s in subjects if s.slug == subject), None)
+            if subject is None:
+                raise Http404
+            courses = await cached_async('subject_{}_courses'.format(subject.id), [CATALOG],
+                                         lambda: list(all_courses.filter(subject=subject)))
         else:
-            courses = cache.get('all_courses')
-            if not courses:
-                courses = all_courses
-                cache.set('all_courses', courses)
+            courses = await cached_async('all_courses', [CATALOG], lambda: list(all_courses))
 
         return self.render_to_response({'subjects': subjects,
                                         'subject': subject,
                                         'courses': courses})
 
 
-class CourseDetailView(DetailView):
+class CourseSearchView(TemplateResponseMixin, View):
+    """
+    Поиск курсов по параметру q. Курсы берутся из полнотекстового индекса
+    (см. search.py) в порядке релевантности, список предметов - из кэша каталога.
+    """
+    template_name = 'courses/course/search.html'
+
+    @reads_from_replica
+    def get(self, request):
+        query = request.GET.get('q', '').strip()
+        subjects = cached('all_subjects', [CATALOG], lambda: list(Subject.objects.all()))
+        courses = search.search_courses(query, queryset=Course.objects.select_related('subject', 'owner'))
+        return self.render_to_response({'subjects': subjects,
+                                        'query': query,
+                                        'courses': courses})
+
+
+class CourseDetailView(AsyncViewMixin, DetailView):
     """
     Указаны два атрибута: model и template_name. При обработке запроса Django ожидает,
     что в URL будет передан идентификатор (pk) объекта, по которому его можно получить
@@ -295,12 +385,47 @@ class CourseDetailView(DetailView):
     в контекст шаблона. Объект формы при этом содержит скрытое поле с ID курса, поэтому
     при нажатии кнопки на сервер будут отправлены данные курса и пользователя.
 
+    Обработчик асинхронный: курс вместе с предметом и владельцем берётся из кэша
+    каталога, а если курс не менялся, клиент получает 304 (см. conditional.py).
+
      """
     model = Course
     template_name = 'courses/course/detail.html'
 
+    def get_queryset(self):
+        return super(CourseDetailView, self).get_queryset().select_related('subject', 'owner')
+
+    async def get(self, request, *args, **kwargs):
+        self.object = await cached_async('course_detail_{}'.format(kwargs['slug']), [CATALOG],
+                                         self.get_object)
+        # Пользователь загружается из сессии запросом к базе данных, поэтому в потоке синхронного кода.
+        etag, last_modified = await sync_to_async(course_validators)(request, self.object)
+        response = conditional_response(request, etag, last_modified)
+        if response is None:
+            context = self.get_context_data(object=self.object)
+            response = set_validators(self.render_to_response(context), etag, last_modified)
+        return response
+
     def get_context_data(self, **kwargs):
         context = super(CourseDetailView, self).get_context_data(**kwargs)
         context['enroll_form'] = CourseEnrollForm(initial={'course': self.object})
 
         return context
+
+
+class MetricsView(View):
+    """
+    Метрики процесса в текстовом формате Prometheus (см. metrics.py). Доступны
+    персоналу и сборщику с заголовком "Authorization: Bearer <COURSES_METRICS_TOKEN>".
+    Адрес клиента не проверяется: за прокси на том же сервере все запросы
+    приходят с локального адреса.
+    """
+    def has_token(self, request):
+        token = getattr(settings, 'COURSES_METRICS_TOKEN', None)
+        header = request.META.get('HTTP_AUTHORIZATION', '')
+        return bool(token) and hmac.compare_digest(header.encode(), 'Bearer {}'.format(token).encode())
+
+    def get(self, request):
+        if not (request.user.is_staff or self.has_token(request)):
+            raise PermissionDenied
+        return HttpResponse(metrics.registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -1,3 +1,84 @@
-from django.test import TestCase
+from django.contrib.auth.models import User
+from django.test import TestCase, TransactionTestCase
+from django.urls import reverse
 
-# Create your tests here.
+from courses.models import Course, Enrollment
+from courses.tests import CourseTreeMixin
+
+
+class StudentCourseDetailTest(CourseTreeMixin, TestCase):
+    def setUp(self):
+        super(StudentCourseDetailTest, self).setUp()
+        self.module = self.add_module()
+        self.student = User.objects.create_user('student', password='secret')
+        self.course.students.add(self.student)
+        self.client.force_login(self.student)
+
+    def test_module_contents_are_rendered(self):
+        response = self.client.get(reverse('student_course_detail_module',
+                                           args=[self.course.id, self.module.id]))
+        self.assertContains(response, 'Lorem ipsum')
+
+    def test_not_enrolled_student_gets_404(self):
+        self.client.force_login(User.objects.create_user('stranger', password='secret'))
+        response = self.client.get(reverse('student_course_detail', args=[self.course.id]))
+        self.assertEqual(response.status_code, 404)
+
+    def test_cached_page_is_served_without_course_queries(self):
+        url = reverse('student_course_detail', args=[self.course.id])
+        self.client.get(url)
+        with self.assertNumQueries(2):
+            # только сессия и пользователь
+            response = self.client.get(url)
+        self.assertContains(response, 'Lorem ipsum')
+
+    def test_shared_tier_does_not_leak_to_other_users(self):
+        url = reverse('student_course_detail', args=[self.course.id])
+        self.assertEqual(self.client.get(url).status_code, 200)
+        self.client.force_login(User.objects.create_user('stranger', password='secret'))
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+
+class StudentEnrollmentCacheTest(CourseTreeMixin, TransactionTestCase):
+    def setUp(self):
+        super(StudentEnrollmentCacheTest, self).setUp()
+        self.add_module()
+        self.student = User.objects.create_user('student', password='secret')
+        self.course.students.add(self.student)
+        self.client.force_login(self.student)
+
+    def test_unenrolled_student_loses_access(self):
+        url = reverse('student_course_detail', args=[self.course.id])
+        self.assertEqual(self.client.get(url).status_code, 200)
+
+        self.student.courses_joined.remove(self.course)
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+    def test_course_list_reads_enrollment_cache(self):
+        other = Course.objects.create(owner=self.owner, subject=self.subject, title='Django',
+                                      slug='django', overview='...')
+        url = reverse('student_course_list')
+        self.client.get(url)
+        with self.assertNumQueries(3):
+            # сессия, пользователь и курсы по закэшированным идентификаторам
+            response = self.client.get(url)
+        self.assertContains(response, 'Python')
+        self.assertNotContains(response, 'Django')
+
+        other.students.add(self.student)
+        self.assertContains(self.client.get(url), 'Django')
+
+    def test_admin_enrollment_updates_counter(self):
+        admin = User.objects.create_superuser('admin', password='secret')
+        self.client.force_login(admin)
+        url = reverse('admin:courses_course_change', args=[self.course.id])
+        data = {'owner': self.owner.id, 'subject': self.subject.id, 'title': 'Python',
+                'slug': 'python', 'overview': '...',
+                'modules-TOTAL_FORMS': 0, 'modules-INITIAL_FORMS': 0,
+                'enrollment_set-TOTAL_FORMS': 1, 'enrollment_set-INITIAL_FORMS': 1,
+                'enrollment_set-0-id': Enrollment.objects.get().id,
+                'enrollment_set-0-course': self.course.id,
+                'enrollment_set-0-user': self.student.id,
+                'enrollment_set-0-DELETE': 'on'}
+        self.assertEqual(self.client.post(url, data).status_code, 302)
+        self.assertEqual(Course.objects.get().total_students, 0)
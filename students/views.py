@@ -6,9 +6,20 @@ from django.views.generic.edit import FormView
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.views.generic.list import ListView
 from django.views.generic.detail import DetailView
+from django.db.models import prefetch_related_objects
+from django.http import Http404
+from django.shortcuts import redirect
+from django.views import View
+from django.template.loader import render_to_string
+from django.utils import translation
 
 from .forms import CourseEnrollForm
 from courses.models import Course
+from courses.fragments import prefetch_content_fragments
+from courses.caching import cached, course_tag, module_tag
+from courses.enrollment import enrolled_course_ids, is_enrolled
+from courses.conditional import ConditionalCourseMixin
+from courses import progress
 
 
 class StudentRegistrationView(CreateView):
@@ -67,40 +78,127 @@ class StudentCourseListView(LoginRequiredMixin, ListView):
     чтобы только авторизованные пользователи могли иметь доступ к этой странице.
     Этот обработчик также наследуется от класса ListView, чтобы отображать объекты модели
     Course в виде списка. Чтобы получить только курсы, связанные с текущим пользователем,
-    мы переопределили метод get_queryset() и отфильтровали QuerySet курсов по связи ManyToManyField со студентом.
+    мы переопределили метод get_queryset() и отфильтровали QuerySet курсов по закэшированному
+    множеству курсов студента (см. courses/enrollment.py).
     """
     model = Course
     template_name = 'students/course/list.html'
 
     def get_queryset(self):
         qs = super(StudentCourseListView, self).get_queryset()
-        return qs.filter(students__in=[self.request.user])
+        return qs.filter(pk__in=enrolled_course_ids(self.request.user))
 
+    def get_context_data(self, **kwargs):
+        context = super(StudentCourseListView, self).get_context_data(**kwargs)
+        # Прогресс по всем курсам студента - одна закэшированная запись (см. courses/progress.py).
+        counts = progress.completed_counts(self.request.user)
+        for course in context['object_list']:
+            course.progress = progress.summary(counts[course.pk], course.total_contents)
+        return context
 
-class StudentCourseDetailView(DetailView):
+
+class StudentCourseDetailView(ConditionalCourseMixin, DetailView):
     """
-    Обработчик StudentCourseDetailView. Переопределён метод get_queryset(),
-    чтобы ограничить QuerySet курсов и работать только с теми, на которые записан текущий пользователь.
-    метод get_context_data(), чтобы добавить в контекст шаблона данные о модуле, если его
+    Обработчик StudentCourseDetailView показывает курс, на который записан текущий пользователь.
+    метод get_context_data() добавляет в контекст шаблона данные о модуле, если его
     идентификатор был передан в параметре module_id URLʼа. В противном случае мы показываем
     содержимое первого модуля. Так студенты смогут переходить от одного модуля курса к другому.
+    Если курс не менялся, ConditionalCourseMixin отвечает 304 до загрузки модулей.
+
+    Страница собирается из двух уровней кэша:
+    общий - курс со списком модулей и HTML содержимого модуля, одинаковые для всех студентов
+    и сбрасываемые по тегам курса и модуля;
+    личный - небольшой словарь с данными пользователя по курсу. Запись на курс
+    берётся из закэшированного множества курсов студента (см. courses/enrollment.py),
+    число завершённых объектов - из закэшированного прогресса (см. courses/progress.py).
+    Просмотр модуля, в том числе с ответом 304, отмечается в буфере прогресса.
     """
     model = Course
     template_name = 'students/course/detail.html'
+    overlay = None
+
+    def get_overlay(self, course_id):
+        """Личные данные пользователя по курсу."""
+        if not is_enrolled(self.request.user, course_id):
+            return {'enrolled': False}
+        return {'enrolled': True, 'completed': progress.completed_counts(self.request.user)[course_id]}
+
+    def get_object(self, queryset=None):
+        try:
+            course_id = int(self.kwargs['pk'])
+        except ValueError:
+            raise Http404
+        if not self.request.user.is_authenticated:
+            raise Http404
+        self.overlay = self.get_overlay(course_id)
+        if not self.overlay['enrolled']:
+            raise Http404
+        course = cached('student_course_{}'.format(course_id), [course_tag(course_id)],
+                        lambda: Course.objects.prefetch_related('modules').filter(pk=course_id).first())
+        if course is None:
+            raise Http404
+        return course
+
+    def get_module_contents(self, module):
+        """HTML содержимого модуля, общий для всех студентов."""
+        def render():
+            # Содержимое модуля и его объекты загружаются по одному запросу на тип.
+            prefetch_related_objects([module], 'contents__item')
+            prefetch_content_fragments(module.contents.all())
+            return render_to_string('students/course/module_contents.html', {'module': module})
+
+        return cached('module_contents_{}_{}'.format(module.id, translation.get_language()),
+                      [module_tag(module.id)], render)
+
+    def get_module(self):
+        # Модули загружены вместе с курсом и хранятся с ним в кэше.
+        modules = list(self.object.modules.all())
+        module = None
+        if 'module_id' in self.kwargs:
+            # Получаем текущий модуль по параметрам запроса.
+            module = next((m for m in modules if str(m.id) == str(self.kwargs['module_id'])), None)
+            if module is None:
+                raise Http404
+        elif modules:
+            # Получаем первый модуль.
+            module = modules[0]
+        return module
 
-    def get_queryset(self):
-        qs = super(StudentCourseDetailView, self).get_queryset()
-        return qs.filter(students__in=[self.request.user])
+    def get_validator_variants(self):
+        return (self.overlay['completed'],)
+
+    def get(self, request, *args, **kwargs):
+        response = super(StudentCourseDetailView, self).get(request, *args, **kwargs)
+        module = self.get_module()
+        if module is not None:
+            progress.record_view(request.user, self.object.id,
+                                 progress.course_content_ids(self.object.id).get(module.id, []))
+        return response
 
     def get_context_data(self, **kwargs):
         context = super(StudentCourseDetailView, self).get_context_data(**kwargs)
-        # Получаем объект курса
-        course = self.get_object()
-        if 'module_id' in self.kwargs:
-            # Получаем текущий модуль по параметрам запроса.
-            context['module'] = course.modules.get(id=self.kwargs['module_id'])
-        else:
-            # Получаем первый модуль.
-            context['module'] = course.modules.all()[0]
+        module = self.get_module()
+        context['module'] = module
+        context['module_contents'] = self.get_module_contents(module) if module is not None else ''
+        context['progress'] = progress.summary(self.overlay['completed'], self.object.total_contents)
 
         return context
+
+
+class StudentModuleCompleteView(LoginRequiredMixin, View):
+    """
+    Отмечает все объекты содержимого модуля завершёнными и возвращает студента
+    на страницу модуля. Отметка попадает в буфер прогресса (см. courses/progress.py).
+    """
+    def post(self, request, pk, module_id):
+        try:
+            course_id, module_id = int(pk), int(module_id)
+        except ValueError:
+            raise Http404
+        if not is_enrolled(request.user, course_id):
+            raise Http404
+        content_ids = progress.course_content_ids(course_id).get(module_id)
+        if not content_ids:
+            raise Http404
+        progress.record_completion(request.user, course_id, content_ids)
+        return redirect('student_course_detail_module', course_id, module_id)